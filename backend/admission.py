@@ -0,0 +1,269 @@
+"""
+Admission control for the expensive endpoints.
+
+Chat, creates, exports and enrichment each hold a worker for seconds and fan out
+to Gemini, Open-Meteo, YouTube or Places. Each of these route classes gets an
+AdmissionGate. It runs at most N requests at once and parks a bounded number of
+further requests in a wait queue. Anything beyond that is rejected at once with
+429 and a Retry-After estimated from recent service times. A request that waits
+longer than ADMISSION_QUEUE_TIMEOUT_SECONDS gets 503.
+
+Waiting requests are queued per user (X-User-Id header, else the client address),
+and freed slots go round-robin across users. One user can hold at most
+ADMISSION_PER_USER_QUEUE places in the queue, so a burst from one client cannot
+starve the others. Routes outside these classes, such as /test, list and
+detail reads, /statistics and /metrics, never touch a gate. /chat takes its slot
+only after the response cache missed, so cached answers are never queued.
+
+Exports take their slot the same way. For GET /export/weather-requests the
+middleware only attaches an AdmissionTicket to the request. The handler calls
+`admit` once the artifact cache has missed and a render is due, and the
+middleware frees the slot after the last chunk of the response, so a streamed
+render holds it for its whole duration. Cached exports and delta syncs
+(/export/weather-requests/changes) are never queued behind slow renders.
+
+The gated handlers that do blocking I/O run in the threadpool, so a saturated
+class never stalls the event loop that serves the ungated routes.
+
+Limits are per worker process and per event loop.
+"""
+
+import asyncio
+import math
+import os
+import re
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+from urllib.parse import parse_qs
+
+import metrics
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() not in ("0", "false", "no")
+ADMISSION_PER_USER_QUEUE = int(os.getenv("ADMISSION_PER_USER_QUEUE", "4"))
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "15"))
+
+# Route class: (default concurrency, default queue size); override with
+# ADMISSION_<CLASS>_CONCURRENCY and ADMISSION_<CLASS>_QUEUE
+ROUTE_CLASSES = {
+    'chat': (8, 32),
+    'create': (8, 32),
+    'export': (4, 16),
+    'enrichment': (8, 32),
+}
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed; `status` is 429 (queue full) or 503 (waited too long)"""
+
+    def __init__(self, route_class: str, status: int, retry_after: int):
+        super().__init__(f"Too many concurrent '{route_class}' requests, retry in {retry_after}s")
+        self.route_class = route_class
+        self.status = status
+        self.retry_after = retry_after
+
+
+class AdmissionGate:
+    """Concurrency limit with a bounded, per-user round-robin wait queue"""
+
+    def __init__(self, name: str, concurrency: int, queue_size: int,
+                 per_user_queue: int = ADMISSION_PER_USER_QUEUE,
+                 queue_timeout: float = ADMISSION_QUEUE_TIMEOUT_SECONDS):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.queue_size = max(0, queue_size)
+        self.per_user_queue = max(1, per_user_queue)
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.queued = 0
+        # User -> their waiting requests; the first user is served next
+        self._waiting: "OrderedDict[str, deque]" = OrderedDict()
+        # Moving average of how long an admitted request holds its slot
+        self._service_seconds = 1.0
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely free for a new request"""
+        return max(1, math.ceil(self._service_seconds * (self.queued + 1) / self.concurrency))
+
+    async def acquire(self, user: str):
+        """Wait for a slot; raises AdmissionRejected when shed"""
+        if self.active < self.concurrency and not self.queued:
+            self.active += 1
+            metrics.ADMISSION_DECISIONS.inc(route_class=self.name, outcome="admitted")
+            return
+
+        user_queue = self._waiting.get(user)
+        if self.queued >= self.queue_size or (user_queue and len(user_queue) >= self.per_user_queue):
+            metrics.ADMISSION_DECISIONS.inc(route_class=self.name, outcome="rejected")
+            raise AdmissionRejected(self.name, 429, self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        if user_queue is None:
+            user_queue = self._waiting[user] = deque()
+        user_queue.append(waiter)
+        self.queued += 1
+        metrics.ADMISSION_DECISIONS.inc(route_class=self.name, outcome="queued")
+
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._forget(user, waiter)
+            metrics.ADMISSION_DECISIONS.inc(route_class=self.name, outcome="timed_out")
+            raise AdmissionRejected(self.name, 503, self.retry_after())
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the client went away
+                self.release()
+            else:
+                self._forget(user, waiter)
+            raise
+        finally:
+            metrics.ADMISSION_WAIT_SECONDS.observe(time.monotonic() - start, route_class=self.name)
+
+    def _forget(self, user: str, waiter: asyncio.Future):
+        user_queue = self._waiting.get(user)
+        if user_queue and waiter in user_queue:
+            user_queue.remove(waiter)
+            self.queued -= 1
+            if not user_queue:
+                del self._waiting[user]
+
+    def release(self, held_seconds: Optional[float] = None):
+        """Free a slot, handing it straight to the next user in round-robin order"""
+        if held_seconds is not None:
+            self._service_seconds = 0.8 * self._service_seconds + 0.2 * held_seconds
+        while self._waiting:
+            user, user_queue = next(iter(self._waiting.items()))
+            waiter = user_queue.popleft()
+            self.queued -= 1
+            if user_queue:
+                self._waiting.move_to_end(user)
+            else:
+                del self._waiting[user]
+            if not waiter.done():
+                # The slot passes on, so `active` stays the same
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self, user: str):
+        """Hold a slot for the duration of the block"""
+        await self.acquire(user)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+    def snapshot(self) -> Dict:
+        return {
+            'active': self.active,
+            'queued': self.queued,
+            'concurrency': self.concurrency,
+            'queue_size': self.queue_size,
+            'waiting_users': len(self._waiting),
+            'retry_after_seconds': self.retry_after()
+        }
+
+
+_gates: Dict[str, AdmissionGate] = {}
+
+
+def get_gate(route_class: str) -> AdmissionGate:
+    """The shared gate for a route class, configured from the environment"""
+    if route_class not in _gates:
+        concurrency, queue_size = ROUTE_CLASSES[route_class]
+        prefix = f"ADMISSION_{route_class.upper()}"
+        _gates[route_class] = AdmissionGate(
+            route_class,
+            int(os.getenv(f"{prefix}_CONCURRENCY", str(concurrency))),
+            int(os.getenv(f"{prefix}_QUEUE", str(queue_size)))
+        )
+    return _gates[route_class]
+
+
+class AdmissionTicket:
+    """A deferred slot: taken by the handler with `admit`, freed by the middleware"""
+
+    def __init__(self, gate: AdmissionGate, user: str):
+        self.gate = gate
+        self.user = user
+        self._start: Optional[float] = None
+
+    async def acquire(self):
+        if self._start is None:
+            await self.gate.acquire(self.user)
+            self._start = time.monotonic()
+
+    def release(self):
+        if self._start is not None:
+            self.gate.release(time.monotonic() - self._start)
+            self._start = None
+
+
+# Route classes whose handler decides whether the request needs a slot at all
+DEFERRED_CLASSES = {'export'}
+
+
+async def admit(scope):
+    """Take the request's deferred slot (see AdmissionTicket); raises AdmissionRejected"""
+    ticket = scope.get('admission_ticket')
+    if ticket is not None:
+        await ticket.acquire()
+
+
+def gate_snapshots() -> Dict[str, Dict]:
+    return {name: get_gate(name).snapshot() for name in ROUTE_CLASSES}
+
+
+_ENRICHMENT_PATHS = re.compile(r"^/(location-enrichment|youtube-videos|google-maps)/")
+_DETAIL_PATH = re.compile(r"^/weather-requests/[^/]+$")
+
+
+def classify(method: str, path: str, query_string: bytes) -> Optional[str]:
+    """Route class gated by the middleware, or None for routes that are never queued.
+
+    /chat is gated inside its handler, after the response cache lookup. Exports
+    are DEFERRED_CLASSES: their handler takes the slot only to render.
+    """
+    if method == "POST" and path == "/chat/stream":
+        return 'chat'
+    if method == "POST" and path == "/weather-requests":
+        # ?async=true only validates and enqueues, the job queue bounds the real work
+        query = parse_qs(query_string.decode("latin-1"))
+        if query.get("async", ["false"])[-1].lower() in ("1", "true", "yes"):
+            return None
+        return 'create'
+    if method != "GET":
+        return None
+    if path == "/export/weather-requests":
+        return 'export'
+    if _ENRICHMENT_PATHS.match(path):
+        return 'enrichment'
+    if _DETAIL_PATH.match(path) and b"enrichment" in query_string:
+        includes = parse_qs(query_string.decode("latin-1")).get("include", [])
+        if any("enrichment" in value.split(",") for value in includes):
+            return 'enrichment'
+    return None
+
+
+def user_key(scope) -> str:
+    """Fairness key: the X-User-Id header, else the client address"""
+    for name, value in scope.get("headers", ()):
+        if name == b"x-user-id" and value:
+            return "user:" + value.decode("latin-1")[:128]
+    client = scope.get("client")
+    return f"addr:{client[0]}" if client else "anonymous"
+
+
+metrics.callback_metric(
+    "admission_in_flight", "Requests holding an admission slot, per route class", ("route_class",),
+    lambda: {(name,): gate.active for name, gate in list(_gates.items())}
+)
+metrics.callback_metric(
+    "admission_queued", "Requests waiting for an admission slot, per route class", ("route_class",),
+    lambda: {(name,): gate.queued for name, gate in list(_gates.items())}
+)
@@ -1,25 +1,45 @@
-from agno.agent import Agent
-from agno.app.fastapi.app import FastAPIApp
-from agno.app.fastapi.serve import serve_fastapi_app
-from agno.models.google import Gemini
-from agno.storage.postgres import PostgresStorage
-from agno.tools.duckduckgo import DuckDuckGoTools
+# Heavy dependencies (agno, reportlab, googlemaps) are imported on first use,
+# keep module-level imports here cheap so workers and tests start fast
 from open_meteo_tool import get_weather_forecast
 from database import WeatherDatabase
 from api_integrations import APIIntegrations
-from data_export import DataExporter
+from data_export import (FRONT_MATTER_FORMATS, STREAMING_FORMATS, DataExporter, artifact_cacheable,
+                         choose_encoding, compress_chunks, export_filename)
+from circuit_breaker import CircuitOpenError, breaker_snapshots, get_breaker
+from cache import SHARED_STATE_DB
+from middleware import AdmissionControlMiddleware, MetricsMiddleware, SelectiveGZipMiddleware, TracingMiddleware
+from admission import ADMISSION_ENABLED, AdmissionRejected, admit, gate_snapshots, get_gate, user_key as admission_user_key
+import metrics
+import tracing
+import pdf_export
+from tool_cache import memoizing_tool_hook, track_fallbacks
+from response_cache import get_cached_response, response_cache_stats, store_response
+from jobs import JobQueue
+from fast_json import FastJSONResponse, dumps as dump_json
+from session_store import SESSION_STORE_URL, get_session_store
+from prewarm import PREWARM_ENABLED, ForecastPrewarmer
+from export_cache import EXPORT_CACHE_ENABLED, ExportArtifactCache, read_chunks
 import os
+import json
+import time
+import hashlib
+import uuid
+from datetime import datetime, timezone
 from pydantic import BaseModel, Field
-from fastapi.responses import JSONResponse, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, Header, HTTPException, Query, Request
 from typing import Optional, List
+from functools import lru_cache
 import base64
+import contextlib
 
 # Pydantic models for requests
 class ChatRequest(BaseModel):
     message: str
     user_id: Optional[str] = None
+    no_cache: bool = Field(False, description="Skip the response cache and always ask the model")
 
 class WeatherRequest(BaseModel):
     location: str = Field(..., description="Location name, coordinates, or address")
@@ -32,30 +52,99 @@ class WeatherUpdateRequest(BaseModel):
     start_date: Optional[str] = None
     end_date: Optional[str] = None
 
-# Initialize components
-db = WeatherDatabase()
-api_integrations = APIIntegrations()
-data_exporter = DataExporter()
-
-basic_agent = Agent(
-    name="Weather Assistant",
-    model=Gemini(id="gemini-2.0-flash", api_key=os.getenv("GOOGLE_API_KEY")),
-    tools=[
-        DuckDuckGoTools(), 
-        get_weather_forecast
-    ],
-    show_tool_calls=True,
-    add_history_to_messages=True,
-    num_history_responses=3,
-    add_datetime_to_instructions=True,
-    markdown=True,
-    instructions="""You are a helpful weather assistant. When users ask for weather information:
+# Components are created on first use
+@lru_cache(maxsize=None)
+def get_db() -> WeatherDatabase:
+    return WeatherDatabase(os.getenv("WEATHER_DB_PATH", "weather_data.db"))
+
+@lru_cache(maxsize=None)
+def get_api_integrations() -> APIIntegrations:
+    return APIIntegrations()
+
+@lru_cache(maxsize=None)
+def get_data_exporter() -> DataExporter:
+    return DataExporter()
+
+@lru_cache(maxsize=None)
+def get_export_cache() -> Optional[ExportArtifactCache]:
+    return ExportArtifactCache() if EXPORT_CACHE_ENABLED else None
+
+@lru_cache(maxsize=None)
+def get_job_queue() -> JobQueue:
+    queue = JobQueue(get_db().db_path)
+    queue.register("create_weather_request", _run_create_weather_request_job)
+    return queue
+
+def _gemini_client_params() -> Optional[dict]:
+    # GEMINI_BASE_URL points the model at another endpoint (e.g. the benchmark stub)
+    base_url = os.getenv("GEMINI_BASE_URL")
+    return {"http_options": {"base_url": base_url}} if base_url else None
+
+@lru_cache(maxsize=None)
+def get_prewarmer() -> ForecastPrewarmer:
+    return ForecastPrewarmer(get_db().get_top_locations)
+
+@lru_cache(maxsize=None)
+def get_gemini_client():
+    """One Gemini client (and connection pool) shared by every agent"""
+    from google import genai
+    return genai.Client(api_key=os.getenv("GOOGLE_API_KEY"), **(_gemini_client_params() or {}))
+
+def _agno_storage():
+    if SESSION_STORE_URL.startswith(("postgres://", "postgresql://")):
+        from agno.storage.postgres import PostgresStorage
+        # Agno goes through SQLAlchemy, which needs the driver named in the URL
+        db_url = "postgresql+psycopg://" + SESSION_STORE_URL.split("://", 1)[1]
+        return PostgresStorage(table_name="agent_sessions", db_url=db_url)
+    from agno.storage.sqlite import SqliteStorage
+    return SqliteStorage(table_name="agent_sessions", db_file=SHARED_STATE_DB)
+
+def _build_agent(storage=None):
+    from agno.agent import Agent
+    from agno.models.google import Gemini
+    from agno.tools.duckduckgo import DuckDuckGoTools
+
+    return Agent(
+        name="Weather Assistant",
+        model=Gemini(id="gemini-2.0-flash", client=get_gemini_client()),
+        tools=[
+            DuckDuckGoTools(), 
+            get_weather_forecast
+        ],
+        # Memoize every tool call across sessions (see tool_cache.py)
+        tool_hooks=[memoizing_tool_hook],
+        storage=storage,
+        show_tool_calls=True,
+        add_history_to_messages=storage is not None,
+        num_history_responses=3,
+        add_datetime_to_instructions=True,
+        markdown=True,
+        instructions="""You are a helpful weather assistant. When users ask for weather information:
     1. Always use the get_weather_forecast tool to get accurate weather data
     2. For forecasts, always request 5 days of forecast data by setting forecast_days=5
     3. Present the information in a clear, organized format
     4. Include current weather conditions and the 5-day forecast when requested
     5. Be friendly and helpful in your responses"""
-)
+    )
+
+def new_chat_agent():
+    """Agent for a single /chat run.
+
+    History is passed in from the session store, so the agent holds nothing
+    between requests; concurrent users never share agent state and process
+    memory does not grow with the number of sessions.
+    """
+    return _build_agent()
+
+@lru_cache(maxsize=None)
+def get_basic_agent():
+    """Shared agent behind Agno's compatibility router, persisted in Agno's own storage"""
+    return _build_agent(storage=_agno_storage())
+
+def _chat_messages(session_id: Optional[str], message: str) -> List[dict]:
+    """Session history within the prompt token budget, followed by the new message"""
+    history = get_session_store().history(session_id) if session_id else []
+    return history + [{"role": "user", "content": message}]
 
 # Create the main FastAPI app
 app = FastAPI(
@@ -64,6 +153,10 @@ app = FastAPI(
     version="2.0.0"
 )
 
+# Shed load on expensive routes; added first so it sits inside CORS and
+# 429 responses still carry the CORS headers
+app.add_middleware(AdmissionControlMiddleware)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -71,19 +164,76 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Trace-Id", "Retry-After"],
 )
 
-# Get the agent router
-agent_router = FastAPIApp(agent=basic_agent).get_async_router()
+# Compress responses; SSE streams must be flushed event by event, and exports
+# negotiate and compress their own bodies (see the compression= parameter)
+app.add_middleware(SelectiveGZipMiddleware, exclude_paths=["/chat/stream", "/export/"], minimum_size=1000)
+# Outermost, so the measured time includes compression and CORS handling
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
+
+@app.on_event("startup")
+async def include_agent_router():
+    """Mount Agno's FastAPI router for backward compatibility.
+
+    Building it needs the Gemini agent, so it is done at startup rather than import,
+    and can be skipped entirely with ENABLE_AGNO_ROUTER=false.
+    """
+    if os.getenv("ENABLE_AGNO_ROUTER", "true").lower() in ("0", "false", "no"):
+        return
+    from agno.app.fastapi.app import FastAPIApp
+    app.include_router(FastAPIApp(agent=get_basic_agent()).get_async_router())
+
+@app.on_event("startup")
+async def start_job_queue():
+    """Resume queued and interrupted jobs (set JOB_QUEUE_ENABLED=false to not process jobs here)"""
+    if os.getenv("JOB_QUEUE_ENABLED", "true").lower() in ("0", "false", "no"):
+        return
+    get_job_queue().start()
+
+@app.on_event("shutdown")
+async def stop_job_queue():
+    if get_job_queue.cache_info().currsize:
+        get_job_queue().stop(wait=False)
+
+@app.on_event("startup")
+async def start_prewarmer():
+    """Keep forecasts for hot locations warm (PREWARM_ENABLED=false to turn off)"""
+    if PREWARM_ENABLED:
+        get_prewarmer().start()
+
+@app.on_event("shutdown")
+async def stop_prewarmer():
+    if get_prewarmer.cache_info().currsize:
+        get_prewarmer().stop()
+
+@app.on_event("shutdown")
+async def stop_pdf_workers():
+    pdf_export.shutdown()
 
 @app.post("/chat")
-async def chat_handler(request: ChatRequest):
+async def chat_handler(request: ChatRequest, http_request: Request):
     """Original chat endpoint for conversational weather queries"""
     try:
         user_message = request.message
         user_id = request.user_id
 
-        agent_response = await basic_agent.arun(user_message, user_id=user_id)
+        # Equivalent questions (same location, date span and units) are answered from cache
+        bypass_cache = request.no_cache or "no-cache" in http_request.headers.get("cache-control", "")
+        cached_response = get_cached_response(user_message, bypass=bypass_cache)
+        if cached_response is not None:
+            if user_id:
+                get_session_store().append_turn(user_id, user_message, cached_response)
+            return {"response": cached_response, "status": "success", "cached": True}
+
+        # Only model calls take an admission slot; cached answers above never wait
+        with track_fallbacks() as fallback_tools:
+            async with _chat_slot(user_id, http_request):
+                agent_response = await get_breaker("gemini").call_async(
+                    new_chat_agent().arun, messages=_chat_messages(user_id, user_message), user_id=user_id
+                )
         
         if hasattr(agent_response, 'content') and agent_response.content is not None:
             response_content = agent_response.content
@@ -92,100 +242,399 @@ async def chat_handler(request: ChatRequest):
         
         if not isinstance(response_content, str):
             response_content = str(response_content)
+        
+        # An answer built on a failed or stale tool result must not outlive the outage
+        if not fallback_tools:
+            store_response(user_message, response_content)
+        if user_id:
+            get_session_store().append_turn(user_id, user_message, response_content)
             
         return {"response": response_content, "status": "success"}
+    except CircuitOpenError as e:
+        return JSONResponse(
+            status_code=503,
+            headers={"Retry-After": str(int(e.retry_after) + 1)},
+            content={
+                "status": "error",
+                "message": "The weather assistant is temporarily unavailable. Please try again shortly."
+            }
+        )
+    except AdmissionRejected as e:
+        return JSONResponse(
+            status_code=e.status,
+            headers={"Retry-After": str(e.retry_after)},
+            content={
+                "status": "error",
+                "message": "The weather assistant is busy. Please try again shortly.",
+                "retry_after": e.retry_after
+            }
+        )
     except Exception as e:
         return JSONResponse(
             status_code=500,
             content={"status": "error", "message": str(e)}
         )
 
+def _chat_slot(user_id: Optional[str], http_request: Request):
+    """Admission slot for a /chat model call, queued fairly per user"""
+    if not ADMISSION_ENABLED:
+        return contextlib.nullcontext()
+    user = f"user:{user_id}" if user_id else admission_user_key(http_request.scope)
+    return get_gate("chat").slot(user)
+
+def _sse(event: str, data: dict) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def _tool_call_summary(tool) -> dict:
+    """Name, arguments and (when finished) result of an Agno tool call"""
+    if not isinstance(tool, dict):
+        tool = getattr(tool, '__dict__', {})
+    summary = {"tool_name": tool.get("tool_name"), "tool_args": tool.get("tool_args")}
+    if tool.get("content") is not None:
+        summary["result"] = str(tool["content"])
+    return summary
+
+@app.post("/chat/stream")
+async def chat_stream_handler(request: ChatRequest, http_request: Request):
+    """Streaming chat: forwards model tokens and tool-call progress as server-sent events.
+
+    Events: `start`, `token` ({content}), `tool_call_started` / `tool_call_completed`
+    ({tool_name, tool_args, result}), `done` and `error`. If the client disconnects the
+    agent run is closed, which cancels the in-flight model call.
+    """
+    breaker = get_breaker("gemini")
+    if not breaker.allow_request():
+        return JSONResponse(
+            status_code=503,
+            headers={"Retry-After": str(int(breaker.retry_after()) + 1)},
+            content={
+                "status": "error",
+                "message": "The weather assistant is temporarily unavailable. Please try again shortly."
+            }
+        )
+
+    async def event_stream():
+        start = time.monotonic()
+        first_event_latency = None
+        run_stream = None
+        recorded = False
+        answer = []
+        try:
+            yield _sse("start", {"status": "started"})
+
+            run_stream = await new_chat_agent().arun(
+                messages=_chat_messages(request.user_id, request.message), user_id=request.user_id,
+                stream=True, stream_intermediate_steps=True
+            )
+            async for chunk in run_stream:
+                if first_event_latency is None:
+                    first_event_latency = time.monotonic() - start
+                if await http_request.is_disconnected():
+                    break
+
+                event = getattr(chunk, "event", "RunResponse")
+                if event == "ToolCallStarted":
+                    for tool in getattr(chunk, "tools", None) or []:
+                        yield _sse("tool_call_started", _tool_call_summary(tool))
+                elif event == "ToolCallCompleted":
+                    for tool in getattr(chunk, "tools", None) or []:
+                        yield _sse("tool_call_completed", _tool_call_summary(tool))
+                elif event == "RunResponse" and getattr(chunk, "content", None):
+                    answer.append(str(chunk.content))
+                    yield _sse("token", {"content": str(chunk.content)})
+
+            # Time to the first model event is what the breaker's latency threshold should see
+            breaker.record_success(first_event_latency if first_event_latency is not None else time.monotonic() - start)
+            recorded = True
+            if request.user_id and answer:
+                get_session_store().append_turn(request.user_id, request.message, "".join(answer))
+            yield _sse("done", {"status": "success"})
+        except Exception as e:
+            breaker.record_failure(time.monotonic() - start, str(e))
+            recorded = True
+            yield _sse("error", {"status": "error", "message": str(e)})
+        finally:
+            # Runs on normal completion and when the client disconnects (CancelledError)
+            if not recorded:
+                breaker.release()
+            if run_stream is not None and hasattr(run_stream, "aclose"):
+                await run_stream.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/chat/cache/stats")
+async def chat_cache_stats():
+    """Hit-rate metrics for the /chat response cache, and session store size"""
+    return {"success": True, "response_cache": response_cache_stats(), "sessions": get_session_store().stats()}
+
+# ============ CONDITIONAL GET HELPERS ============
+
+# Clients may store responses but must revalidate them with If-None-Match
+CONDITIONAL_CACHE_CONTROL = "private, no-cache"
+
+def _data_etag(http_request: Request) -> str:
+    """Weak ETag built from the weather_requests data version and the request URL"""
+    version = get_db().get_data_version()
+    url = f"{http_request.url.path}?{http_request.url.query}"
+    return f'W/"{version}-{hashlib.sha1(url.encode()).hexdigest()[:12]}"'
+
+def _etag_matches(http_request: Request, etag: str) -> bool:
+    """Weak comparison of an ETag against the If-None-Match header"""
+    header = http_request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag.removeprefix("W/") in [tag.strip().removeprefix("W/") for tag in header.split(",")]
+
+def _not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CONDITIONAL_CACHE_CONTROL})
+
+def _set_etag(response: Response, etag: str):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CONDITIONAL_CACHE_CONTROL
+
 @app.get("/test")
 async def test_endpoint():
     """Health check endpoint"""
     return {"message": "Advanced Weather App API is running!", "version": "2.0.0"}
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics for this worker process"""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/health/upstreams")
+async def upstream_health():
+    """Circuit breaker state and counters for each upstream provider"""
+    upstreams = breaker_snapshots()
+    degraded = [name for name, snapshot in upstreams.items() if snapshot['state'] != 'closed']
+    return {
+        "status": "degraded" if degraded else "ok",
+        "degraded": degraded,
+        "upstreams": upstreams,
+        "prewarm": get_prewarmer().last_run if PREWARM_ENABLED else None,
+        "admission": gate_snapshots() if ADMISSION_ENABLED else None
+    }
+
+def _trace_view(trace: dict) -> dict:
+    summary = {key: trace[key] for key in ("trace_id", "name", "duration_ms", "sampled", "dropped_spans")}
+    return dict(summary, waterfall=tracing.waterfall(trace))
+
+@app.get("/debug/traces")
+async def debug_traces(
+    min_duration_ms: float = Query(tracing.TRACE_SLOW_MS, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    format: str = Query("json", pattern="^(json|text)$")
+):
+    """Recent slow traces of this worker as span waterfalls"""
+    traces = tracing.recent_traces(min_duration_ms, limit)
+    if format == "text":
+        return PlainTextResponse("\n\n".join(tracing.render_waterfall(trace) for trace in traces))
+    return {
+        "success": True,
+        "slow_threshold_ms": tracing.TRACE_SLOW_MS,
+        "traces": [
+            _trace_view(trace) for trace in traces
+        ]
+    }
+
+@app.get("/debug/traces/{trace_id}")
+async def debug_trace(trace_id: str, format: str = Query("json", pattern="^(json|text)$")):
+    """One buffered trace (from the X-Trace-Id response header) as a waterfall"""
+    trace = tracing.get_trace(trace_id)
+    if not trace:
+        raise HTTPException(status_code=404, detail="Trace not found (only slow traces are kept in memory)")
+    if format == "text":
+        return PlainTextResponse(tracing.render_waterfall(trace))
+    return {
+        "success": True,
+        "trace": _trace_view(trace)
+    }
+
 # ============ CRUD ENDPOINTS ============
 
+# Handlers that geocode, fetch forecasts or call enrichment providers block on
+# `requests`, so they are plain functions: Starlette runs them in its threadpool
+# and the event loop stays free for cheap routes while they wait.
+
+def _split_param(value: Optional[str]) -> List[str]:
+    """Split a comma-separated query parameter such as ?fields=id,location"""
+    if not value:
+        return []
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+def _wants_enrichment(include: Optional[str]) -> bool:
+    """Enrichment fans out to YouTube / Maps, so it only runs on ?include=enrichment"""
+    return "enrichment" in _split_param(include)
+
+def _enrichment_for(location: str, coordinates: Optional[str]):
+    enrichment = get_api_integrations().get_location_enrichment(
+        location,
+        coordinates,
+        timezone_name=get_db().get_location_timezone(location)
+    )
+    return enrichment.get('enrichment_data') if enrichment['success'] else None
+
+def _create_and_enrich(request: WeatherRequest, include: Optional[str], request_key: Optional[str] = None) -> dict:
+    """Geocode, fetch, store and optionally enrich; raises ValueError on invalid input.
+
+    Calls with the same `request_key` store the request only once.
+    """
+    success, message, request_id = get_db().create_weather_request(
+        location=request.location,
+        start_date=request.start_date,
+        end_date=request.end_date,
+        user_id=request.user_id,
+        request_key=request_key
+    )
+    if not success:
+        raise ValueError(message)
+    
+    weather_record = get_db().read_weather_request_by_id(request_id)
+    if weather_record is None:
+        raise ValueError(f"Weather request {request_id} was deleted")
+    enrichment = None
+    if _wants_enrichment(include):
+        enrichment = _enrichment_for(request.location, weather_record.get('coordinates'))
+    
+    return {
+        "success": True,
+        "message": message,
+        "request_id": request_id,
+        "weather_data": weather_record,
+        "enrichment": enrichment
+    }
+
+def _run_create_weather_request_job(payload: dict) -> dict:
+    # A retry after a crash finds the row the first attempt stored instead of adding another
+    return _create_and_enrich(WeatherRequest(**payload["request"]), payload.get("include"),
+                              request_key=payload.get("request_key"))
+
 @app.post("/weather-requests")
-async def create_weather_request(request: WeatherRequest):
+def create_weather_request(
+    request: WeatherRequest,
+    include: Optional[str] = Query(None),
+    run_async: bool = Query(False, alias="async", description="Queue the work and return 202 with a job id")
+):
     """CREATE: Store a new weather request with date range validation"""
     try:
-        success, message, request_id = db.create_weather_request(
-            location=request.location,
-            start_date=request.start_date,
-            end_date=request.end_date,
-            user_id=request.user_id
-        )
-        
-        if success:
-            # Get enrichment data
-            weather_record = db.read_weather_request_by_id(request_id)
-            enrichment = api_integrations.get_location_enrichment(
-                request.location, 
-                weather_record.get('coordinates')
-            )
+        if run_async:
+            # Only the cheap checks run inline; geocoding, the forecast fetch and
+            # enrichment happen on the job pool
+            date_valid, date_msg, _, _ = get_db().validate_date_range(request.start_date, request.end_date)
+            if not date_valid:
+                raise HTTPException(status_code=400, detail=date_msg)
             
-            return {
-                "success": True,
-                "message": message,
-                "request_id": request_id,
-                "weather_data": weather_record,
-                "enrichment": enrichment.get('enrichment_data') if enrichment['success'] else None
-            }
-        else:
-            raise HTTPException(status_code=400, detail=message)
+            job_id = get_job_queue().enqueue(
+                "create_weather_request",
+                {"request": request.model_dump(), "include": include,
+                 "request_key": uuid.uuid4().hex, "traceparent": tracing.current_traceparent()}
+            )
+            return JSONResponse(
+                status_code=202,
+                content={"success": True, "job_id": job_id, "status": "queued", "status_url": f"/jobs/{job_id}"},
+                headers={"Location": f"/jobs/{job_id}"}
+            )
+        
+        return FastJSONResponse(_create_and_enrich(request, include))
             
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status of an asynchronous job; `result` holds the normal response once it succeeded"""
+    job = get_job_queue().get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"success": True, "job": job}
+
 @app.get("/weather-requests")
 async def read_weather_requests(
+    http_request: Request,
     limit: int = Query(50, ge=1, le=100),
     offset: int = Query(0, ge=0),
-    location_filter: Optional[str] = Query(None)
+    location_filter: Optional[str] = Query(None),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return")
 ):
     """READ: Get all weather requests with optional filtering"""
     try:
-        requests = db.read_weather_requests(
-            limit=limit,
-            offset=offset,
-            location_filter=location_filter
-        )
+        etag = _data_etag(http_request)
+        if _etag_matches(http_request, etag):
+            return _not_modified(etag)
         
-        return {
+        try:
+            requests = get_db().read_weather_requests(
+                limit=limit,
+                offset=offset,
+                location_filter=location_filter,
+                fields=_split_param(fields)
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        # Returned directly, so FastAPI's jsonable_encoder pass is skipped
+        page = FastJSONResponse({
             "success": True,
             "requests": requests,
             "count": len(requests),
             "limit": limit,
             "offset": offset
-        }
+        })
+        _set_etag(page, etag)
+        return page
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reading requests: {str(e)}")
 
 @app.get("/weather-requests/{request_id}")
-async def read_weather_request(request_id: int):
+def read_weather_request(
+    request_id: int,
+    http_request: Request,
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return"),
+    include: Optional[str] = Query(None, description="Set to 'enrichment' to add YouTube / Maps data")
+):
     """READ: Get a specific weather request by ID"""
     try:
-        request_data = db.read_weather_request_by_id(request_id)
+        etag = _data_etag(http_request)
+        if _etag_matches(http_request, etag):
+            return _not_modified(etag)
+        
+        try:
+            request_data = get_db().read_weather_request_by_id(request_id, fields=_split_param(fields))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         if not request_data:
             raise HTTPException(status_code=404, detail="Weather request not found")
         
-        # Get enrichment data
-        enrichment = api_integrations.get_location_enrichment(
-            request_data['location'],
-            request_data.get('coordinates')
-        )
+        enrichment = None
+        if _wants_enrichment(include):
+            # Enrichment needs the location even when it was not selected
+            location_row = request_data
+            if 'location' not in request_data or 'coordinates' not in request_data:
+                location_row = get_db().read_weather_request_by_id(request_id, fields=['location', 'coordinates'])
+            enrichment = _enrichment_for(location_row['location'], location_row.get('coordinates'))
         
-        return {
+        detail = FastJSONResponse({
             "success": True,
             "request": request_data,
-            "enrichment": enrichment.get('enrichment_data') if enrichment['success'] else None
-        }
+            "enrichment": enrichment
+        })
+        _set_etag(detail, etag)
+        return detail
         
     except HTTPException:
         raise
@@ -193,10 +642,10 @@ async def read_weather_request(request_id: int):
         raise HTTPException(status_code=500, detail=f"Error reading request: {str(e)}")
 
 @app.put("/weather-requests/{request_id}")
-async def update_weather_request(request_id: int, update_data: WeatherUpdateRequest):
+def update_weather_request(request_id: int, update_data: WeatherUpdateRequest):
     """UPDATE: Modify an existing weather request"""
     try:
-        success, message = db.update_weather_request(
+        success, message = get_db().update_weather_request(
             request_id=request_id,
             location=update_data.location,
             start_date=update_data.start_date,
@@ -204,7 +653,7 @@ async def update_weather_request(request_id: int, update_data: WeatherUpdateRequ
         )
         
         if success:
-            updated_request = db.read_weather_request_by_id(request_id)
+            updated_request = get_db().read_weather_request_by_id(request_id)
             return {
                 "success": True,
                 "message": message,
@@ -222,7 +671,7 @@ async def update_weather_request(request_id: int, update_data: WeatherUpdateRequ
 async def delete_weather_request(request_id: int):
     """DELETE: Remove a weather request"""
     try:
-        success, message = db.delete_weather_request(request_id)
+        success, message = get_db().delete_weather_request(request_id)
         
         if success:
             return {"success": True, "message": message}
@@ -237,30 +686,33 @@ async def delete_weather_request(request_id: int):
 # ============ API INTEGRATION ENDPOINTS ============
 
 @app.get("/location-enrichment/{location}")
-async def get_location_enrichment(location: str):
+def get_location_enrichment(location: str):
     """Get comprehensive location data including YouTube videos, maps, and news"""
     try:
-        enrichment = api_integrations.get_location_enrichment(location)
-        return enrichment
+        enrichment = get_api_integrations().get_location_enrichment(
+            location,
+            timezone_name=get_db().get_location_timezone(location)
+        )
+        return FastJSONResponse(enrichment)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting enrichment data: {str(e)}")
 
 @app.get("/youtube-videos/{location}")
-async def get_youtube_videos(location: str, max_results: int = Query(5, ge=1, le=10)):
+def get_youtube_videos(location: str, max_results: int = Query(5, ge=1, le=10)):
     """Get YouTube videos related to the location"""
     try:
-        videos = api_integrations.get_youtube_videos(location, max_results)
+        videos = get_api_integrations().get_youtube_videos(location, max_results)
         return videos
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching YouTube videos: {str(e)}")
 
 @app.get("/google-maps/{location}")
-async def get_google_maps_data(location: str):
+def get_google_maps_data(location: str):
     """Get Google Maps data for the location"""
     try:
-        maps_data = api_integrations.get_google_maps_data(location)
+        maps_data = get_api_integrations().get_google_maps_data(location)
         return maps_data
         
     except Exception as e:
@@ -268,14 +720,130 @@ async def get_google_maps_data(location: str):
 
 # ============ DATA EXPORT ENDPOINTS ============
 
+# Rendered in memory, so their size stays capped; streaming formats have no cap
+BUFFERED_EXPORT_MAX_ROWS = 1000
+
+def _export_headers(export_result: dict, compression: str) -> dict:
+    headers = {"Content-Disposition": f"attachment; filename={export_result['filename']}"}
+    if export_result.get('content_encoding'):
+        headers["Content-Encoding"] = export_result['content_encoding']
+    if compression == "auto":
+        # The body depends on the request's Accept-Encoding
+        headers["Vary"] = "Accept-Encoding"
+    return headers
+
+def _export_artifact_meta(export_result: dict) -> dict:
+    """What _export_headers and the response need to serve a cached export file"""
+    return {
+        'content_type': export_result['content_type'],
+        # The filename without its timestamp, which is stamped again for each response
+        'extension': export_result['filename'].split('.', 1)[1],
+        'content_encoding': export_result.get('content_encoding')
+    }
+
 @app.get("/export/weather-requests")
 async def export_weather_requests(
-    format: str = Query(..., pattern="^(json|xml|csv|markdown|md|pdf)$"),
-    limit: int = Query(100, ge=1, le=1000),
-    location_filter: Optional[str] = Query(None)
+    http_request: Request,
+    format: str = Query(..., pattern="^(json|ndjson|xml|csv|markdown|md|pdf)$"),
+    limit: int = Query(100, ge=1),
+    location_filter: Optional[str] = Query(None),
+    compression: str = Query("auto", pattern="^(auto|none|gzip|zstd)$"),
+    accept_encoding: Optional[str] = Header(None),
+    cache_control: Optional[str] = Header(None)
 ):
-    """Export weather requests data in various formats"""
+    """Export weather requests data in various formats.
+
+    compression=auto (default) negotiates gzip or zstd from Accept-Encoding for text
+    formats; gzip or zstd download a compressed file (.csv.gz, .json.zst, ...).
+    Repeat exports of unchanged data are served from the export artifact cache;
+    send "Cache-Control: no-cache" to render afresh. Only renders take an export
+    admission slot; cached exports are never queued.
+    """
     try:
+        try:
+            encoding, as_file = choose_encoding(format, compression, accept_encoding)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        if format not in STREAMING_FORMATS and limit > BUFFERED_EXPORT_MAX_ROWS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"{format} exports are limited to {BUFFERED_EXPORT_MAX_ROWS} rows; "
+                       f"use {', '.join(STREAMING_FORMATS)} for larger exports"
+            )
+        
+        db = get_db()
+        exporter = get_data_exporter()
+        cache = get_export_cache() if artifact_cacheable(format) else None
+        # Stored without the front matter that says when they were generated, and uncompressed
+        records_only = cache is not None and format in FRONT_MATTER_FORMATS
+        artifact = None
+        if cache is not None:
+            version = db.get_data_version()
+            cache_key = cache.key(db=os.path.abspath(db.db_path), data_version=version, format=format,
+                                  limit=limit, location_filter=location_filter,
+                                  encoding=None if records_only else encoding,
+                                  as_file=False if records_only else as_file)
+            if cache_control and "no-cache" in cache_control.lower():
+                metrics.EXPORT_CACHE_LOOKUPS.inc(result="bypass")
+            else:
+                artifact = cache.lookup(cache_key)
+        
+        if artifact is not None and not records_only:
+            headers = _export_headers({**artifact, 'filename': export_filename(artifact['extension'])}, compression)
+            return StreamingResponse(
+                read_chunks(artifact['file']),
+                media_type=artifact['content_type'],
+                headers={**headers, "Content-Length": str(artifact['size'])}
+            )
+        
+        if artifact is None:
+            # Held until the response is sent, streamed renders included (see admission.py)
+            await admit(http_request.scope)
+        
+        if records_only:
+            if artifact is not None:
+                with artifact['file'] as f:
+                    records, total = await run_in_threadpool(f.read), artifact['total']
+            else:
+                rendered = await exporter.export_records_async(
+                    db.read_weather_requests(limit=limit, offset=0, location_filter=location_filter),
+                    format
+                )
+                if not rendered['success']:
+                    raise HTTPException(status_code=400, detail=rendered['error'])
+                records, total = rendered['content'], rendered['total']
+                if db.get_data_version() == version:
+                    cache.store(cache_key, records, {'total': total})
+            export_result = await exporter.attach_front_matter_async(records, total, format)
+            if not export_result['success']:
+                raise HTTPException(status_code=400, detail=export_result['error'])
+            export_result = exporter.compress_export(export_result, encoding, as_file)
+            return Response(
+                content=export_result['content'],
+                media_type=export_result['content_type'],
+                headers=_export_headers(export_result, compression)
+            )
+        
+        if format in STREAMING_FORMATS:
+            # Written straight from the database cursor: flat memory, first bytes at once
+            export_result = exporter.stream_export(
+                db.iter_weather_requests(limit=limit, location_filter=location_filter),
+                format
+            )
+            # Compressed chunk by chunk as rows are written
+            export_result = exporter.compress_export(export_result, encoding, as_file)
+            chunks = export_result['chunks']
+            if cache is not None:
+                # Stored once the whole export has gone out, unless the data changed meanwhile
+                chunks = cache.tee(cache_key, chunks, _export_artifact_meta(export_result),
+                                   lambda: db.get_data_version() == version)
+            return StreamingResponse(
+                chunks,
+                media_type=export_result['content_type'],
+                headers=_export_headers(export_result, compression)
+            )
+        
         # Get data to export
         data = db.read_weather_requests(
             limit=limit,
@@ -283,44 +851,109 @@ async def export_weather_requests(
             location_filter=location_filter
         )
         
-        # Export data
-        export_result = data_exporter.export_data(data, format)
+        # Export data (PDFs are built in a worker process, off the event loop)
+        export_result = await exporter.export_data_async(data, format)
         
         if not export_result['success']:
             raise HTTPException(status_code=400, detail=export_result['error'])
         
+        export_result = exporter.compress_export(export_result, encoding, as_file)
+        if cache is not None and db.get_data_version() == version:
+            cache.store(cache_key, export_result['content'], _export_artifact_meta(export_result))
+        
         # Return appropriate response based on format
         if export_result.get('is_binary', False):
-            # For PDF files
+            # For PDF files and compressed exports
             return Response(
                 content=export_result['content'],
                 media_type=export_result['content_type'],
-                headers={
-                    "Content-Disposition": f"attachment; filename={export_result['filename']}"
-                }
+                headers=_export_headers(export_result, compression)
             )
         else:
             # For text-based formats
             return Response(
                 content=export_result['content'],
                 media_type=export_result['content_type'],
-                headers={
-                    "Content-Disposition": f"attachment; filename={export_result['filename']}"
-                }
+                headers=_export_headers(export_result, compression)
             )
             
+    except AdmissionRejected as e:
+        return JSONResponse(
+            status_code=e.status,
+            headers={"Retry-After": str(e.retry_after)},
+            content={
+                "status": "error",
+                "message": "The server is busy, please retry shortly.",
+                "route_class": e.route_class,
+                "retry_after": e.retry_after
+            }
+        )
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
 
+def _parse_since(value: str) -> str:
+    """ISO 8601 timestamp (naive means UTC) as stored in updated_at"""
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid since timestamp: {value}. Use ISO 8601, e.g. 2024-05-01T00:00:00Z")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed.strftime("%Y-%m-%d %H:%M:%S")
+
+@app.get("/export/weather-requests/changes")
+async def export_weather_request_changes(
+    cursor: int = Query(0, ge=0),
+    since: Optional[str] = Query(None),
+    limit: int = Query(1000, ge=1, le=10000),
+    fields: Optional[str] = Query(None),
+    accept_encoding: Optional[str] = Header(None)
+):
+    """Rows created or updated and ids deleted since `cursor`, for incremental sync.
+
+    Start with cursor=0 (optionally with since=<ISO timestamp>), then pass back the
+    returned cursor. While has_more is true, ask again at once for the next page.
+    """
+    try:
+        delta = get_db().read_weather_request_changes(
+            cursor=cursor,
+            since=_parse_since(since) if since else None,
+            limit=limit,
+            fields=_split_param(fields)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    body = dump_json({
+        "success": True,
+        "cursor": delta['cursor'],
+        "has_more": delta['has_more'],
+        "changes": delta['changes'],
+        "deleted": delta['deleted'],
+        "count": len(delta['changes']) + len(delta['deleted'])
+    })
+    # /export/ bypasses the GZip middleware, so negotiate like the other exports
+    headers = {"Vary": "Accept-Encoding"}
+    encoding, _ = choose_encoding('json', 'auto', accept_encoding)
+    if encoding:
+        body = b"".join(compress_chunks([body], encoding))
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
 # ============ STATISTICS ENDPOINT ============
 
 @app.get("/statistics")
-async def get_statistics():
+async def get_statistics(http_request: Request, response: Response):
     """Get database and usage statistics"""
     try:
-        stats = db.get_statistics()
+        etag = _data_etag(http_request)
+        if _etag_matches(http_request, etag):
+            return _not_modified(etag)
+        _set_etag(response, etag)
+        
+        stats = get_db().get_statistics()
         return {
             "success": True,
             "statistics": stats
@@ -329,9 +962,22 @@ async def get_statistics():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting statistics: {str(e)}")
 
-# Include the agent router for backward compatibility
-app.include_router(agent_router)
-
 if __name__ == "__main__":
+    import argparse
     import uvicorn
-    uvicorn.run("agent:app", host="0.0.0.0", port=8001, reload=True)
\ No newline at end of file
+
+    parser = argparse.ArgumentParser(description="Run the weather app API")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8001")))
+    parser.add_argument("--prod", action="store_true",
+                        help="Production mode: multiple workers, no reload, shared SQLite-backed state")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+                        help="Worker processes in production mode (default: WEB_CONCURRENCY or CPU count)")
+    args = parser.parse_args()
+
+    if args.prod:
+        # Workers are separate processes and inherit this; it must be set before they import the app
+        os.environ.setdefault("SHARED_STATE_BACKEND", "sqlite")
+        uvicorn.run("agent:app", host=args.host, port=args.port, workers=args.workers)
+    else:
+        uvicorn.run("agent:app", host=args.host, port=args.port, reload=True)
\ No newline at end of file
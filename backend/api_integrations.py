@@ -2,41 +2,86 @@ import requests
 import json
 from typing import List, Dict, Optional
 import os
-from urllib.parse import quote
-from agno.agent import Agent
-try:
-    from agno.tools.serpapi import SerpApiTools
-    AGNO_SERPAPI_AVAILABLE = True
-except ImportError:
-    AGNO_SERPAPI_AVAILABLE = False
-    print("Warning: Agno SerpAPI tools not available")
+import threading
+from urllib.parse import quote, urlparse, parse_qs
+from cache import create_cache
+from circuit_breaker import get_breaker
+import tracing
+from timezone_lookup import describe_timezone, lookup_timezone, parse_coordinates
 
-try:
-    from agno.tools.google_maps import GoogleMapTools
-    AGNO_MAPS_AVAILABLE = True
-except ImportError:
-    AGNO_MAPS_AVAILABLE = False
-    print("Warning: Agno Google Maps tools not available")
+# Integration modes:
+#   direct - call the SerpAPI / Places JSON endpoints and map them to our result shape
+#   agent  - ask an Agno agent (LLM + tool call) and scrape its text reply
+MODE_DIRECT = 'direct'
+MODE_AGENT = 'agent'
+
+# Base URLs are overridable so benchmarks can point the clients at local stubs
+SERPAPI_BASE_URL = os.getenv('SERPAPI_BASE_URL', 'https://serpapi.com')
+GOOGLE_MAPS_BASE_URL = os.getenv('GOOGLE_MAPS_BASE_URL', 'https://maps.googleapis.com')
+YOUTUBE_API_BASE_URL = os.getenv('YOUTUBE_API_BASE_URL', 'https://www.googleapis.com')
 
 class APIIntegrations:
-    def __init__(self):
+    def __init__(self, mode: Optional[str] = None):
         # Load API keys from environment variables
         self.youtube_api_key = os.getenv('YOUTUBE_API_KEY')
         self.google_maps_api_key = os.getenv('GOOGLE_MAPS_API_KEY')
+        self.serpapi_api_key = os.getenv('SERPAPI_API_KEY')
         
         # Check if we have valid API keys
         self.has_valid_youtube_key = self.youtube_api_key 
         self.has_valid_maps_key = self.google_maps_api_key
         
+        self.mode = (mode or os.getenv('API_INTEGRATIONS_MODE', MODE_DIRECT)).lower()
+        if self.mode not in (MODE_DIRECT, MODE_AGENT):
+            raise ValueError(f"Unknown API integrations mode: {self.mode}. Use '{MODE_DIRECT}' or '{MODE_AGENT}'")
+        
+        # Shared HTTP session so direct calls reuse connections
+        self.http = requests.Session()
+        
+        # Last good results, served when a provider's circuit breaker is open
+        self._last_good = create_cache('integrations_last_good', maxsize=512, ttl=6 * 3600)
+        
         # Initialize Agno agent with SerpAPI tools for YouTube search
         # Note: SerpApiTools requires SERPAPI_API_KEY environment variable
         self.agno_serpapi_available = False
         self.youtube_agent = None
+        self.agno_maps_available = False
+        self.maps_agent = None
         
-        # Check if SerpAPI key is available
-        serpapi_key = os.getenv('SERPAPI_API_KEY')
+        # Agno agents (and the agno/googlemaps imports) are only created when agent mode is first used
+        self._agents_initialized = False
+        self._agents_lock = threading.Lock()
+    
+    def _ensure_agents(self):
+        """Create the Agno agents on first use in agent mode"""
+        if self._agents_initialized:
+            return
+        with self._agents_lock:
+            if not self._agents_initialized:
+                self._init_agents()
+                self._agents_initialized = True
+    
+    def _init_agents(self):
+        """Create the Agno agents used in agent mode"""
+        from agno.agent import Agent
+        
+        try:
+            from agno.tools.serpapi import SerpApiTools
+            agno_serpapi_available = True
+        except ImportError:
+            agno_serpapi_available = False
+            print("Warning: Agno SerpAPI tools not available")
+        
+        try:
+            from agno.tools.google_maps import GoogleMapTools
+            agno_maps_available = True
+        except ImportError:
+            agno_maps_available = False
+            print("Warning: Agno Google Maps tools not available")
         
-        if AGNO_SERPAPI_AVAILABLE and serpapi_key:
+        serpapi_key = self.serpapi_api_key
+        
+        if agno_serpapi_available and serpapi_key:
             try:
                 self.youtube_agent = Agent(
                     name="YouTube Search Agent",
@@ -56,10 +101,7 @@ class APIIntegrations:
         
         # Initialize Agno agent with Google Maps tools
         # Note: GoogleMapTools requires GOOGLE_MAPS_API_KEY environment variable
-        self.agno_maps_available = False
-        self.maps_agent = None
-        
-        if AGNO_MAPS_AVAILABLE and self.has_valid_maps_key:
+        if agno_maps_available and self.has_valid_maps_key:
             try:
                 # Set environment variable for Agno tools
                 os.environ['GOOGLE_MAPS_API_KEY'] = self.google_maps_api_key
@@ -78,15 +120,52 @@ class APIIntegrations:
                 self.maps_agent = None
                 self.agno_maps_available = False
     
+    def _upstream_get(self, provider: str, url: str, params: Dict) -> requests.Response:
+        """GET through the provider's circuit breaker; transport errors and 5xx count as failures"""
+        breaker = get_breaker(provider)
+        
+        def fetch():
+            response = self.http.get(url, params=params, timeout=breaker.timeout)
+            if response.status_code >= 500:
+                response.raise_for_status()
+            return response
+        
+        return breaker.call(fetch)
+    
+    def _with_last_good(self, key: tuple, result: Dict, is_fallback: bool) -> Dict:
+        """Remember good results; swap fallback results for the last good one when we have it"""
+        if not is_fallback:
+            self._last_good.set(key, result)
+            return result
+        
+        cached = self._last_good.get(key)
+        if cached:
+            return dict(cached, stale=True, message=f"{cached['message']} (cached, upstream unavailable)")
+        return result
+    
+    @tracing.traced("integrations.get_youtube_videos")
     def get_youtube_videos(self, location: str, max_results: int = 5) -> Dict:
         """Get YouTube videos related to the location using YouTube Data API"""
+        if self.mode == MODE_DIRECT:
+            result = self._get_youtube_videos_direct(location, max_results)
+        else:
+            result = self._get_youtube_videos_agent(location, max_results)
+        
+        return self._with_last_good(
+            ('youtube', location.lower(), max_results), result, result.get('source') == 'fallback_error'
+        )
+    
+    def _get_youtube_videos_agent(self, location: str, max_results: int = 5) -> Dict:
+        """Get YouTube videos by asking the Agno SerpAPI agent"""
         try:
+            self._ensure_agents()
+            
             # First try Agno SerpAPI tools if available
             if self.agno_serpapi_available and self.youtube_agent:
                 search_query = f"Search YouTube for {max_results} videos about {location} travel, tourism, weather, or visiting guide"
                 
                 try:
-                    response = self.youtube_agent.run(search_query)
+                    response = get_breaker('enrichment_agent').call(self.youtube_agent.run, search_query)
                     
                     if response and hasattr(response, 'content'):
                         response_content = str(response.content)
@@ -110,6 +189,71 @@ class APIIntegrations:
         except Exception as e:
             return self._get_real_youtube_videos(location, max_results)
     
+    def _get_youtube_videos_direct(self, location: str, max_results: int = 5) -> Dict:
+        """Search YouTube through the SerpAPI JSON endpoint, falling back to the YouTube Data API"""
+        if not self.serpapi_api_key:
+            return self._get_real_youtube_videos(location, max_results)
+        
+        try:
+            response = self._upstream_get(
+                'serpapi',
+                f"{SERPAPI_BASE_URL}/search.json",
+                {
+                    'engine': 'youtube',
+                    'search_query': f"{location} travel guide weather",
+                    'api_key': self.serpapi_api_key
+                }
+            )
+            response.raise_for_status()
+            videos = self._parse_serpapi_youtube_json(response.json(), location, max_results)
+            
+            if videos:
+                return {
+                    'success': True,
+                    'videos': videos,
+                    'message': f'Found {len(videos)} videos for {location} using SerpAPI',
+                    'source': 'serpapi'
+                }
+        except Exception as e:
+            print(f"SerpAPI YouTube search failed: {e}")
+        
+        return self._get_real_youtube_videos(location, max_results)
+    
+    def _parse_serpapi_youtube_json(self, data: Dict, location: str, max_results: int = 5) -> List[Dict]:
+        """Map SerpAPI `video_results` onto the same video shape the agent parser produces"""
+        videos = []
+        
+        for item in data.get('video_results', []):
+            if len(videos) >= max_results:
+                break
+            
+            url = item.get('link', '')
+            video_id = parse_qs(urlparse(url).query).get('v', [None])[0]
+            if not video_id:
+                continue
+            
+            thumbnail = item.get('thumbnail')
+            if isinstance(thumbnail, dict):
+                thumbnail = thumbnail.get('static') or thumbnail.get('rich')
+            
+            channel = item.get('channel')
+            if isinstance(channel, dict):
+                channel = channel.get('name')
+            
+            views = item.get('views')
+            videos.append({
+                'title': item.get('title') or f'Video about {location}',
+                'description': item.get('description') or f'Video content related to {location}',
+                'thumbnail': thumbnail or f'https://img.youtube.com/vi/{video_id}/mqdefault.jpg',
+                'url': f'https://www.youtube.com/watch?v={video_id}',
+                'channel': channel or 'Unknown Channel',
+                'duration': item.get('length') or 'N/A',
+                'video_id': video_id,
+                'views': f'{views:,}' if isinstance(views, int) else (views or 'N/A')
+            })
+        
+        return videos
+    
     def _parse_serpapi_youtube_response(self, response_content: str, location: str) -> List[Dict]:
         """Parse Agno SerpAPI YouTube response to extract video information"""
         try:
@@ -183,7 +327,7 @@ class APIIntegrations:
                 return self._get_fallback_youtube_data(location, "No valid YouTube API key configured")
             
             # YouTube Data API v3 search endpoint
-            search_url = "https://www.googleapis.com/youtube/v3/search"
+            search_url = f"{YOUTUBE_API_BASE_URL}/youtube/v3/search"
             
             # Search queries related to location and weather/travel
             search_queries = [
@@ -208,7 +352,7 @@ class APIIntegrations:
                     'key': self.youtube_api_key
                 }
                 
-                response = requests.get(search_url, params=params)
+                response = self._upstream_get('youtube', search_url, params)
                 
                 if response.status_code == 200:
                     data = response.json()
@@ -259,14 +403,14 @@ class APIIntegrations:
     def _get_video_details(self, video_id: str) -> Dict:
         """Get additional video details like duration"""
         try:
-            details_url = "https://www.googleapis.com/youtube/v3/videos"
+            details_url = f"{YOUTUBE_API_BASE_URL}/youtube/v3/videos"
             params = {
                 'part': 'contentDetails',
                 'id': video_id,
                 'key': self.youtube_api_key
             }
             
-            response = requests.get(details_url, params=params)
+            response = self._upstream_get('youtube', details_url, params)
             
             if response.status_code == 200:
                 data = response.json()
@@ -308,9 +452,23 @@ class APIIntegrations:
             'source': 'fallback_error'
         }
     
+    @tracing.traced("integrations.get_google_maps_data")
     def get_google_maps_data(self, location: str, coordinates: str = None) -> Dict:
         """Get Google Maps data for the location using Agno Google Maps tools"""
+        if self.mode == MODE_DIRECT:
+            result = self._get_google_maps_data_direct(location, coordinates)
+        else:
+            result = self._get_google_maps_data_agent(location, coordinates)
+        
+        return self._with_last_good(
+            ('maps', location.lower()), result, result.get('source') == 'fallback_data'
+        )
+    
+    def _get_google_maps_data_agent(self, location: str, coordinates: str = None) -> Dict:
+        """Get Google Maps data by asking the Agno Google Maps agent"""
         try:
+            self._ensure_agents()
+            
             if self.agno_maps_available and self.maps_agent:
                 # Use Agno's Google Maps tools for comprehensive location data
                 maps_query = f"""Analyze this location: '{location}'
@@ -321,7 +479,7 @@ class APIIntegrations:
                 4. Local area details"""
                 
                 # Get response from Agno agent with Google Maps tools
-                response = self.maps_agent.run(maps_query)
+                response = get_breaker('enrichment_agent').call(self.maps_agent.run, maps_query)
                 
                 # Parse the response to extract maps information
                 if response and hasattr(response, 'content'):
@@ -359,6 +517,81 @@ class APIIntegrations:
         except Exception as e:
             return self._get_fallback_maps_data(location, coordinates, f"Error with Agno Google Maps tools: {str(e)}")
     
+    def _get_google_maps_data_direct(self, location: str, coordinates: str = None) -> Dict:
+        """Get Google Maps data from the Places Text Search and Nearby Search endpoints"""
+        if not self.has_valid_maps_key:
+            return self._get_fallback_maps_data(location, coordinates, "No Google Maps API key configured")
+        
+        try:
+            response = self._upstream_get(
+                'google_maps',
+                f"{GOOGLE_MAPS_BASE_URL}/maps/api/place/textsearch/json",
+                {'query': location, 'key': self.google_maps_api_key}
+            )
+            response.raise_for_status()
+            data = response.json()
+            
+            results = data.get('results', [])
+            if data.get('status') not in (None, 'OK') or not results:
+                return self._get_fallback_maps_data(
+                    location, coordinates, f"Places search returned {data.get('status', 'no results')}"
+                )
+            
+            place = results[0]
+            lat_lng = place.get('geometry', {}).get('location', {})
+            lat, lng = lat_lng.get('lat'), lat_lng.get('lng')
+            
+            return {
+                'success': True,
+                'maps_data': {
+                    'place_name': place.get('name', location),
+                    'formatted_address': place.get('formatted_address'),
+                    'place_id': place.get('place_id'),
+                    'coordinates': {
+                        'lat': lat,
+                        'lng': lng
+                    },
+                    'map_url': f"https://www.google.com/maps/search/{quote(location)}",
+                    'embed_url': f"https://www.google.com/maps/embed/v1/place?key=YOUR_API_KEY&q={quote(location)}",
+                    'nearby_places': self._get_nearby_places(lat, lng)
+                },
+                'message': f'Found Google Maps data for {location} using Places API',
+                'source': 'google_places_api'
+            }
+            
+        except Exception as e:
+            return self._get_fallback_maps_data(location, coordinates, f"Error with Places API: {str(e)}")
+    
+    def _get_nearby_places(self, lat: float, lng: float, max_results: int = 5) -> List[Dict]:
+        """Get points of interest around a coordinate using Places Nearby Search"""
+        if lat is None or lng is None:
+            return []
+        
+        try:
+            response = self._upstream_get(
+                'google_maps',
+                f"{GOOGLE_MAPS_BASE_URL}/maps/api/place/nearbysearch/json",
+                {
+                    'location': f"{lat},{lng}",
+                    'radius': 2000,
+                    'type': 'tourist_attraction',
+                    'key': self.google_maps_api_key
+                }
+            )
+            response.raise_for_status()
+            
+            return [
+                {
+                    'name': place.get('name'),
+                    'type': (place.get('types') or ['point_of_interest'])[0],
+                    'rating': str(place['rating']) if place.get('rating') is not None else 'N/A'
+                }
+                for place in response.json().get('results', [])[:max_results]
+            ]
+        except Exception as e:
+            print(f"Places nearby search failed: {e}")
+            return []
+    
     def _get_fallback_maps_data(self, location: str, coordinates: str = None, reason: str = "") -> Dict:
         """Fallback method for Google Maps data when Agno tools are not available"""
         coords = coordinates.split(',') if coordinates else ['40.7128', '-74.0060']
@@ -384,6 +617,7 @@ class APIIntegrations:
             'source': 'fallback_data'
         }
     
+    @tracing.traced("integrations.get_news_articles")
     def get_news_articles(self, location: str, max_results: int = 5) -> Dict:
         """Get news articles related to the location (using NewsAPI)"""
         try:
@@ -417,43 +651,45 @@ class APIIntegrations:
                 'message': f'Error fetching news articles: {str(e)}'
             }
     
-    def get_time_zone_info(self, coordinates: str) -> Dict:
-        """Get timezone information for the location"""
+    @tracing.traced("integrations.get_time_zone_info")
+    def get_time_zone_info(self, coordinates: str, timezone_name: str = None) -> Dict:
+        """Get timezone information for the location without any network calls"""
         try:
-            if not coordinates:
+            if not coordinates and not timezone_name:
                 return {
                     'success': False,
                     'timezone_data': None,
                     'message': 'Coordinates required for timezone lookup'
                 }
             
-            coords = coordinates.split(',')
-            lat, lng = coords[0].strip(), coords[1].strip()
+            # Prefer the zone Open-Meteo already gave us, otherwise resolve it locally
+            source = 'open_meteo'
+            if not timezone_name:
+                coords = parse_coordinates(coordinates)
+                if not coords:
+                    return {
+                        'success': False,
+                        'timezone_data': None,
+                        'message': f'Invalid coordinates: {coordinates}'
+                    }
+                timezone_name = lookup_timezone(*coords)
+                if not timezone_name:
+                    return {
+                        'success': False,
+                        'timezone_data': None,
+                        'message': f'Timezone unknown for {coordinates} (install timezonefinder for boundary lookups)'
+                    }
+                source = 'boundary_lookup'
             
-            # Using WorldTimeAPI (free)
-            url = f"http://worldtimeapi.org/api/timezone"
-            response = requests.get(url)
+            timezone_data = describe_timezone(timezone_name)
+            timezone_data['coordinates'] = coordinates
             
-            if response.status_code == 200:
-                timezones = response.json()
-                
-                # For demo, return a sample timezone
-                return {
-                    'success': True,
-                    'timezone_data': {
-                        'timezone': 'America/New_York',
-                        'current_time': '2024-01-15T15:30:00-05:00',
-                        'utc_offset': '-05:00',
-                        'coordinates': coordinates
-                    },
-                    'message': 'Timezone information retrieved'
-                }
-            else:
-                return {
-                    'success': False,
-                    'timezone_data': None,
-                    'message': 'Unable to fetch timezone information'
-                }
+            return {
+                'success': True,
+                'timezone_data': timezone_data,
+                'message': 'Timezone information retrieved',
+                'source': source
+            }
                 
         except Exception as e:
             return {
@@ -462,7 +698,9 @@ class APIIntegrations:
                 'message': f'Error fetching timezone info: {str(e)}'
             }
     
-    def get_location_enrichment(self, location: str, coordinates: str = None) -> Dict:
+    @tracing.traced("integrations.get_location_enrichment")
+    def get_location_enrichment(self, location: str, coordinates: str = None,
+                                timezone_name: str = None) -> Dict:
         """Get comprehensive location enrichment data"""
         try:
             enrichment_data = {
@@ -483,8 +721,8 @@ class APIIntegrations:
             enrichment_data['news'] = news_data
             
             # Get timezone info
-            if coordinates:
-                timezone_data = self.get_time_zone_info(coordinates)
+            if coordinates or timezone_name:
+                timezone_data = self.get_time_zone_info(coordinates, timezone_name)
                 enrichment_data['timezone'] = timezone_data
             
             return {
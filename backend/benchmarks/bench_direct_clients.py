@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Benchmark the direct SerpAPI / Places clients against local stub servers.
+
+Usage:
+    python benchmarks/bench_direct_clients.py [--iterations 50] [--latency 0.05]
+
+Pass --agent to also time agent mode. Agent mode goes through a real LLM and
+the real upstream APIs, so it needs the usual API keys and network access.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_servers import StubServer, google_places_routes, serpapi_routes
+
+
+def _time_calls(fn, iterations: int):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _report(label: str, timings):
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"{label:<28} n={len(timings):<4} mean={statistics.mean(timings) * 1000:8.2f}ms "
+          f"p50={statistics.median(timings) * 1000:8.2f}ms p95={p95 * 1000:8.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated upstream latency in seconds")
+    parser.add_argument("--agent", action="store_true", help="Also benchmark agent mode against live services")
+    args = parser.parse_args()
+
+    with StubServer(serpapi_routes(), latency=args.latency) as serpapi, \
+            StubServer(google_places_routes(), latency=args.latency) as places:
+        os.environ.setdefault("SERPAPI_API_KEY", "stub-key")
+        os.environ.setdefault("GOOGLE_MAPS_API_KEY", "stub-key")
+        os.environ["SERPAPI_BASE_URL"] = serpapi.url
+        os.environ["GOOGLE_MAPS_BASE_URL"] = places.url
+
+        # Import after the base URLs are set, they are read at module load
+        from api_integrations import APIIntegrations
+
+        direct = APIIntegrations(mode="direct")
+        result = direct.get_youtube_videos("London", max_results=3)
+        assert result["source"] == "serpapi", result
+        result = direct.get_google_maps_data("London")
+        assert result["source"] == "google_places_api", result
+
+        print(f"Stub latency: {args.latency * 1000:.0f}ms per upstream call")
+        _report("direct youtube", _time_calls(lambda: direct.get_youtube_videos("London", 3), args.iterations))
+        _report("direct maps", _time_calls(lambda: direct.get_google_maps_data("London"), args.iterations))
+
+    if args.agent:
+        agent = APIIntegrations(mode="agent")
+        iterations = max(1, args.iterations // 10)
+        _report("agent youtube (live)", _time_calls(lambda: agent.get_youtube_videos("London", 3), iterations))
+        _report("agent maps (live)", _time_calls(lambda: agent.get_google_maps_data("London"), iterations))
+
+
+if __name__ == "__main__":
+    main()
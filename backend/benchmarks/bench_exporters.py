@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the DataExporter formats.
+
+Generates synthetic weather-request rows (same columns and a realistic
+`weather_data` text as the real table) and measures, for every format and
+dataset size, the render time (best of --repeats) and the peak memory
+allocated while rendering (tracemalloc, in a separate untimed run).
+
+Results are written as JSON, tagged with the git commit, so runs from two
+versions can be compared with --compare (exit 1 on a regression).
+
+Usage:
+    python benchmarks/bench_exporters.py [--sizes 10 100 1000 10000 100000]
+                                         [--formats json xml csv markdown pdf]
+                                         [--output results.json] [--compare old.json]
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from typing import Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from data_export import REPORTLAB_AVAILABLE, DataExporter
+
+FORMATS = ["json", "xml", "csv", "markdown", "pdf"]
+DEFAULT_SIZES = [10, 100, 1000, 10000, 100000]
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+LOCATIONS = ["London", "Paris", "Tokyo", "New York", "Berlin", "Sydney", "Cairo", "Lima", "Oslo", "Toronto"]
+CONDITIONS = ["Clear sky", "Partly cloudy", "Overcast", "Fog", "Rain: Slight intensity", "Snow fall: Moderate intensity"]
+
+
+def synthetic_rows(count: int, seed: int = 42) -> List[Dict]:
+    """Rows shaped like WeatherDatabase.read_weather_requests output"""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(1, count + 1):
+        location = rng.choice(LOCATIONS)
+        start = date(2025, 1, 1) + timedelta(days=rng.randint(0, 300))
+        days = rng.randint(1, 7)
+        forecast = "\n".join(
+            f"  {start + timedelta(days=d)}: {rng.choice(CONDITIONS)}. High: {rng.uniform(10, 30):.1f}°C, "
+            f"Low: {rng.uniform(-5, 15):.1f}°C. Precip: {rng.uniform(0, 8):.1f}mm (Prob: {rng.randint(0, 100)}%)"
+            for d in range(days)
+        )
+        weather_data = (
+            f"Current weather in {location} (Daytime):\n"
+            f"- Temperature: {rng.uniform(-5, 30):.1f}°C (Feels like: {rng.uniform(-8, 32):.1f}°C)\n"
+            f"- Humidity: {rng.randint(20, 100)}%\n"
+            f"- Condition: {rng.choice(CONDITIONS)} (WMO Code: {rng.choice([0, 2, 3, 45, 61, 73])})\n"
+            f"- Wind Speed: {rng.uniform(0, 40):.1f} km/h\n"
+            f"- Precipitation (last hour): {rng.uniform(0, 3):.1f}mm\n\nBrief Forecast:\n{forecast}"
+        )
+        created = datetime(2025, 1, 1) + timedelta(seconds=rng.randint(0, 300 * 86400))
+        rows.append({
+            'id': i,
+            'location': location,
+            'normalized_location': location,
+            'start_date': start.isoformat(),
+            'end_date': (start + timedelta(days=days - 1)).isoformat(),
+            'weather_data': weather_data,
+            'created_at': created.strftime('%Y-%m-%d %H:%M:%S'),
+            'updated_at': created.strftime('%Y-%m-%d %H:%M:%S'),
+            'user_id': rng.choice(['weather_app_user', None]),
+            'coordinates': f"{rng.uniform(-60, 60):.4f},{rng.uniform(-180, 180):.4f}",
+        })
+    return rows
+
+
+def _render(exporter: DataExporter, fmt: str, rows: List[Dict]):
+    if fmt == "json":
+        return exporter.export_to_json(rows)
+    if fmt == "xml":
+        return exporter.export_to_xml(rows)
+    if fmt == "csv":
+        return exporter.export_to_csv(rows)
+    if fmt == "markdown":
+        return exporter.export_to_markdown(rows)
+    if fmt == "pdf":
+        return exporter.export_to_pdf(rows)
+    raise ValueError(f"Unknown format {fmt}")
+
+
+def measure(exporter: DataExporter, fmt: str, rows: List[Dict], repeats: int) -> Dict:
+    timings = []
+    output = None
+    for _ in range(repeats):
+        output = None
+        gc.collect()
+        start = time.perf_counter()
+        output = _render(exporter, fmt, rows)
+        timings.append(time.perf_counter() - start)
+    size = len(output.encode("utf-8") if isinstance(output, str) else output)
+    output = None
+
+    # Peak memory is measured on its own run, tracemalloc slows allocation-heavy code down
+    gc.collect()
+    tracemalloc.start()
+    _render(exporter, fmt, rows)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "best_seconds": round(min(timings), 6),
+        "mean_seconds": round(sum(timings) / len(timings), 6),
+        "repeats": repeats,
+        "peak_memory_bytes": peak,
+        "output_bytes": size,
+        "rows_per_second": round(len(rows) / min(timings), 1) if min(timings) else None,
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> bool:
+    """Print time and memory ratios against a previous run; False on a regression"""
+    ok = True
+    print(f"\n{'format':<10}{'rows':>8}{'time':>10}{'memory':>10}")
+    for fmt, by_size in results.items():
+        for size, now in by_size.items():
+            before = baseline.get(fmt, {}).get(size)
+            if not before or "skipped" in now or "skipped" in before:
+                continue
+            time_ratio = now["best_seconds"] / before["best_seconds"] if before["best_seconds"] else 1.0
+            memory_ratio = now["peak_memory_bytes"] / before["peak_memory_bytes"] if before["peak_memory_bytes"] else 1.0
+            flag = ""
+            if time_ratio > 1 + tolerance or memory_ratio > 1 + tolerance:
+                flag, ok = "  REGRESSION", False
+            print(f"{fmt:<10}{size:>8}{time_ratio:>9.2f}x{memory_ratio:>9.2f}x{flag}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--formats", nargs="+", default=FORMATS, choices=FORMATS)
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per case (1 above 10k rows)")
+    parser.add_argument("--pdf-max-rows", type=int, default=10000,
+                        help="Skip PDF above this many rows, it takes minutes at 100k")
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/exporters_<commit>.json)")
+    parser.add_argument("--compare", metavar="PATH", help="Compare with a previous results file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown / growth (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    exporter = DataExporter()
+    results: Dict[str, Dict[str, Dict]] = {fmt: {} for fmt in args.formats}
+    print(f"{'format':<10}{'rows':>8}{'best ms':>12}{'peak MiB':>11}{'output KiB':>12}")
+    for size in args.sizes:
+        rows = synthetic_rows(size)
+        for fmt in args.formats:
+            if fmt == "pdf" and not REPORTLAB_AVAILABLE:
+                results[fmt][str(size)] = {"skipped": "reportlab not installed"}
+                continue
+            if fmt == "pdf" and size > args.pdf_max_rows:
+                results[fmt][str(size)] = {"skipped": f"over --pdf-max-rows {args.pdf_max_rows}"}
+                continue
+            result = measure(exporter, fmt, rows, args.repeats if size <= 10000 else 1)
+            results[fmt][str(size)] = result
+            print(f"{fmt:<10}{size:>8}{result['best_seconds'] * 1000:>12.2f}"
+                  f"{result['peak_memory_bytes'] / 2 ** 20:>11.2f}{result['output_bytes'] / 1024:>12.1f}")
+
+    commit = _git_commit()
+    output = args.output or os.path.join(RESULTS_DIR, f"exporters_{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "commit": commit,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "results": results,
+        }, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"Compared with {baseline.get('commit')} ({baseline.get('timestamp')})")
+        if not compare(results, baseline["results"], args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
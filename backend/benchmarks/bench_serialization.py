@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Serialization cost of a /weather-requests page.
+
+Renders the list response body for synthetic pages (same rows as the exporter
+benchmarks) with each strategy and reports the best time per page:
+
+    fastapi_default  jsonable_encoder + JSONResponse, what a returned dict costs
+    stdlib           json.dumps only (the FastJSONResponse fallback without orjson)
+    fast             FastJSONResponse (orjson when installed)
+
+Every strategy's output is checked to decode to the same document. Results are
+written as JSON tagged with the git commit; --compare fails (exit 1) when a
+strategy got slower than the tolerance.
+
+Usage:
+    python benchmarks/bench_serialization.py [--sizes 10 50 100 1000] [--compare old.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_exporters import RESULTS_DIR, _git_commit, synthetic_rows
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import fast_json
+from fast_json import FastJSONResponse
+
+DEFAULT_SIZES = [10, 50, 100, 1000]
+
+
+def _page(rows: List[Dict]) -> Dict:
+    return {
+        "success": True,
+        "requests": rows,
+        "count": len(rows),
+        "limit": len(rows),
+        "offset": 0
+    }
+
+
+def strategies(rows: List[Dict]) -> Dict[str, Callable[[], bytes]]:
+    return {
+        "fastapi_default": lambda: JSONResponse(jsonable_encoder(_page(rows))).body,
+        "stdlib": lambda: fast_json._stdlib_dumps(_page(rows)),
+        "fast": lambda: FastJSONResponse(_page(rows)).body,
+    }
+
+
+def best_of(fn: Callable[[], bytes], repeats: int, number: int) -> float:
+    """Best mean seconds per call over `repeats` rounds of `number` calls"""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> bool:
+    """Print time ratios against a previous run; False on a regression"""
+    ok = True
+    print(f"\n{'strategy':<18}{'rows':>8}{'time':>10}")
+    for size, by_strategy in results.items():
+        for name, now in by_strategy.items():
+            before = baseline.get(size, {}).get(name)
+            if not before:
+                continue
+            ratio = now["seconds_per_page"] / before["seconds_per_page"] if before["seconds_per_page"] else 1.0
+            flag = ""
+            if ratio > 1 + tolerance:
+                flag, ok = "  REGRESSION", False
+            print(f"{name:<18}{size:>8}{ratio:>9.2f}x{flag}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Rows per page")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/serialization_<commit>.json)")
+    parser.add_argument("--compare", metavar="PATH", help="Compare with a previous results file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    print(f"orjson: {'yes' if fast_json.ORJSON_AVAILABLE else 'no (stdlib fallback)'}")
+    print(f"{'strategy':<18}{'rows':>8}{'us/page':>12}{'vs default':>12}{'KiB':>9}")
+    results: Dict[str, Dict[str, Dict]] = {}
+    for size in args.sizes:
+        rows = synthetic_rows(size)
+        cases = strategies(rows)
+        expected = json.loads(cases["fastapi_default"]())
+        for name, fn in cases.items():
+            if json.loads(fn()) != expected:
+                raise SystemExit(f"{name} rendered a different document for {size} rows")
+
+        # Aim for roughly 0.2 s per round whatever the page size
+        number = max(1, int(0.2 / max(best_of(cases["fastapi_default"], 1, 1), 1e-6)))
+        by_strategy = {}
+        for name, fn in cases.items():
+            seconds = best_of(fn, args.repeats, number)
+            by_strategy[name] = {"seconds_per_page": round(seconds, 9), "output_bytes": len(fn())}
+        baseline = by_strategy["fastapi_default"]["seconds_per_page"]
+        for name, result in by_strategy.items():
+            result["speedup"] = round(baseline / result["seconds_per_page"], 2)
+            print(f"{name:<18}{size:>8}{result['seconds_per_page'] * 1e6:>12.1f}"
+                  f"{result['speedup']:>11.2f}x{result['output_bytes'] / 1024:>9.1f}")
+        results[str(size)] = by_strategy
+
+    commit = _git_commit()
+    output = args.output or os.path.join(RESULTS_DIR, f"serialization_{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "commit": commit,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "orjson": fast_json.ORJSON_AVAILABLE,
+            "results": results,
+        }, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"Compared with {baseline.get('commit')} ({baseline.get('timestamp')})")
+        if not compare(results, baseline["results"], args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark: time to import `agent` and to serve the first requests.
+
+Each measurement runs in a fresh interpreter so module caches do not hide
+cold-start costs. Exits non-zero when a median exceeds its budget, so it can
+guard CI against heavy imports creeping back into module load.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--import-budget 1.5] [--first-request-budget 1.0]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = """
+import json, time
+start = time.perf_counter()
+import agent
+print(json.dumps({"import": time.perf_counter() - start}))
+"""
+
+FIRST_REQUEST_SNIPPET = """
+import json, time
+start = time.perf_counter()
+import agent
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(agent.app) as client:
+    assert client.get("/test").status_code == 200
+    assert client.get("/statistics").status_code == 200
+done = time.perf_counter()
+print(json.dumps({"import": imported - start, "first_request": done - imported}))
+"""
+
+
+def _run(snippet: str, env: dict) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", snippet], cwd=BACKEND_DIR, env=env,
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _slowest_imports(env: dict, count: int = 10):
+    """Top cumulative import times from -X importtime"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import agent"], cwd=BACKEND_DIR, env=env,
+        capture_output=True, text=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), name.rstrip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--import-budget", type=float, default=1.5, help="Seconds allowed for `import agent`")
+    parser.add_argument("--first-request-budget", type=float, default=1.0,
+                        help="Seconds allowed from import to the first responses (includes app startup)")
+    parser.add_argument("--with-agno-router", action="store_true",
+                        help="Mount the Agno compatibility router at startup (builds the Gemini agent)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env["WEATHER_DB_PATH"] = os.path.join(tmp, "bench.db")
+        env["ENABLE_AGNO_ROUTER"] = "true" if args.with_agno_router else "false"
+
+        import_times = [_run(IMPORT_SNIPPET, env)["import"] for _ in range(args.runs)]
+        first_request_times = [_run(FIRST_REQUEST_SNIPPET, env)["first_request"] for _ in range(args.runs)]
+
+        import_median = statistics.median(import_times)
+        first_request_median = statistics.median(first_request_times)
+
+        print(f"import agent:   median {import_median * 1000:8.1f}ms  (budget {args.import_budget * 1000:.0f}ms)")
+        print(f"first requests: median {first_request_median * 1000:8.1f}ms  (budget {args.first_request_budget * 1000:.0f}ms)")
+
+        failed = False
+        if import_median > args.import_budget:
+            failed = True
+            print("\nFAIL: import time over budget. Slowest imports (cumulative):")
+            for cumulative_us, name in _slowest_imports(env):
+                print(f"  {cumulative_us / 1000:8.1f}ms  {name}")
+        if first_request_median > args.first_request_budget:
+            failed = True
+            print("\nFAIL: first-request time over budget")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for the multi-worker production mode.
+
+Starts `agent.py --prod --workers N` for each worker count, drives a read-heavy
+mix (/statistics, /weather-requests, /test) from several client processes and
+reports requests per second, so scaling with worker count can be checked.
+
+Usage:
+    python benchmarks/bench_workers.py [--workers 1 2 4] [--duration 10] [--clients 8]
+"""
+
+import argparse
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATHS = ["/statistics", "/weather-requests?limit=20", "/test"]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until_up(port: int, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/test")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} did not come up")
+
+
+def _client(port: int, duration: float) -> tuple:
+    """One client process: sequential keep-alive requests until the deadline"""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    completed = errors = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        try:
+            conn.request("GET", PATHS[completed % len(PATHS)])
+            response = conn.getresponse()
+            response.read()
+            if response.status == 200:
+                completed += 1
+            else:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    return completed, errors
+
+
+def run(workers: int, duration: float, clients: int) -> float:
+    port = _free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ,
+                   WEATHER_DB_PATH=os.path.join(tmp, "weather.db"),
+                   SHARED_STATE_DB=os.path.join(tmp, "shared_state.db"),
+                   ENABLE_AGNO_ROUTER="false")
+        server = subprocess.Popen(
+            [sys.executable, "agent.py", "--prod", "--workers", str(workers), "--host", "127.0.0.1", "--port", str(port)],
+            cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            _wait_until_up(port)
+            with ProcessPoolExecutor(max_workers=clients) as pool:
+                results = list(pool.map(_client, [port] * clients, [duration] * clients))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    completed = sum(r[0] for r in results)
+    errors = sum(r[1] for r in results)
+    rps = completed / duration
+    print(f"workers={workers:<3} clients={clients:<3} requests={completed:<7} errors={errors:<4} rps={rps:9.1f}")
+    return rps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--clients", type=int, default=8)
+    args = parser.parse_args()
+
+    baseline = None
+    for workers in args.workers:
+        rps = run(workers, args.duration, args.clients)
+        baseline = baseline or rps
+        print(f"    speedup vs {args.workers[0]} worker(s): {rps / baseline:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
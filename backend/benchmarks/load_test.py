@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Mixed-workload load test against local stub upstreams.
+
+Starts stub servers for Open-Meteo (geocoding and forecast), the YouTube Data
+API, SerpAPI, Google Places and Gemini, points `agent.py --prod` at them and
+drives a weighted mix of creates, reads, chat, exports and statistics from
+several client processes. Reports throughput and p50/p95/p99 latency per
+operation. With --save the report becomes a baseline; with --compare a later
+run fails (exit 1) when a p95 regresses past the tolerance.
+
+Usage:
+    python benchmarks/load_test.py [--duration 30] [--clients 8] [--workers 1]
+                                   [--latency 0.05] [--error-rate 0.0]
+                                   [--save baseline.json | --compare baseline.json]
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_workers import BACKEND_DIR, _free_port, _wait_until_up
+from stub_servers import (StubServer, gemini_routes, google_places_routes, open_meteo_forecast_routes,
+                          open_meteo_geocoding_routes, serpapi_routes, youtube_data_api_routes)
+
+LOCATIONS = ["London", "Paris", "Tokyo", "New York", "Berlin", "Sydney", "Cairo", "Lima", "Oslo", "Toronto"]
+EXPORT_FORMATS = ["json", "csv", "xml", "markdown"]
+
+# Relative weight of each operation in the mix
+DEFAULT_MIX = {
+    "create": 10,
+    "list": 25,
+    "detail": 15,
+    "chat": 15,
+    "export": 10,
+    "statistics": 25,
+}
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def _request(conn: http.client.HTTPConnection, rng: random.Random, op: str, request_ids: List[int]):
+    """Build and send one request of type `op`; returns (method, path, body)"""
+    headers = {"Accept-Encoding": "gzip"}
+    if op == "create":
+        start = date.today() - timedelta(days=rng.randint(1, 10))
+        body = json.dumps({
+            "location": rng.choice(LOCATIONS),
+            "start_date": start.isoformat(),
+            "end_date": (start + timedelta(days=rng.randint(0, 3))).isoformat(),
+            "user_id": "load_test",
+        })
+        headers["Content-Type"] = "application/json"
+        conn.request("POST", "/weather-requests", body=body, headers=headers)
+    elif op == "list":
+        conn.request("GET", f"/weather-requests?limit=20&offset={rng.randint(0, 3) * 20}", headers=headers)
+    elif op == "detail":
+        request_id = rng.choice(request_ids) if request_ids else 1
+        include = "?include=enrichment" if rng.random() < 0.3 else ""
+        conn.request("GET", f"/weather-requests/{request_id}{include}", headers=headers)
+    elif op == "chat":
+        body = json.dumps({
+            "message": f"What's the weather in {rng.choice(LOCATIONS)}?",
+            "user_id": f"load_test_{rng.randint(1, 20)}",
+            # Half the chats skip the response cache so the model path is measured too
+            "no_cache": rng.random() < 0.5,
+        })
+        headers["Content-Type"] = "application/json"
+        conn.request("POST", "/chat", body=body, headers=headers)
+    elif op == "export":
+        conn.request("GET", f"/export/weather-requests?format={rng.choice(EXPORT_FORMATS)}&limit=100", headers=headers)
+    elif op == "statistics":
+        conn.request("GET", "/statistics", headers=headers)
+    else:
+        raise ValueError(f"Unknown operation {op}")
+
+
+def _client(port: int, duration: float, mix: Dict[str, int], seed: int, request_ids: List[int]) -> List[tuple]:
+    """One client process: weighted random operations until the deadline"""
+    rng = random.Random(seed)
+    ops, weights = zip(*mix.items())
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    samples = []
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        op = rng.choices(ops, weights)[0]
+        start = time.perf_counter()
+        try:
+            _request(conn, rng, op, request_ids)
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            status = 0
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        samples.append((op, time.perf_counter() - start, status))
+    return samples
+
+
+def _seed(port: int, count: int) -> List[int]:
+    """Create some rows first so reads, details and exports have data"""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    rng = random.Random(0)
+    ids = []
+    for _ in range(count):
+        _request(conn, rng, "create", [])
+        response = conn.getresponse()
+        payload = response.read()
+        if response.status == 200:
+            ids.append(json.loads(payload)["request_id"])
+    return ids
+
+
+def summarize(samples: List[tuple], duration: float) -> Dict:
+    by_op: Dict[str, List[tuple]] = {}
+    for op, latency, status in samples:
+        by_op.setdefault(op, []).append((latency, status))
+    by_op["all"] = [(latency, status) for _, latency, status in samples]
+
+    report = {}
+    for op, values in sorted(by_op.items()):
+        latencies = sorted(latency for latency, _ in values)
+        errors = sum(1 for _, status in values if not 200 <= status < 400)
+        report[op] = {
+            "requests": len(values),
+            "errors": errors,
+            "throughput_rps": round(len(values) / duration, 2),
+            "p50_ms": round(_percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(_percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(_percentile(latencies, 99) * 1000, 2),
+        }
+    return report
+
+
+def print_report(report: Dict):
+    print(f"{'operation':<12}{'requests':>10}{'errors':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for op, row in report.items():
+        print(f"{op:<12}{row['requests']:>10}{row['errors']:>8}{row['throughput_rps']:>10.1f}"
+              f"{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}")
+
+
+def compare(report: Dict, baseline: Dict, tolerance: float) -> bool:
+    """Print p95 changes against a saved baseline; False if any regressed past `tolerance`"""
+    ok = True
+    print(f"\n{'operation':<12}{'base p95':>10}{'now p95':>10}{'change':>9}")
+    for op, row in report.items():
+        if op not in baseline:
+            continue
+        before, now = baseline[op]["p95_ms"], row["p95_ms"]
+        change = (now - before) / before if before else 0.0
+        flag = ""
+        if change > tolerance:
+            flag, ok = "  REGRESSION", False
+        print(f"{op:<12}{before:>10.1f}{now:>10.1f}{change:>+9.0%}{flag}")
+    return ok
+
+
+def run(args) -> Dict:
+    mix = dict(DEFAULT_MIX)
+    for item in args.mix or []:
+        op, _, weight = item.partition("=")
+        if op not in mix:
+            raise SystemExit(f"Unknown operation in --mix: {op}")
+        mix[op] = int(weight)
+    mix = {op: weight for op, weight in mix.items() if weight > 0}
+
+    stub_options = {"latency": args.latency, "error_rate": args.error_rate}
+    with StubServer(open_meteo_geocoding_routes(), **stub_options) as geocoding, \
+            StubServer(open_meteo_forecast_routes(), **stub_options) as forecast, \
+            StubServer(youtube_data_api_routes(), **stub_options) as youtube, \
+            StubServer(serpapi_routes(), **stub_options) as serpapi, \
+            StubServer(google_places_routes(), **stub_options) as places, \
+            StubServer(gemini_routes(), latency=args.llm_latency, error_rate=args.error_rate) as gemini, \
+            tempfile.TemporaryDirectory() as tmp:
+        port = _free_port()
+        env = dict(os.environ,
+                   WEATHER_DB_PATH=os.path.join(tmp, "weather.db"),
+                   SHARED_STATE_DB=os.path.join(tmp, "shared_state.db"),
+                   ENABLE_AGNO_ROUTER="false",
+                   API_INTEGRATIONS_MODE="direct",
+                   OPEN_METEO_GEOCODING_URL=f"{geocoding.url}/v1/search",
+                   OPEN_METEO_FORECAST_URL=f"{forecast.url}/v1/forecast",
+                   YOUTUBE_API_BASE_URL=youtube.url,
+                   SERPAPI_BASE_URL=serpapi.url,
+                   GOOGLE_MAPS_BASE_URL=places.url,
+                   GEMINI_BASE_URL=gemini.url,
+                   GOOGLE_API_KEY="stub-key",
+                   SERPAPI_API_KEY="stub-key",
+                   GOOGLE_MAPS_API_KEY="stub-key",
+                   YOUTUBE_API_KEY="stub-key")
+        server = subprocess.Popen(
+            [sys.executable, "agent.py", "--prod", "--workers", str(args.workers),
+             "--host", "127.0.0.1", "--port", str(port)],
+            cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL,
+            stderr=None if args.verbose else subprocess.DEVNULL
+        )
+        try:
+            _wait_until_up(port)
+            request_ids = _seed(port, args.seed_rows)
+            with ProcessPoolExecutor(max_workers=args.clients) as pool:
+                results = list(pool.map(
+                    _client,
+                    [port] * args.clients,
+                    [args.duration] * args.clients,
+                    [mix] * args.clients,
+                    range(1, args.clients + 1),
+                    [request_ids] * args.clients
+                ))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    samples = [sample for client_samples in results for sample in client_samples]
+    return summarize(samples, args.duration)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of load per run")
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent client processes")
+    parser.add_argument("--workers", type=int, default=1, help="Server worker processes")
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub upstream latency in seconds")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Stub Gemini latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of stub calls that return 503")
+    parser.add_argument("--seed-rows", type=int, default=20, help="Weather requests created before the run")
+    parser.add_argument("--mix", nargs="*", metavar="OP=WEIGHT",
+                        help=f"Override operation weights (defaults: {DEFAULT_MIX})")
+    parser.add_argument("--save", metavar="PATH", help="Write the report as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="Compare p95 latencies against a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95 regression (0.2 = 20%%)")
+    parser.add_argument("--verbose", action="store_true", help="Show the server's stderr")
+    args = parser.parse_args()
+
+    report = run(args)
+    print_report(report)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"config": {k: v for k, v in vars(args).items() if k not in ("save", "compare")},
+                       "report": report}, f, indent=2)
+        print(f"\nBaseline written to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["report"]
+        if not compare(report, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
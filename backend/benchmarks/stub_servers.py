@@ -0,0 +1,281 @@
+"""
+Local stub servers for the upstream APIs the backend talks to.
+
+Each stub is a threaded HTTP server serving canned JSON with configurable
+latency and error rate, so benchmarks can run without network access or API keys.
+"""
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+# A route handler receives the parsed query string and request body and
+# returns (status_code, json_payload)
+RouteHandler = Callable[[Dict[str, str], bytes], Tuple[int, Dict]]
+
+
+class StubServer:
+    """Threaded JSON stub server with injectable latency and failures"""
+
+    def __init__(self, routes: Dict[str, RouteHandler], latency: float = 0.0,
+                 error_rate: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.routes = routes
+        self.latency = latency
+        self.error_rate = error_rate
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _dispatch(self):
+                parsed = urlparse(self.path)
+                query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+
+                with stub._lock:
+                    stub.request_count += 1
+
+                if stub.latency:
+                    time.sleep(stub.latency)
+
+                handler = stub._match(parsed.path)
+                if handler is None:
+                    status, payload = 404, {"error": f"No stub route for {parsed.path}"}
+                elif stub.error_rate and random.random() < stub.error_rate:
+                    status, payload = 503, {"error": "Injected stub failure"}
+                else:
+                    status, payload = handler(query, body)
+
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = _dispatch
+            do_POST = _dispatch
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def _match(self, path: str) -> Optional[RouteHandler]:
+        if path in self.routes:
+            return self.routes[path]
+        # Allow prefix routes such as "/v1beta/models/" for path parameters
+        for route, handler in self.routes.items():
+            if route.endswith("/") and path.startswith(route):
+                return handler
+        return None
+
+    def start(self) -> "StubServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+# ============ CANNED UPSTREAM RESPONSES ============
+
+def _serpapi_search(query: Dict[str, str], body: bytes) -> Tuple[int, Dict]:
+    term = query.get("search_query", "stub")
+    return 200, {
+        "search_metadata": {"status": "Success"},
+        "video_results": [
+            {
+                "title": f"{term} #{i}",
+                "link": f"https://www.youtube.com/watch?v=stub{i:07d}",
+                "channel": {"name": f"Stub Channel {i}"},
+                "length": f"{i + 3}:1{i}",
+                "views": 1000 * (i + 1),
+                "description": f"Stub video {i} for {term}",
+                "thumbnail": {"static": f"https://i.ytimg.com/vi/stub{i:07d}/hqdefault.jpg"},
+            }
+            for i in range(10)
+        ],
+    }
+
+
+def _places_text_search(query: Dict[str, str], body: bytes) -> Tuple[int, Dict]:
+    name = query.get("query", "Stub Place")
+    return 200, {
+        "status": "OK",
+        "results": [{
+            "name": name,
+            "formatted_address": f"1 Main Street, {name}",
+            "place_id": "stub-place-id",
+            "geometry": {"location": {"lat": 51.5072, "lng": -0.1276}},
+            "types": ["locality", "political"],
+        }],
+    }
+
+
+def _places_nearby_search(query: Dict[str, str], body: bytes) -> Tuple[int, Dict]:
+    return 200, {
+        "status": "OK",
+        "results": [
+            {"name": f"Stub Attraction {i}", "types": ["tourist_attraction"], "rating": 4.0 + i / 10}
+            for i in range(8)
+        ],
+    }
+
+
+def serpapi_routes() -> Dict[str, RouteHandler]:
+    return {"/search.json": _serpapi_search}
+
+
+def google_places_routes() -> Dict[str, RouteHandler]:
+    return {
+        "/maps/api/place/textsearch/json": _places_text_search,
+        "/maps/api/place/nearbysearch/json": _places_nearby_search,
+    }
+
+
+def _stub_coordinates(name: str) -> Tuple[float, float]:
+    # Stable per name, so repeated lookups agree with each other
+    seed = sum(ord(c) * (i + 1) for i, c in enumerate(name.lower()))
+    return round((seed % 12000) / 100 - 60, 4), round((seed * 7 % 36000) / 100 - 180, 4)
+
+
+def _open_meteo_geocode(query: Dict[str, str], body: bytes) -> Tuple[int, Dict]:
+    name = query.get("name", "")
+    # Lets load tests exercise the "location not found" path
+    if not name or "nowhere" in name.lower():
+        return 200, {"generationtime_ms": 0.1}
+    latitude, longitude = _stub_coordinates(name)
+    return 200, {
+        "results": [{
+            "id": 1,
+            "name": name.split(",")[0].strip().title(),
+            "latitude": latitude,
+            "longitude": longitude,
+            "country": "Stubland",
+            "country_code": "SL",
+            "timezone": "UTC",
+        }],
+        "generationtime_ms": 0.1,
+    }
+
+
+def _open_meteo_forecast(query: Dict[str, str], body: bytes) -> Tuple[int, Dict]:
+    latitudes = str(query.get("latitude", "0")).split(",")
+    longitudes = str(query.get("longitude", "0")).split(",")
+    # Several comma-separated coordinates get one result per place, like the real API
+    if len(latitudes) > 1:
+        return 200, [_forecast_for(float(lat), float(lon), query) for lat, lon in zip(latitudes, longitudes)]
+    return 200, _forecast_for(float(latitudes[0]), float(longitudes[0]), query)
+
+
+def _forecast_for(latitude: float, longitude: float, query: Dict[str, str]) -> Dict:
+    days = max(1, min(int(query.get("forecast_days", 1)), 16))
+    today = time.strftime("%Y-%m-%d")
+    return {
+        "latitude": latitude,
+        "longitude": longitude,
+        "timezone": "UTC",
+        "current": {
+            "time": f"{today}T12:00",
+            "temperature_2m": 18.4,
+            "relative_humidity_2m": 62,
+            "apparent_temperature": 17.9,
+            "is_day": 1,
+            "precipitation": 0.0,
+            "weather_code": 2,
+            "wind_speed_10m": 11.2,
+        },
+        "daily": {
+            "time": [time.strftime("%Y-%m-%d", time.gmtime(time.time() + 86400 * i)) for i in range(days)],
+            "weather_code": [(3, 61, 2, 0, 45)[i % 5] for i in range(days)],
+            "temperature_2m_max": [20.0 + i % 4 for i in range(days)],
+            "temperature_2m_min": [11.0 + i % 3 for i in range(days)],
+            "precipitation_sum": [round(0.4 * (i % 3), 1) for i in range(days)],
+            "precipitation_probability_max": [(10, 70, 30)[i % 3] for i in range(days)],
+        },
+    }
+
+
+def _youtube_search(query: Dict[str, str], body: bytes) -> Tuple[int, Dict]:
+    term = query.get("q", "stub")
+    count = int(query.get("maxResults", 3))
+    return 200, {
+        "items": [
+            {
+                "id": {"kind": "youtube#video", "videoId": f"yt{i:09d}"},
+                "snippet": {
+                    "title": f"{term} #{i}",
+                    "description": f"Stub video {i} about {term}",
+                    "channelTitle": f"Stub Channel {i}",
+                    "publishedAt": "2024-01-01T00:00:00Z",
+                    "thumbnails": {"medium": {"url": f"https://i.ytimg.com/vi/yt{i:09d}/mqdefault.jpg"}},
+                },
+            }
+            for i in range(count)
+        ],
+    }
+
+
+def _youtube_videos(query: Dict[str, str], body: bytes) -> Tuple[int, Dict]:
+    return 200, {"items": [{"id": query.get("id", ""), "contentDetails": {"duration": "PT4M13S"}}]}
+
+
+def _gemini_generate(query: Dict[str, str], body: bytes) -> Tuple[int, Dict]:
+    try:
+        contents = json.loads(body or b"{}").get("contents", [])
+        prompt = contents[-1]["parts"][-1].get("text", "") if contents else ""
+    except (ValueError, KeyError, IndexError, AttributeError):
+        prompt = ""
+    return 200, {
+        "candidates": [{
+            "content": {"role": "model", "parts": [{"text": f"Stub answer to: {prompt[:200]}"}]},
+            "finishReason": "STOP",
+            "index": 0,
+        }],
+        "usageMetadata": {"promptTokenCount": 120, "candidatesTokenCount": 24, "totalTokenCount": 144},
+        "modelVersion": "gemini-2.0-flash",
+    }
+
+
+def open_meteo_geocoding_routes() -> Dict[str, RouteHandler]:
+    return {"/v1/search": _open_meteo_geocode}
+
+
+def open_meteo_forecast_routes() -> Dict[str, RouteHandler]:
+    return {"/v1/forecast": _open_meteo_forecast}
+
+
+def youtube_data_api_routes() -> Dict[str, RouteHandler]:
+    return {
+        "/youtube/v3/search": _youtube_search,
+        "/youtube/v3/videos": _youtube_videos,
+    }
+
+
+def gemini_routes() -> Dict[str, RouteHandler]:
+    # generateContent is addressed as /v1beta/models/<model>:generateContent
+    return {"/v1beta/models/": _gemini_generate}
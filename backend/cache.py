@@ -0,0 +1,220 @@
+"""
+Caches shared by the backend modules.
+
+`TTLCache` lives in process memory. `SQLiteCache` has the same interface but keeps
+entries in a shared SQLite file, so every worker of a multi-process deployment
+sees the same cache. `create_cache` picks the backend from SHARED_STATE_BACKEND.
+"""
+
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+import metrics
+
+_MISSING = object()
+
+# "memory" (default, single process) or "sqlite" (shared between worker processes)
+SHARED_STATE_BACKEND = os.getenv("SHARED_STATE_BACKEND", "memory").lower()
+SHARED_STATE_DB = os.getenv("SHARED_STATE_DB", "shared_state.db")
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after a time-to-live"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return a fresh cached value, or `default` if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Store a value, evicting the least recently used entry when full"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict:
+        """Hit/miss counters for monitoring"""
+        total = self.hits + self.misses
+        return {
+            'backend': 'memory',
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0
+        }
+
+
+class SQLiteCache:
+    """TTL cache stored in a SQLite file shared by all worker processes.
+
+    Values are pickled, so only trusted data from this application belongs here.
+    When the namespace grows past `maxsize` the entries closest to expiry are evicted.
+    Hit/miss counters are per process.
+    """
+
+    def __init__(self, namespace: str, maxsize: int = 1024, ttl: float = 300.0, db_path: str = None):
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.db_path = db_path or SHARED_STATE_DB
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._writes = 0
+
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value BLOB,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_entries_expiry ON cache_entries (namespace, expires_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread; WAL lets readers in other processes proceed during writes
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _key(key: Hashable) -> str:
+        return key if isinstance(key, str) else repr(key)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        row = self._connect().execute(
+            "SELECT value FROM cache_entries WHERE namespace = ? AND key = ? AND expires_at > ?",
+            (self.namespace, self._key(key), time.time())
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return pickle.loads(row[0])
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (self.namespace, self._key(key), pickle.dumps(value), expires_at)
+        )
+        # Trimming scans the namespace, so only do it every so often
+        self._writes += 1
+        if self._writes % 64 == 0:
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection):
+        conn.execute("DELETE FROM cache_entries WHERE namespace = ? AND expires_at <= ?", (self.namespace, time.time()))
+        conn.execute('''
+            DELETE FROM cache_entries WHERE namespace = ? AND key IN (
+                SELECT key FROM cache_entries WHERE namespace = ?
+                ORDER BY expires_at DESC LIMIT -1 OFFSET ?
+            )
+        ''', (self.namespace, self.namespace, self.maxsize))
+
+    def delete(self, key: Hashable):
+        self._connect().execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (self.namespace, self._key(key))
+        )
+
+    def clear(self):
+        self._connect().execute("DELETE FROM cache_entries WHERE namespace = ?", (self.namespace,))
+
+    def __len__(self) -> int:
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM cache_entries WHERE namespace = ? AND expires_at > ?", (self.namespace, time.time())
+        ).fetchone()[0]
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            'backend': 'sqlite',
+            'size': len(self),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0
+        }
+
+
+_caches: Dict[str, Any] = {}
+
+
+def create_cache(namespace: str, maxsize: int = 1024, ttl: float = 300.0, local: bool = False):
+    """Cache for `namespace` on the configured backend (see SHARED_STATE_BACKEND).
+
+    `local` keeps it in process memory regardless, for values that are cheaper to
+    rebuild than to fetch from SQLite.
+    """
+    if SHARED_STATE_BACKEND == "sqlite" and not local:
+        cache = SQLiteCache(namespace, maxsize=maxsize, ttl=ttl)
+    else:
+        cache = TTLCache(maxsize=maxsize, ttl=ttl)
+    _caches[namespace] = cache
+    return cache
+
+
+def _cache_counter(attribute: str):
+    return lambda: {(namespace,): getattr(cache, attribute) for namespace, cache in list(_caches.items())}
+
+
+def _cache_hit_ratios() -> Dict:
+    ratios = {}
+    for namespace, cache in list(_caches.items()):
+        total = cache.hits + cache.misses
+        ratios[(namespace,)] = cache.hits / total if total else 0.0
+    return ratios
+
+
+# Hit/miss counters are read from the caches at scrape time, so lookups stay metric-free
+metrics.callback_metric("cache_hits_total", "Cache hits per cache namespace", ("cache",),
+                        _cache_counter("hits"), kind="counter")
+metrics.callback_metric("cache_misses_total", "Cache misses per cache namespace", ("cache",),
+                        _cache_counter("misses"), kind="counter")
+metrics.callback_metric("cache_hit_ratio", "Share of lookups served from cache", ("cache",),
+                        _cache_hit_ratios)
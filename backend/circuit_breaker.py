@@ -0,0 +1,268 @@
+"""
+Per-provider circuit breakers for upstream calls.
+
+A breaker watches a rolling window of recent calls. When the error rate or the
+share of slow calls crosses its threshold the breaker opens, and calls are
+short-circuited to cached or fallback data instead of waiting on a failing
+upstream. After a cool-down the breaker goes half-open and lets a few probe
+calls through; a successful probe closes it, a failed one re-opens it.
+
+Every call is bounded by the breaker's timeout. Synchronous calls run on a
+shared worker pool so the caller can stop waiting; a call that overruns is
+recorded as a failure. Python cannot kill the worker thread, so a hung call
+keeps its worker until it returns, and UPSTREAM_CALL_WORKERS caps how many of
+those there can be before further calls queue (and time out) behind them.
+"""
+
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Optional
+
+import metrics
+import tracing
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+UPSTREAM_CALL_WORKERS = int(os.getenv("UPSTREAM_CALL_WORKERS", "32"))
+
+# Per-provider tuning. Timeouts bound every call through the breaker; HTTP
+# callers also pass them to the client so the socket is closed in time.
+PROVIDER_DEFAULTS = {
+    'open_meteo_forecast': {'timeout': 10.0, 'slow_call_seconds': 5.0},
+    'open_meteo_geocoding': {'timeout': 5.0, 'slow_call_seconds': 3.0},
+    'youtube': {'timeout': 10.0, 'slow_call_seconds': 5.0},
+    'serpapi': {'timeout': 10.0, 'slow_call_seconds': 5.0},
+    'google_maps': {'timeout': 10.0, 'slow_call_seconds': 5.0},
+    'enrichment_agent': {'timeout': 45.0, 'slow_call_seconds': 30.0},
+    'gemini': {'timeout': 60.0, 'slow_call_seconds': 30.0},
+}
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is short-circuited by an open breaker"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit for '{name}' is open, retry in {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_rate_threshold: float = 0.5,
+                 slow_call_rate_threshold: float = 0.8, slow_call_seconds: float = 5.0,
+                 window_size: int = 20, minimum_calls: int = 5, open_seconds: float = 30.0,
+                 half_open_max_calls: int = 1, timeout: float = 10.0):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.minimum_calls = minimum_calls
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self.timeout = timeout
+
+        self.state = CLOSED
+        self._window = deque(maxlen=window_size)  # (failed, slow) per call
+        self._opened_at = 0.0
+        self._half_open_in_flight = 0
+        self._lock = threading.Lock()
+
+        self.counters = {
+            'calls': 0,
+            'successes': 0,
+            'failures': 0,
+            'slow_calls': 0,
+            'short_circuited': 0,
+            'times_opened': 0
+        }
+        self.last_error: Optional[str] = None
+
+    # ============ STATE MACHINE ============
+
+    def _retry_after(self) -> float:
+        return max(0.0, self._opened_at + self.open_seconds - time.monotonic())
+
+    def retry_after(self) -> float:
+        """Seconds until an open breaker will let a probe through"""
+        return self._retry_after() if self.state == OPEN else 0.0
+
+    def allow_request(self) -> bool:
+        """Whether a call may go upstream now; counts short-circuited calls"""
+        with self._lock:
+            if self.state == OPEN and self._retry_after() <= 0:
+                self.state = HALF_OPEN
+                self._half_open_in_flight = 0
+
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and self._half_open_in_flight < self.half_open_max_calls:
+                self._half_open_in_flight += 1
+                return True
+
+            self.counters['short_circuited'] += 1
+            metrics.UPSTREAM_SHORT_CIRCUITS.inc(provider=self.name)
+            return False
+
+    def _trip(self):
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self.counters['times_opened'] += 1
+
+    def _record(self, failed: bool, duration: float, error: Optional[str] = None):
+        slow = duration >= self.slow_call_seconds
+        # Every upstream call is recorded here, so this is the one place to time them
+        metrics.UPSTREAM_CALL_SECONDS.observe(duration, provider=self.name, outcome='error' if failed else 'ok')
+        if failed:
+            metrics.UPSTREAM_ERRORS.inc(provider=self.name)
+        with self._lock:
+            self.counters['calls'] += 1
+            self.counters['failures' if failed else 'successes'] += 1
+            if slow:
+                self.counters['slow_calls'] += 1
+            if error:
+                self.last_error = error
+
+            if self.state == HALF_OPEN:
+                self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+                if failed or slow:
+                    self._trip()
+                else:
+                    self.state = CLOSED
+                    self._window.clear()
+                return
+
+            self._window.append((failed, slow))
+            if self.state == CLOSED and len(self._window) >= self.minimum_calls:
+                failure_rate = sum(f for f, _ in self._window) / len(self._window)
+                slow_rate = sum(s for _, s in self._window) / len(self._window)
+                if failure_rate >= self.failure_rate_threshold or slow_rate >= self.slow_call_rate_threshold:
+                    self._trip()
+
+    def release(self):
+        """Give back a permitted call that finished without an outcome (e.g. cancelled)"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+
+    def record_success(self, duration: float):
+        self._record(False, duration)
+
+    def record_failure(self, duration: float, error: Optional[str] = None):
+        self._record(True, duration, error)
+
+    # ============ CALL WRAPPERS ============
+
+    def call(self, fn: Callable, *args, fallback: Optional[Callable[[], Any]] = None, **kwargs) -> Any:
+        """Run `fn` through the breaker; use `fallback()` when open or on failure"""
+        with tracing.span(f"upstream.{self.name}") as span:
+            if not self.allow_request():
+                span.set(short_circuited=True)
+                if fallback is not None:
+                    return fallback()
+                raise CircuitOpenError(self.name, self._retry_after())
+
+            start = time.monotonic()
+            try:
+                result = self._run_with_timeout(fn, *args, **kwargs)
+            except Exception as e:
+                self.record_failure(time.monotonic() - start, str(e) or type(e).__name__)
+                if fallback is not None:
+                    span.record_error(e)
+                    span.set(fallback=True)
+                    return fallback()
+                raise
+            self.record_success(time.monotonic() - start)
+            return result
+
+    def _run_with_timeout(self, fn: Callable, *args, **kwargs) -> Any:
+        if not self.timeout:
+            return fn(*args, **kwargs)
+        # Run in the caller's context so spans and request ids carry over
+        context = contextvars.copy_context()
+        future = _get_executor().submit(context.run, fn, *args, **kwargs)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise TimeoutError(f"'{self.name}' call timed out after {self.timeout:g}s") from None
+
+    async def call_async(self, fn: Callable, *args, fallback: Optional[Callable[[], Any]] = None, **kwargs) -> Any:
+        """Async variant of `call`; the awaited call is bounded by the breaker timeout"""
+        with tracing.span(f"upstream.{self.name}") as span:
+            if not self.allow_request():
+                span.set(short_circuited=True)
+                if fallback is not None:
+                    return fallback()
+                raise CircuitOpenError(self.name, self._retry_after())
+
+            start = time.monotonic()
+            try:
+                result = await asyncio.wait_for(fn(*args, **kwargs), timeout=self.timeout)
+            except asyncio.CancelledError:
+                # The client went away; that says nothing about the upstream's health
+                self.release()
+                raise
+            except Exception as e:
+                self.record_failure(time.monotonic() - start, str(e) or type(e).__name__)
+                if fallback is not None:
+                    span.record_error(e)
+                    span.set(fallback=True)
+                    return fallback()
+                raise
+            self.record_success(time.monotonic() - start)
+            return result
+
+    def snapshot(self) -> Dict:
+        """Current state and counters for the health endpoint"""
+        with self._lock:
+            window = list(self._window)
+            return {
+                'state': self.state,
+                'retry_after_seconds': round(self._retry_after(), 1) if self.state == OPEN else 0,
+                'window_calls': len(window),
+                'window_failure_rate': round(sum(f for f, _ in window) / len(window), 3) if window else 0.0,
+                'window_slow_rate': round(sum(s for _, s in window) / len(window), 3) if window else 0.0,
+                'thresholds': {
+                    'failure_rate': self.failure_rate_threshold,
+                    'slow_call_rate': self.slow_call_rate_threshold,
+                    'slow_call_seconds': self.slow_call_seconds,
+                    'open_seconds': self.open_seconds
+                },
+                'counters': dict(self.counters),
+                'last_error': self.last_error
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_registry_lock = threading.Lock()
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _registry_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(1, UPSTREAM_CALL_WORKERS),
+                                           thread_name_prefix="upstream")
+        return _executor
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Get (or create) the shared breaker for an upstream provider"""
+    with _registry_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name, **PROVIDER_DEFAULTS.get(name, {}))
+        return _breakers[name]
+
+
+def breaker_snapshots() -> Dict[str, Dict]:
+    """Snapshot of every known provider's breaker"""
+    return {name: get_breaker(name).snapshot() for name in sorted(set(PROVIDER_DEFAULTS) | set(_breakers))}
@@ -1,35 +1,147 @@
 import json
 import csv
-import xml.etree.ElementTree as ET
-from xml.dom import minidom
 import io
-from typing import List, Dict, Any
+import os
+import re
+import time
+import zlib
+from importlib.util import find_spec
+from typing import Iterable, Iterator, List, Dict, Any, Optional, Tuple, Union
 from datetime import datetime
 
-# Optional imports for advanced features
-try:
-    import markdown
-    MARKDOWN_AVAILABLE = True
-except ImportError:
-    MARKDOWN_AVAILABLE = False
+import pdf_export
+from metrics import EXPORT_RENDER_SECONDS
 
-try:
-    from reportlab.lib.pagesizes import letter
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import inch
-    from reportlab.lib import colors
-    REPORTLAB_AVAILABLE = True
-except ImportError:
-    REPORTLAB_AVAILABLE = False
+# Optional imports for advanced features. Only check that they are installed here,
+# the packages themselves are imported by the export paths that need them.
+MARKDOWN_AVAILABLE = find_spec('markdown') is not None
+REPORTLAB_AVAILABLE = pdf_export.REPORTLAB_AVAILABLE
+ZSTANDARD_AVAILABLE = find_spec('zstandard') is not None
+
+EXPORT_FORMATS = ('json', 'ndjson', 'xml', 'csv', 'markdown', 'md', 'pdf')
+
+# Formats written incrementally from a row iterator (see DataExporter.stream_export)
+STREAMING_FORMATS = {
+    'json': ('application/json', 'json'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+    'xml': ('application/xml', 'xml'),
+}
+# Streamed output is handed to the server in pieces of about this many characters
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Content-Encoding -> (file extension, media type of a compressed download)
+EXPORT_ENCODINGS = {
+    'zstd': ('zst', 'application/zstd'),
+    'gzip': ('gz', 'application/gzip'),
+}
+EXPORT_GZIP_LEVEL = int(os.getenv("EXPORT_GZIP_LEVEL", "6"))
+EXPORT_ZSTD_LEVEL = int(os.getenv("EXPORT_ZSTD_LEVEL", "3"))
+# Negotiated from Accept-Encoding unless compression= says otherwise. PDF page
+# streams are deflated already, so a second pass only costs CPU.
+AUTO_COMPRESSED_FORMATS = ('json', 'ndjson', 'xml', 'csv', 'markdown', 'md')
+
+# Documents that state when they were rendered. The export cache stores them
+# without their front matter and stamps a fresh one onto every download.
+FRONT_MATTER_FORMATS = ('markdown', 'md', 'pdf')
+
+def export_filename(extension: str) -> str:
+    """Download name stamped with the current time, e.g. weather_data_20240115_103000.csv"""
+    return f'weather_data_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{extension}'
+
+def artifact_cacheable(format_type: str) -> bool:
+    """Whether an export may go in the artifact cache; splitting off a PDF's front matter needs pypdf"""
+    return format_type.lower() != 'pdf' or pdf_export.PYPDF_AVAILABLE
+
+# Characters XML 1.0 cannot represent at all
+_INVALID_XML_CHARS = re.compile('[^\x09\x0a\x0d\x20-\ud7ff\ue000-\ufffd\U00010000-\U0010ffff]')
+
+def _xml_text(value: Any) -> str:
+    """Escape a value as minidom's pretty printer wrote it after the ElementTree round trip"""
+    text = str(value)
+    if _INVALID_XML_CHARS.search(text):
+        raise ValueError(f"Value contains characters that are not allowed in XML: {text[:40]!r}")
+    # The old re-parse normalized line endings the way every XML parser does
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace('"', "&quot;").replace(">", "&gt;")
+
+def _accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+    """Accept-Encoding as coding -> q-value"""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding:
+            accepted[coding.strip().lower()] = q
+    return accepted
+
+def choose_encoding(format_type: str, compression: str = 'auto',
+                    accept_encoding: Optional[str] = None) -> Tuple[Optional[str], bool]:
+    """(encoding, as_file) for an export, or (None, False) to send it uncompressed.
+
+    compression='auto' picks the best coding the client accepts, sent as
+    Content-Encoding so the client decodes it transparently. An explicit 'gzip'
+    or 'zstd' produces a compressed file (.csv.gz, ...) whatever the client
+    advertises. Raises ValueError for an unknown or unavailable coding.
+    """
+    compression = (compression or 'auto').lower()
+    if compression in ('none', 'identity'):
+        return None, False
+    if compression != 'auto':
+        if compression not in EXPORT_ENCODINGS:
+            raise ValueError(f"Unsupported compression: {compression}. Supported: auto, none, {', '.join(EXPORT_ENCODINGS)}")
+        if compression == 'zstd' and not ZSTANDARD_AVAILABLE:
+            raise ValueError("zstd compression requires 'zstandard' package. Install with: pip install zstandard")
+        return compression, True
+
+    if format_type.lower() not in AUTO_COMPRESSED_FORMATS or not accept_encoding:
+        return None, False
+    accepted = _accepted_encodings(accept_encoding)
+    wildcard = accepted.get('*', 0.0)
+    best, best_q = None, 0.0
+    # Ties go to the first listed: zstd is faster and smaller than gzip
+    for encoding in EXPORT_ENCODINGS:
+        if encoding == 'zstd' and not ZSTANDARD_AVAILABLE:
+            continue
+        q = accepted.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best, False
+
+def compress_chunks(chunks: Iterable[Union[str, bytes]], encoding: str) -> Iterator[bytes]:
+    """Compress a stream incrementally; the first chunk is flushed so it reaches the client at once"""
+    if encoding == 'gzip':
+        compressor = zlib.compressobj(EXPORT_GZIP_LEVEL, zlib.DEFLATED, 31)
+        flush_block = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+        finish = compressor.flush
+    else:
+        import zstandard
+        compressor = zstandard.ZstdCompressor(level=EXPORT_ZSTD_LEVEL).compressobj()
+        flush_block = lambda: compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        finish = compressor.flush
+    first = True
+    try:
+        for chunk in chunks:
+            data = compressor.compress(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+            if first:
+                data += flush_block()
+                first = False
+            if data:
+                yield data
+        yield finish()
+    finally:
+        # Closing the source releases its database cursor if the client went away
+        if hasattr(chunks, 'close'):
+            chunks.close()
 
 class DataExporter:
-    def __init__(self):
-        if REPORTLAB_AVAILABLE:
-            self.styles = getSampleStyleSheet()
-        else:
-            self.styles = None
-    
     def export_to_json(self, data: List[Dict], pretty: bool = True) -> str:
         """Export data to JSON format"""
         try:
@@ -40,35 +152,63 @@ class DataExporter:
         except Exception as e:
             raise Exception(f"Error exporting to JSON: {str(e)}")
     
+    def iter_json(self, rows: Iterable[Dict]) -> Iterator[str]:
+        """Pretty JSON array, identical to export_to_json(pretty=True), one record at a time"""
+        first = True
+        for record in rows:
+            encoded = json.dumps(record, indent=2, default=str, ensure_ascii=False)
+            # Strings are escaped, so every newline here is indentation and nests one level deeper
+            yield ("[\n  " if first else ",\n  ") + encoded.replace("\n", "\n  ")
+            first = False
+        yield "[]" if first else "\n]"
+    
+    def export_to_ndjson(self, data: List[Dict]) -> str:
+        """Export data as newline-delimited JSON, one record per line"""
+        return "".join(self.iter_ndjson(data))
+    
+    def iter_ndjson(self, rows: Iterable[Dict]) -> Iterator[str]:
+        for record in rows:
+            yield json.dumps(record, default=str, ensure_ascii=False) + "\n"
+    
     def export_to_xml(self, data: List[Dict], root_name: str = "weather_data") -> str:
         """Export data to XML format"""
         try:
-            root = ET.Element(root_name)
-            
-            for i, record in enumerate(data):
-                record_elem = ET.SubElement(root, "record", id=str(i + 1))
-                
-                for key, value in record.items():
-                    if value is not None:
-                        elem = ET.SubElement(record_elem, key)
-                        elem.text = str(value)
-            
-            # Pretty print XML
-            rough_string = ET.tostring(root, 'unicode')
-            reparsed = minidom.parseString(rough_string)
-            return reparsed.toprettyxml(indent="  ")
+            return "".join(self.iter_xml(data, root_name))
             
         except Exception as e:
             raise Exception(f"Error exporting to XML: {str(e)}")
     
+    def iter_xml(self, rows: Iterable[Dict], root_name: str = "weather_data") -> Iterator[str]:
+        """Indented XML one record at a time.
+
+        The output is byte-for-byte what building an ElementTree and pretty-printing
+        it with minidom (toprettyxml, two-space indent) produced. That includes the
+        `<tag/>` form for empty values and escaping `"` in text.
+        """
+        yield '<?xml version="1.0" ?>\n'
+        empty = True
+        for i, record in enumerate(rows, 1):
+            if empty:
+                yield f"<{root_name}>\n"
+                empty = False
+            
+            fields = []
+            for key, value in record.items():
+                if value is not None:
+                    text = _xml_text(value)
+                    fields.append(f"    <{key}>{text}</{key}>\n" if text else f"    <{key}/>\n")
+            if fields:
+                yield f'  <record id="{i}">\n' + "".join(fields) + "  </record>\n"
+            else:
+                yield f'  <record id="{i}"/>\n'
+        yield f"<{root_name}/>\n" if empty else f"</{root_name}>\n"
+    
     def export_to_csv(self, data: List[Dict]) -> str:
         """Export data to CSV format"""
         try:
             if not data:
                 return ""
-            
-            output = io.StringIO()
-            
+
             # Get all unique keys from all records
             fieldnames = set()
             for record in data:
@@ -76,30 +216,45 @@ class DataExporter:
             
             fieldnames = sorted(list(fieldnames))
             
-            writer = csv.DictWriter(output, fieldnames=fieldnames)
-            writer.writeheader()
-            
-            for record in data:
-                # Convert None values to empty strings
-                clean_record = {k: (v if v is not None else '') for k, v in record.items()}
-                writer.writerow(clean_record)
-            
-            return output.getvalue()
+            return "".join(self.iter_csv(data, fieldnames))
             
         except Exception as e:
             raise Exception(f"Error exporting to CSV: {str(e)}")
     
+    def iter_csv(self, rows: Iterable[Dict], fieldnames: List[str] = None) -> Iterator[str]:
+        """CSV one record at a time; without `fieldnames` the first record's keys, sorted, are used"""
+        output = io.StringIO()
+        writer = None
+        for record in rows:
+            if writer is None:
+                writer = csv.DictWriter(output, fieldnames=fieldnames or sorted(record.keys()))
+                writer.writeheader()
+            # Convert None values to empty strings
+            writer.writerow({k: (v if v is not None else '') for k, v in record.items()})
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate(0)
+    
     def export_to_markdown(self, data: List[Dict]) -> str:
         """Export data to Markdown format"""
+        front_matter = self.markdown_front_matter(len(data))
+        records = self.markdown_records(data)
+        return f"{front_matter}\n{records}" if records else front_matter
+    
+    def markdown_front_matter(self, total: int) -> str:
+        """Title, "Generated on" stamp and record count of a Markdown export"""
+        if not total:
+            return "# Weather Data Export\n\nNo data available."
+        return "\n".join([
+            "# Weather Data Export",
+            f"\n*Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}*\n",
+            f"**Total Records:** {total}\n"
+        ])
+    
+    def markdown_records(self, data: List[Dict]) -> str:
+        """The records of a Markdown export, without its front matter"""
         try:
-            if not data:
-                return "# Weather Data Export\n\nNo data available."
-            
             md_content = []
-            md_content.append("# Weather Data Export")
-            md_content.append(f"\n*Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}*\n")
-            md_content.append(f"**Total Records:** {len(data)}\n")
-            
             for i, record in enumerate(data, 1):
                 md_content.append(f"## Record {i}")
                 md_content.append("")
@@ -128,122 +283,86 @@ class DataExporter:
             raise Exception(f"Error exporting to Markdown: {str(e)}")
     
     def export_to_pdf(self, data: List[Dict]) -> bytes:
-        """Export data to PDF format"""
+        """Export data to PDF format (rendered in this thread, see pdf_export.render_pdf)"""
         if not REPORTLAB_AVAILABLE:
             raise ValueError("PDF export requires 'reportlab' package. Install with: pip install reportlab")
-            
         try:
-            buffer = io.BytesIO()
-            doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=1*inch)
-            
-            # Container for the 'Flowable' objects
-            elements = []
-            
-            # Title
-            title_style = ParagraphStyle(
-                'CustomTitle',
-                parent=self.styles['Heading1'],
-                fontSize=24,
-                spaceAfter=30,
-                alignment=1  # Center alignment
-            )
-            
-            title = Paragraph("Weather Data Export Report", title_style)
-            elements.append(title)
-            
-            # Metadata
-            meta_style = ParagraphStyle(
-                'Meta',
-                parent=self.styles['Normal'],
-                fontSize=10,
-                spaceAfter=20,
-                alignment=1
-            )
-            
-            meta_text = f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}<br/>Total Records: {len(data)}"
-            meta = Paragraph(meta_text, meta_style)
-            elements.append(meta)
-            elements.append(Spacer(1, 20))
-            
-            if not data:
-                no_data = Paragraph("No data available.", self.styles['Normal'])
-                elements.append(no_data)
-            else:
-                # Create summary table
-                summary_data = [
-                    ['Field', 'Description'],
-                    ['ID', 'Unique identifier'],
-                    ['Location', 'Requested location'],
-                    ['Date Range', 'Start and end dates'],
-                    ['Created At', 'Request timestamp'],
-                    ['Weather Data', 'Forecast information']
-                ]
-                
-                summary_table = Table(summary_data, colWidths=[2*inch, 4*inch])
-                summary_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 12),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black)
-                ]))
-                
-                elements.append(Paragraph("Data Structure", self.styles['Heading2']))
-                elements.append(summary_table)
-                elements.append(Spacer(1, 30))
-                
-                # Add individual records
-                for i, record in enumerate(data, 1):
-                    elements.append(Paragraph(f"Record {i}", self.styles['Heading2']))
-                    
-                    # Create table for record data
-                    record_data = [['Field', 'Value']]
-                    
-                    for key, value in record.items():
-                        if value is not None:
-                            formatted_key = key.replace('_', ' ').title()
-                            
-                            # Truncate long values
-                            if isinstance(value, str) and len(value) > 100:
-                                display_value = value[:100] + "..."
-                            else:
-                                display_value = str(value)
-                            
-                            record_data.append([formatted_key, display_value])
-                    
-                    record_table = Table(record_data, colWidths=[2*inch, 4*inch])
-                    record_table.setStyle(TableStyle([
-                        ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
-                        ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-                        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                        ('FONTSIZE', (0, 0), (-1, 0), 10),
-                        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-                        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-                        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                        ('VALIGN', (0, 0), (-1, -1), 'TOP')
-                    ]))
-                    
-                    elements.append(record_table)
-                    elements.append(Spacer(1, 20))
-            
-            # Build PDF
-            doc.build(elements)
-            
-            # Get the value of the BytesIO buffer
-            pdf_data = buffer.getvalue()
-            buffer.close()
-            
-            return pdf_data
-            
+            return pdf_export.build_pdf(data)
         except Exception as e:
             raise Exception(f"Error exporting to PDF: {str(e)}")
     
     def export_data(self, data: List[Dict], format_type: str, **kwargs) -> Dict[str, Any]:
         """Export data in the specified format"""
+        label = str(format_type).lower()
+        # Only known formats become label values, so arbitrary input cannot grow the series
+        with EXPORT_RENDER_SECONDS.time(format=label if label in EXPORT_FORMATS else 'unsupported'):
+            return self._render(data, format_type, **kwargs)
+
+    async def export_data_async(self, data: List[Dict], format_type: str, **kwargs) -> Dict[str, Any]:
+        """Like export_data, but PDFs are built in the pdf_export process pool"""
+        if str(format_type).lower() != 'pdf':
+            return self.export_data(data, format_type, **kwargs)
+        with EXPORT_RENDER_SECONDS.time(format='pdf'):
+            try:
+                content = await pdf_export.render_pdf(data)
+            except Exception as e:
+                return {
+                    'success': False,
+                    'error': f'Export failed: Error exporting to PDF: {str(e)}'
+                }
+        return {
+            'success': True,
+            'content': content,
+            'content_type': 'application/pdf',
+            'filename': export_filename('pdf'),
+            'is_binary': True
+        }
+
+    async def export_records_async(self, data: List[Dict], format_type: str) -> Dict[str, Any]:
+        """A FRONT_MATTER_FORMATS export without its front matter (see attach_front_matter_async)"""
+        format_type = format_type.lower()
+        with EXPORT_RENDER_SECONDS.time(format=format_type):
+            try:
+                if format_type == 'pdf':
+                    content = await pdf_export.render_records_pdf(data)
+                else:
+                    content = self.markdown_records(data)
+            except Exception as e:
+                return {
+                    'success': False,
+                    'error': f'Export failed: {str(e)}'
+                }
+        return {'success': True, 'content': content, 'total': len(data)}
+
+    async def attach_front_matter_async(self, records: Union[str, bytes], total: int,
+                                        format_type: str) -> Dict[str, Any]:
+        """The export_data result for records from export_records_async, with a fresh front matter"""
+        format_type = format_type.lower()
+        try:
+            if format_type == 'pdf':
+                return {
+                    'success': True,
+                    'content': await pdf_export.attach_front_matter(records, total),
+                    'content_type': 'application/pdf',
+                    'filename': export_filename('pdf'),
+                    'is_binary': True
+                }
+            if isinstance(records, bytes):
+                records = records.decode('utf-8')
+            front_matter = self.markdown_front_matter(total)
+            return {
+                'success': True,
+                'content': f"{front_matter}\n{records}" if records else front_matter,
+                'content_type': 'text/markdown',
+                'filename': export_filename('md')
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f'Export failed: {str(e)}'
+            }
+
+    def _render(self, data: List[Dict], format_type: str, **kwargs) -> Dict[str, Any]:
         try:
             format_type = format_type.lower()
             
@@ -253,7 +372,16 @@ class DataExporter:
                     'success': True,
                     'content': content,
                     'content_type': 'application/json',
-                    'filename': f'weather_data_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json'
+                    'filename': export_filename('json')
+                }
+            
+            elif format_type == 'ndjson':
+                content = self.export_to_ndjson(data)
+                return {
+                    'success': True,
+                    'content': content,
+                    'content_type': 'application/x-ndjson',
+                    'filename': export_filename('ndjson')
                 }
             
             elif format_type == 'xml':
@@ -262,7 +390,7 @@ class DataExporter:
                     'success': True,
                     'content': content,
                     'content_type': 'application/xml',
-                    'filename': f'weather_data_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xml'
+                    'filename': export_filename('xml')
                 }
             
             elif format_type == 'csv':
@@ -271,7 +399,7 @@ class DataExporter:
                     'success': True,
                     'content': content,
                     'content_type': 'text/csv',
-                    'filename': f'weather_data_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+                    'filename': export_filename('csv')
                 }
             
             elif format_type == 'markdown' or format_type == 'md':
@@ -280,7 +408,7 @@ class DataExporter:
                     'success': True,
                     'content': content,
                     'content_type': 'text/markdown',
-                    'filename': f'weather_data_{datetime.now().strftime("%Y%m%d_%H%M%S")}.md'
+                    'filename': export_filename('md')
                 }
             
             elif format_type == 'pdf':
@@ -289,18 +417,78 @@ class DataExporter:
                     'success': True,
                     'content': content,
                     'content_type': 'application/pdf',
-                    'filename': f'weather_data_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf',
+                    'filename': export_filename('pdf'),
                     'is_binary': True
                 }
             
             else:
                 return {
                     'success': False,
-                    'error': f'Unsupported format: {format_type}. Supported formats: json, xml, csv, markdown, pdf'
+                    'error': f'Unsupported format: {format_type}. Supported formats: json, ndjson, xml, csv, markdown, pdf'
                 }
                 
         except Exception as e:
             return {
                 'success': False,
                 'error': f'Export failed: {str(e)}'
-            } 
\ No newline at end of file
+            }
+    
+    def stream_export(self, rows: Iterable[Dict], format_type: str) -> Dict[str, Any]:
+        """Like export_data, but 'chunks' yields the document incrementally from `rows`"""
+        format_type = format_type.lower()
+        if format_type not in STREAMING_FORMATS:
+            return {
+                'success': False,
+                'error': f'Format {format_type} cannot be streamed. Streaming formats: {", ".join(STREAMING_FORMATS)}'
+            }
+        content_type, extension = STREAMING_FORMATS[format_type]
+        pieces = getattr(self, f'iter_{format_type}')(rows)
+        return {
+            'success': True,
+            'chunks': self._chunked(pieces, format_type, rows),
+            'content_type': content_type,
+            'filename': export_filename(extension)
+        }
+    
+    def _chunked(self, pieces: Iterator[str], label: str, rows: Iterable[Dict]) -> Iterator[str]:
+        """Merge small pieces into STREAM_CHUNK_SIZE chunks; the first piece goes out right away"""
+        start = time.perf_counter()
+        buffer, size, first = [], 0, True
+        try:
+            for piece in pieces:
+                buffer.append(piece)
+                size += len(piece)
+                if first or size >= STREAM_CHUNK_SIZE:
+                    yield "".join(buffer)
+                    buffer, size, first = [], 0, False
+            if buffer:
+                yield "".join(buffer)
+        finally:
+            # Covers the whole stream, including the time spent reading rows
+            EXPORT_RENDER_SECONDS.observe(time.perf_counter() - start, format=label)
+            # Closing the row iterator releases its database connection if the client went away
+            for source in (pieces, rows):
+                if hasattr(source, 'close'):
+                    source.close()
+    
+    def compress_export(self, export_result: Dict[str, Any], encoding: Optional[str], as_file: bool = False) -> Dict[str, Any]:
+        """Compress an export_data or stream_export result (see choose_encoding).
+
+        Streamed 'chunks' are compressed as they are produced. With `as_file` the result
+        is a compressed download (filename.csv.gz), otherwise 'content_encoding' is set.
+        """
+        if not encoding or not export_result.get('success'):
+            return export_result
+        result = dict(export_result)
+        if 'chunks' in result:
+            result['chunks'] = compress_chunks(result['chunks'], encoding)
+        else:
+            result['content'] = b"".join(compress_chunks([result['content']], encoding))
+            result['is_binary'] = True
+        if as_file:
+            extension, content_type = EXPORT_ENCODINGS[encoding]
+            result['filename'] = f"{result['filename']}.{extension}"
+            result['content_type'] = content_type
+        else:
+            result['content_encoding'] = encoding
+        return result
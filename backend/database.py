@@ -1,9 +1,38 @@
 import sqlite3
 import json
 from datetime import datetime, date
-from typing import List, Dict, Optional, Tuple
+from typing import Iterator, List, Dict, Optional, Tuple
+from functools import wraps
 import os
 
+import tracing
+from metrics import DB_METHOD_SECONDS
+
+# Columns of weather_requests exposed by the read methods, in response order
+WEATHER_REQUEST_COLUMNS = ['id', 'location', 'normalized_location', 'start_date', 'end_date',
+                           'weather_data', 'created_at', 'updated_at', 'user_id', 'coordinates']
+
+def select_columns(fields: Optional[List[str]] = None) -> List[str]:
+    """Validate a field projection against the weather_requests columns"""
+    if not fields:
+        return list(WEATHER_REQUEST_COLUMNS)
+    unknown = [field for field in fields if field not in WEATHER_REQUEST_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}. "
+                         f"Available fields: {', '.join(WEATHER_REQUEST_COLUMNS)}")
+    # Keep the canonical column order and drop duplicates
+    return [column for column in WEATHER_REQUEST_COLUMNS if column in fields]
+
+def _timed_query(method):
+    """Record how long a WeatherDatabase method takes in db_method_duration_seconds, and trace it"""
+    span_name = f"db.{method.__name__}"
+
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        with tracing.span(span_name), DB_METHOD_SECONDS.time(method=method.__name__):
+            return method(*args, **kwargs)
+    return wrapper
+
 class WeatherDatabase:
     def __init__(self, db_path: str = "weather_data.db"):
         self.db_path = db_path
@@ -14,6 +43,9 @@ class WeatherDatabase:
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             
+            # WAL lets several worker processes read while one writes
+            cursor.execute("PRAGMA journal_mode=WAL")
+            
             # Weather requests table
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS weather_requests (
@@ -40,12 +72,99 @@ class WeatherDatabase:
                     coordinates TEXT,
                     country TEXT,
                     is_valid BOOLEAN DEFAULT TRUE,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    timezone TEXT
+                )
+            ''')
+            
+            # Older databases predate the timezone column
+            cursor.execute("PRAGMA table_info(location_cache)")
+            if 'timezone' not in [column[1] for column in cursor.fetchall()]:
+                cursor.execute("ALTER TABLE location_cache ADD COLUMN timezone TEXT")
+            
+            # Change counter per table, bumped by triggers on every write
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS data_versions (
+                    table_name TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            cursor.execute("INSERT OR IGNORE INTO data_versions (table_name, version) VALUES ('weather_requests', 0)")
+            
+            # Deleted weather requests, for delta exports (read_weather_request_changes)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS weather_request_tombstones (
+                    id INTEGER PRIMARY KEY,
+                    change_seq INTEGER NOT NULL,
+                    deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # Idempotency keys of created requests, so a retried create returns the first row
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS weather_request_keys (
+                    request_key TEXT PRIMARY KEY,
+                    request_id INTEGER NOT NULL,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             ''')
             
+            # Older databases predate change tracking
+            cursor.execute("PRAGMA table_info(weather_requests)")
+            backfill = 'change_seq' not in [column[1] for column in cursor.fetchall()]
+            if backfill:
+                cursor.execute("ALTER TABLE weather_requests ADD COLUMN change_seq INTEGER")
+            self._install_change_triggers(cursor)
+            if backfill:
+                # Existing rows get distinct sequence numbers, all at or below the current version
+                cursor.execute("UPDATE weather_requests SET change_seq = id")
+                cursor.execute('''
+                    UPDATE data_versions
+                    SET version = MAX(version, (SELECT COALESCE(MAX(id), 0) FROM weather_requests))
+                    WHERE table_name = 'weather_requests'
+                ''')
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_weather_requests_change_seq ON weather_requests(change_seq)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_weather_requests_updated_at ON weather_requests(updated_at)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_weather_request_tombstones_change_seq ON weather_request_tombstones(change_seq)")
+            
             conn.commit()
     
+    def _install_change_triggers(self, cursor):
+        """(Re)create the triggers that bump the weather_requests data version.
+
+        The new version doubles as the change sequence: written rows get it as their
+        change_seq, deleted ones leave a tombstone with it. Writers are serialized,
+        so a reader never sees a higher change_seq before a lower one.
+        """
+        # Only the data columns, so stamping change_seq does not fire the trigger again
+        cursor.execute("PRAGMA table_info(weather_requests)")
+        data_columns = ', '.join(column[1] for column in cursor.fetchall() if column[1] not in ('id', 'change_seq'))
+        stamp = "(SELECT version FROM data_versions WHERE table_name = 'weather_requests')"
+        actions = {
+            'INSERT': f"UPDATE weather_requests SET change_seq = {stamp} WHERE id = NEW.id;",
+            f'UPDATE OF {data_columns}': f"UPDATE weather_requests SET change_seq = {stamp} WHERE id = NEW.id;",
+            'DELETE': f"INSERT OR REPLACE INTO weather_request_tombstones (id, change_seq) VALUES (OLD.id, {stamp});",
+        }
+        for event, action in actions.items():
+            trigger = f"weather_requests_version_{event.split()[0].lower()}"
+            cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+            cursor.execute(f'''
+                CREATE TRIGGER {trigger} AFTER {event} ON weather_requests
+                BEGIN
+                    UPDATE data_versions SET version = version + 1 WHERE table_name = 'weather_requests';
+                    {action}
+                END
+            ''')
+    
+    @_timed_query
+    def get_data_version(self, table_name: str = 'weather_requests') -> int:
+        """Current change counter for a table; any create, update or delete bumps it"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT version FROM data_versions WHERE table_name = ?", (table_name,))
+            row = cursor.fetchone()
+            return row[0] if row else 0
+    
     def validate_date_range(self, start_date: str, end_date: str) -> Tuple[bool, str, date, date]:
         """Validate date range input"""
         try:
@@ -67,13 +186,14 @@ class WeatherDatabase:
         except ValueError:
             return False, "Invalid date format. Use YYYY-MM-DD", None, None
     
+    @_timed_query
     def validate_location(self, location: str) -> Tuple[bool, str, Optional[Dict]]:
         """Validate location and get coordinates"""
         # Check cache first
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute(
-                "SELECT normalized_name, coordinates, country, is_valid FROM location_cache WHERE search_term = ?",
+                "SELECT normalized_name, coordinates, country, is_valid, timezone FROM location_cache WHERE search_term = ?",
                 (location.lower(),)
             )
             cached = cursor.fetchone()
@@ -83,51 +203,46 @@ class WeatherDatabase:
                     return True, "Location found in cache", {
                         'name': cached[0],
                         'coordinates': cached[1],
-                        'country': cached[2]
+                        'country': cached[2],
+                        'timezone': cached[4]
                     }
                 else:
                     return False, "Location not found", None
         
         # Validate with geocoding API
-        from open_meteo_tool import _get_coordinates
-        import requests
+        from open_meteo_tool import _geocode
         
         try:
-            # Try to get coordinates
-            coords = _get_coordinates(location)
-            if coords:
-                # Get detailed location info
-                response = requests.get(
-                    f"https://geocoding-api.open-meteo.com/v1/search?name={location}&count=1&format=json"
-                )
-                data = response.json()
+            # Get detailed location info; raises if the geocoder is unavailable so
+            # outages are never cached as "location not found"
+            result = _geocode(location)
+            if result:
+                location_info = {
+                    'name': result.get('name', location),
+                    'coordinates': f"{result['latitude']},{result['longitude']}",
+                    'country': result.get('country', ''),
+                    'timezone': result.get('timezone')
+                }
                 
-                if data.get("results"):
-                    result = data["results"][0]
-                    location_info = {
-                        'name': result.get('name', location),
-                        'coordinates': f"{result['latitude']},{result['longitude']}",
-                        'country': result.get('country', '')
-                    }
-                    
-                    # Cache the result
-                    with sqlite3.connect(self.db_path) as conn:
-                        cursor = conn.cursor()
-                        cursor.execute('''
-                            INSERT OR REPLACE INTO location_cache 
-                            (search_term, normalized_name, coordinates, country, is_valid)
-                            VALUES (?, ?, ?, ?, ?)
-                        ''', (
-                            location.lower(),
-                            location_info['name'],
-                            location_info['coordinates'],
-                            location_info['country'],
-                            True
-                        ))
-                        conn.commit()
-                    
-                    return True, "Location validated", location_info
-            
+                # Cache the result
+                with sqlite3.connect(self.db_path) as conn:
+                    cursor = conn.cursor()
+                    cursor.execute('''
+                        INSERT OR REPLACE INTO location_cache 
+                        (search_term, normalized_name, coordinates, country, is_valid, timezone)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    ''', (
+                        location.lower(),
+                        location_info['name'],
+                        location_info['coordinates'],
+                        location_info['country'],
+                        True,
+                        location_info['timezone']
+                    ))
+                    conn.commit()
+                
+                return True, "Location validated", location_info
+        
             # Cache negative result
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
@@ -143,9 +258,38 @@ class WeatherDatabase:
         except Exception as e:
             return False, f"Error validating location: {str(e)}", None
     
+    @_timed_query
+    def get_location_timezone(self, location: str) -> Optional[str]:
+        """Get the IANA timezone the geocoder reported for a cached location"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT timezone FROM location_cache WHERE search_term = ? AND is_valid",
+                (location.lower(),)
+            )
+            row = cursor.fetchone()
+            return row[0] if row else None
+    
+    def _request_for_key(self, request_key: str) -> Optional[int]:
+        with sqlite3.connect(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT request_id FROM weather_request_keys WHERE request_key = ?", (request_key,)
+            ).fetchone()
+            return row[0] if row else None
+    
+    @_timed_query
     def create_weather_request(self, location: str, start_date: str, end_date: str, 
-                             user_id: str = None) -> Tuple[bool, str, Optional[int]]:
-        """Create a new weather request record"""
+                             user_id: str = None, request_key: str = None) -> Tuple[bool, str, Optional[int]]:
+        """Create a new weather request record.
+
+        With a `request_key`, a repeated call (e.g. a retried job) returns the request
+        the key first created instead of inserting another one.
+        """
+        if request_key:
+            existing_id = self._request_for_key(request_key)
+            if existing_id is not None:
+                return True, "Weather request already created", existing_id
+        
         # Validate date range
         date_valid, date_msg, start_dt, end_dt = self.validate_date_range(start_date, end_date)
         if not date_valid:
@@ -185,24 +329,34 @@ class WeatherDatabase:
                 ))
                 
                 request_id = cursor.lastrowid
+                if request_key:
+                    # Same transaction as the insert, so a crash cannot leave a row without its key
+                    cursor.execute(
+                        "INSERT INTO weather_request_keys (request_key, request_id) VALUES (?, ?)",
+                        (request_key, request_id)
+                    )
                 conn.commit()
                 
                 return True, f"Weather request created successfully for {loc_info['name']}", request_id
                 
+        except sqlite3.IntegrityError:
+            # Another attempt with the same key committed first; our insert was rolled back
+            existing_id = self._request_for_key(request_key)
+            if existing_id is None:
+                raise
+            return True, "Weather request already created", existing_id
         except Exception as e:
             return False, f"Error creating weather request: {str(e)}", None
     
+    @_timed_query
     def read_weather_requests(self, limit: int = 50, offset: int = 0, 
-                            location_filter: str = None) -> List[Dict]:
-        """Read weather requests from database"""
+                            location_filter: str = None, fields: List[str] = None) -> List[Dict]:
+        """Read weather requests from database, optionally projecting only `fields`"""
+        columns = select_columns(fields)
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             
-            query = '''
-                SELECT id, location, normalized_location, start_date, end_date, 
-                       weather_data, created_at, updated_at, user_id, coordinates
-                FROM weather_requests
-            '''
+            query = f"SELECT {', '.join(columns)} FROM weather_requests"
             params = []
             
             if location_filter:
@@ -215,28 +369,99 @@ class WeatherDatabase:
             cursor.execute(query, params)
             rows = cursor.fetchall()
             
-            columns = ['id', 'location', 'normalized_location', 'start_date', 'end_date',
-                      'weather_data', 'created_at', 'updated_at', 'user_id', 'coordinates']
-            
             return [dict(zip(columns, row)) for row in rows]
     
-    def read_weather_request_by_id(self, request_id: int) -> Optional[Dict]:
-        """Read a specific weather request by ID"""
+    def iter_weather_requests(self, limit: Optional[int] = None, offset: int = 0,
+                              location_filter: str = None, fields: List[str] = None,
+                              batch_size: int = 500) -> Iterator[Dict]:
+        """Yield weather requests in read_weather_requests order, `batch_size` rows at a time.
+
+        Rows come straight off the cursor, so memory stays flat however many are
+        exported. The connection stays open until the iterator is exhausted or closed.
+        A streaming response may resume the iterator on a different worker thread.
+        """
+        columns = select_columns(fields)
+        query = f"SELECT {', '.join(columns)} FROM weather_requests"
+        params = []
+        if location_filter:
+            query += " WHERE location LIKE ? OR normalized_location LIKE ?"
+            params.extend([f"%{location_filter}%", f"%{location_filter}%"])
+        # LIMIT -1 is SQLite for "no limit"
+        query += " ORDER BY created_at DESC LIMIT ? OFFSET ?"
+        params.extend([limit if limit is not None else -1, offset])
+
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        try:
+            cursor = conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(zip(columns, row))
+        finally:
+            conn.close()
+
+    @_timed_query
+    def read_weather_request_changes(self, cursor: int = 0, since: Optional[str] = None,
+                                     limit: int = 1000, fields: List[str] = None) -> Dict:
+        """Rows written and ids deleted after change `cursor`, oldest change first.
+
+        `since` ('YYYY-MM-DD HH:MM:SS', UTC) further limits them to changes made at or
+        after that time. Returns 'changes', 'deleted', 'has_more' and the 'cursor' to pass
+        next time. Everything is read from one snapshot, so no change is ever skipped.
+        """
+        columns = select_columns(fields)
+        if 'id' not in columns:
+            columns.insert(0, 'id')
+        row_query = f"SELECT {', '.join(columns)}, change_seq FROM weather_requests WHERE change_seq > ? AND change_seq <= ?"
+        tombstone_query = "SELECT id, deleted_at, change_seq FROM weather_request_tombstones WHERE change_seq > ? AND change_seq <= ?"
+        if since:
+            row_query += " AND updated_at >= ?"
+            tombstone_query += " AND deleted_at >= ?"
+
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        try:
+            # One read transaction, so the version and both tables agree
+            conn.execute("BEGIN")
+            head = conn.execute("SELECT version FROM data_versions WHERE table_name = 'weather_requests'").fetchone()[0]
+            params = [cursor, head] + ([since] if since else []) + [limit + 1]
+            rows = conn.execute(row_query + " ORDER BY change_seq LIMIT ?", params).fetchall()
+            tombstones = conn.execute(tombstone_query + " ORDER BY change_seq LIMIT ?", params).fetchall()
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+        # Every change has its own sequence number, so the merge order is total
+        entries = sorted([(row[-1], row, None) for row in rows] + [(tomb[2], None, tomb) for tomb in tombstones],
+                         key=lambda entry: entry[0])
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+        return {
+            'changes': [dict(zip(columns + ['change_seq'], row)) for _, row, _ in entries if row],
+            'deleted': [{'id': tomb[0], 'deleted_at': tomb[1], 'change_seq': tomb[2]}
+                        for _, _, tomb in entries if tomb],
+            'cursor': entries[-1][0] if has_more else max(head, cursor),
+            'has_more': has_more
+        }
+
+    @_timed_query
+    def read_weather_request_by_id(self, request_id: int, fields: List[str] = None) -> Optional[Dict]:
+        """Read a specific weather request by ID, optionally projecting only `fields`"""
+        columns = select_columns(fields)
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
-            cursor.execute('''
-                SELECT id, location, normalized_location, start_date, end_date, 
-                       weather_data, created_at, updated_at, user_id, coordinates
-                FROM weather_requests WHERE id = ?
-            ''', (request_id,))
+            cursor.execute(
+                f"SELECT {', '.join(columns)} FROM weather_requests WHERE id = ?",
+                (request_id,)
+            )
             
             row = cursor.fetchone()
             if row:
-                columns = ['id', 'location', 'normalized_location', 'start_date', 'end_date',
-                          'weather_data', 'created_at', 'updated_at', 'user_id', 'coordinates']
                 return dict(zip(columns, row))
             return None
     
+    @_timed_query
     def update_weather_request(self, request_id: int, location: str = None, 
                              start_date: str = None, end_date: str = None) -> Tuple[bool, str]:
         """Update an existing weather request"""
@@ -295,6 +520,7 @@ class WeatherDatabase:
         except Exception as e:
             return False, f"Error updating weather request: {str(e)}"
     
+    @_timed_query
     def delete_weather_request(self, request_id: int) -> Tuple[bool, str]:
         """Delete a weather request"""
         try:
@@ -311,6 +537,22 @@ class WeatherDatabase:
         except Exception as e:
             return False, f"Error deleting weather request: {str(e)}"
     
+    @_timed_query
+    def get_top_locations(self, limit: int = 20, since_days: int = 30) -> List[Dict]:
+        """Most requested locations (as users typed them) over the last `since_days` days"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT MIN(location), COUNT(*) as count
+                FROM weather_requests
+                WHERE created_at >= datetime('now', ?)
+                GROUP BY lower(trim(location))
+                ORDER BY count DESC
+                LIMIT ?
+            ''', (f'-{int(since_days)} days', limit))
+            return [{'location': location, 'count': count} for location, count in cursor.fetchall()]
+    
+    @_timed_query
     def get_statistics(self) -> Dict:
         """Get database statistics"""
         with sqlite3.connect(self.db_path) as conn:
@@ -0,0 +1,203 @@
+"""
+On-disk cache of rendered export files.
+
+Dashboards and scheduled jobs download the same export over and over. Every
+rendered export is stored under EXPORT_CACHE_DIR. The key covers the database,
+format, query parameters, compression and the weather_requests data version.
+Any create, update or delete bumps that version, so a changed table never
+matches an old artifact, and no entry ever has to be invalidated. Outdated
+entries are not read again and age out of the LRU.
+
+Streamed exports are written to a temporary file as they go out to the first
+client. The file is published with an atomic rename when the stream completes,
+unless the data version moved while it was being written. A stream the client
+abandons is discarded. Repeat requests are served from the file, with no
+database reads or rendering. `lookup` opens the file itself, so an artifact
+evicted by another request or process while it is being sent is still read to
+the end.
+
+Nothing that depends on the time of the request is stored: the download
+filename is stamped per response, and documents that print when they were
+generated (data_export.FRONT_MATTER_FORMATS) are stored without their front
+matter.
+
+A hit touches the file's mtime. Each process keeps a running total of the
+directory's size, taken from one scan at start-up plus what it publishes. When
+the total passes EXPORT_CACHE_MAX_BYTES, the directory is scanned again and the
+least recently used artifacts are deleted. Several worker processes can share
+one directory; publishing and eviction use only renames and unlinks.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, Optional, Union
+
+import metrics
+
+logger = logging.getLogger("weather.export_cache")
+
+EXPORT_CACHE_ENABLED = os.getenv("EXPORT_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+EXPORT_CACHE_DIR = os.getenv("EXPORT_CACHE_DIR", "export_cache")
+EXPORT_CACHE_MAX_BYTES = int(os.getenv("EXPORT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Bump when the rendered output of an existing format changes
+_KEY_VERSION = 1
+# Temporary files left behind by a crashed worker are removed after this long
+_STALE_TMP_SECONDS = 3600
+# Read size when sending a stored artifact
+_READ_CHUNK_BYTES = 64 * 1024
+
+
+class ExportArtifactCache:
+    """Size-bounded LRU of export files in one directory"""
+
+    def __init__(self, directory: str = EXPORT_CACHE_DIR, max_bytes: int = EXPORT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # One artifact may not push out most of the others
+        self.max_artifact_bytes = max_bytes // 4
+        os.makedirs(directory, exist_ok=True)
+        self._size = 0
+        self._size_lock = threading.Lock()
+        self.evict()
+
+    def key(self, **params) -> str:
+        """Stable key for an export's parameters (include the data version)"""
+        encoded = json.dumps({'v': _KEY_VERSION, **params}, sort_keys=True, default=str)
+        return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.directory, f"{key}.{suffix}")
+
+    def lookup(self, key: str) -> Optional[Dict]:
+        """Metadata of a stored artifact plus 'file', an open binary handle the caller closes, or None"""
+        path = self._path(key, 'bin')
+        try:
+            with open(self._path(key, 'meta'), encoding='utf-8') as f:
+                meta = json.load(f)
+            # Once open, the data stays readable even if the artifact is evicted
+            handle = open(path, 'rb')
+        except (OSError, ValueError):
+            metrics.EXPORT_CACHE_LOOKUPS.inc(result="miss")
+            return None
+        try:
+            # Marks it recently used for eviction
+            os.utime(path)
+        except OSError:
+            pass
+        metrics.EXPORT_CACHE_LOOKUPS.inc(result="hit")
+        return {**meta, 'file': handle, 'size': os.fstat(handle.fileno()).st_size}
+
+    def store(self, key: str, content: Union[str, bytes], meta: Dict):
+        """Store a fully rendered export"""
+        data = content.encode('utf-8') if isinstance(content, str) else content
+        if len(data) > self.max_artifact_bytes:
+            return
+        tmp_path = self._path(key, f"{uuid.uuid4().hex}.tmp")
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            self._publish(key, tmp_path, meta)
+        except OSError:
+            logger.warning("Could not store export artifact %s", key, exc_info=True)
+            self._discard(tmp_path)
+
+    def tee(self, key: str, chunks: Iterable[Union[str, bytes]], meta: Dict,
+            still_valid: Callable[[], bool]) -> Iterator[Union[str, bytes]]:
+        """Pass `chunks` through, storing them once the stream completes and `still_valid()`"""
+        tmp_path = self._path(key, f"{uuid.uuid4().hex}.tmp")
+        f, size, completed = None, 0, False
+        try:
+            try:
+                f = open(tmp_path, 'wb')
+            except OSError:
+                logger.warning("Could not cache export artifact %s", key, exc_info=True)
+            for chunk in chunks:
+                if f is not None:
+                    data = chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+                    size += len(data)
+                    if size > self.max_artifact_bytes:
+                        f.close()
+                        f = None
+                        self._discard(tmp_path)
+                    else:
+                        f.write(data)
+                yield chunk
+            completed = True
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+            if f is not None:
+                f.close()
+                if completed and still_valid():
+                    self._publish(key, tmp_path, meta)
+                else:
+                    self._discard(tmp_path)
+
+    def _publish(self, key: str, tmp_path: str, meta: Dict):
+        meta_tmp = f"{tmp_path}.meta"
+        with open(meta_tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(meta_tmp, self._path(key, 'meta'))
+        size = os.path.getsize(tmp_path)
+        try:
+            # Another request may have published the same artifact already
+            size -= os.path.getsize(self._path(key, 'bin'))
+        except OSError:
+            pass
+        # The artifact file is the commit point: lookups need both files
+        os.replace(tmp_path, self._path(key, 'bin'))
+        with self._size_lock:
+            self._size += size
+            over = self._size > self.max_bytes
+        if over:
+            self.evict()
+
+    def _discard(self, path: str):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    def evict(self):
+        """Rescan the directory and delete least recently used artifacts until it fits in max_bytes"""
+        artifacts, total = [], 0
+        now = time.time()
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                if entry.name.endswith('.bin'):
+                    artifacts.append((stat.st_mtime, stat.st_size, entry.name[:-4]))
+                    total += stat.st_size
+                elif entry.name.endswith(('.tmp', '.tmp.meta')) and now - stat.st_mtime > _STALE_TMP_SECONDS:
+                    self._discard(entry.path)
+        artifacts.sort()
+        for _, size, key in artifacts:
+            if total <= self.max_bytes:
+                break
+            self._discard(self._path(key, 'bin'))
+            self._discard(self._path(key, 'meta'))
+            total -= size
+            metrics.EXPORT_CACHE_EVICTIONS.inc()
+        with self._size_lock:
+            self._size = total
+
+
+def read_chunks(handle: BinaryIO) -> Iterator[bytes]:
+    """Read an artifact from lookup()'s 'file' in chunks, closing it at the end"""
+    try:
+        while True:
+            chunk = handle.read(_READ_CHUNK_BYTES)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        handle.close()
@@ -0,0 +1,306 @@
+"""
+Persistent background jobs for slow weather-request work.
+
+Jobs are rows in a SQLite `jobs` table next to the weather data. A dispatcher
+thread claims queued rows and runs them on a bounded thread pool. Each claim
+takes a lease, and a job whose lease runs out (its process died mid-run) is
+claimed again, so queued and interrupted work survives restarts and is shared
+by every worker process.
+
+While a job runs, the dispatcher renews its lease every third of
+JOB_LEASE_SECONDS, so a long job is not claimed a second time. Every claim has
+its own lease token, and a run only records its outcome while it still holds
+the token: a worker that lost its lease (it stalled past the lease, and the job
+was claimed again elsewhere) cannot overwrite the newer attempt's status.
+Handlers still see a job more than once after a crash, so they must be safe to
+repeat.
+
+A handler that raises ValueError rejected its input, and the job fails at once.
+Any other exception is treated as transient (an upstream outage, a locked
+database): the job goes back to the queue and is not claimed again for
+JOB_RETRY_BACKOFF_SECONDS, doubling per attempt, until JOB_MAX_ATTEMPTS is used up.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+import tracing
+
+logger = logging.getLogger("weather.jobs")
+
+# Jobs run at the same time per process
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "4"))
+# A running job whose lease expires is assumed orphaned and retried
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Delay before retrying a failed job, doubled for each attempt already made
+JOB_RETRY_BACKOFF_SECONDS = float(os.getenv("JOB_RETRY_BACKOFF_SECONDS", "5"))
+# Idle dispatcher re-checks the table this often (picks up jobs queued by other workers)
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1.0"))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class JobQueue:
+    """SQLite-backed job queue with a bounded in-process worker pool"""
+
+    def __init__(self, db_path: str, concurrency: int = JOB_CONCURRENCY,
+                 lease_seconds: float = JOB_LEASE_SECONDS, max_attempts: int = JOB_MAX_ATTEMPTS,
+                 poll_seconds: float = JOB_POLL_SECONDS,
+                 retry_backoff_seconds: float = JOB_RETRY_BACKOFF_SECONDS):
+        self.db_path = db_path
+        self.concurrency = max(1, concurrency)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.poll_seconds = poll_seconds
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self._handlers: Dict[str, Callable[[Dict], Any]] = {}
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._dispatcher: Optional[threading.Thread] = None
+        # Lease tokens of the jobs this process is running, renewed by the dispatcher
+        self._leases: Dict[str, str] = {}
+        self._leases_lock = threading.Lock()
+        self._next_renewal = 0.0
+        self.init_table()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30.0, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def init_table(self):
+        conn = self._connect()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    result TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    lease_expires REAL,
+                    lease_token TEXT,
+                    run_after REAL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            # Older databases predate lease tokens and retry backoff
+            columns = [column[1] for column in conn.execute("PRAGMA table_info(jobs)").fetchall()]
+            if 'lease_token' not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN lease_token TEXT")
+            if 'run_after' not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN run_after REAL")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status)")
+        finally:
+            conn.close()
+
+    def register(self, kind: str, handler: Callable[[Dict], Any]):
+        """Register the function that runs jobs of `kind`; it gets the payload dict"""
+        self._handlers[kind] = handler
+
+    def enqueue(self, kind: str, payload: Dict) -> str:
+        """Persist a new job and wake the dispatcher; returns the job id"""
+        job_id = uuid.uuid4().hex
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, payload) VALUES (?, ?, ?)",
+                (job_id, kind, json.dumps(payload))
+            )
+        finally:
+            conn.close()
+        self._wake.set()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Job status, attempts, timestamps and result or error"""
+        conn = self._connect()
+        try:
+            row = conn.execute('''
+                SELECT id, kind, status, result, error, attempts, created_at, updated_at
+                FROM jobs WHERE id = ?
+            ''', (job_id,)).fetchone()
+        finally:
+            conn.close()
+        if not row:
+            return None
+        columns = ['id', 'kind', 'status', 'result', 'error', 'attempts', 'created_at', 'updated_at']
+        job = dict(zip(columns, row))
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def stats(self) -> Dict[str, int]:
+        """Number of jobs per status"""
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        finally:
+            conn.close()
+        counts = {QUEUED: 0, RUNNING: 0, SUCCEEDED: 0, FAILED: 0}
+        counts.update(dict(rows))
+        return counts
+
+    # -- dispatching ---------------------------------------------------------
+
+    def start(self):
+        """Start the dispatcher thread; queued and orphaned jobs are picked up right away"""
+        if self._dispatcher and self._dispatcher.is_alive():
+            return
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="job")
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="job-dispatcher", daemon=True)
+        self._dispatcher.start()
+
+    def stop(self, wait: bool = True):
+        """Stop claiming jobs. Jobs still running keep their lease and are retried after a restart."""
+        self._stop.set()
+        self._wake.set()
+        if self._dispatcher:
+            self._dispatcher.join(timeout=self.poll_seconds * 2)
+        if self._executor:
+            self._executor.shutdown(wait=wait)
+
+    def _dispatch_loop(self):
+        while not self._stop.is_set():
+            if time.monotonic() >= self._next_renewal:
+                self._renew_leases()
+            # Wait for a free worker before claiming, so claimed jobs never sit in a local queue
+            if not self._slots.acquire(timeout=self.poll_seconds):
+                continue
+            try:
+                job = self._claim()
+            except sqlite3.Error:
+                logger.exception("Could not claim job")
+                job = None
+            if job is None:
+                self._slots.release()
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+                continue
+            self._executor.submit(self._run, job)
+
+    def _claim(self) -> Optional[Dict]:
+        """Atomically move the oldest runnable job to running under a fresh lease"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # Orphaned jobs that already used all their attempts are given up on
+            conn.execute('''
+                UPDATE jobs SET status = ?, error = ?, lease_expires = NULL, lease_token = NULL,
+                                updated_at = CURRENT_TIMESTAMP
+                WHERE status = ? AND lease_expires < ? AND attempts >= ?
+            ''', (FAILED, f"Gave up after {self.max_attempts} interrupted attempts", RUNNING, now, self.max_attempts))
+            row = conn.execute('''
+                SELECT id, kind, payload, attempts FROM jobs
+                WHERE (status = ? AND (run_after IS NULL OR run_after <= ?))
+                   OR (status = ? AND lease_expires < ?)
+                ORDER BY rowid LIMIT 1
+            ''', (QUEUED, now, RUNNING, now)).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            lease_token = uuid.uuid4().hex
+            conn.execute('''
+                UPDATE jobs SET status = ?, attempts = attempts + 1, lease_expires = ?, lease_token = ?,
+                                updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (RUNNING, now + self.lease_seconds, lease_token, row[0]))
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        with self._leases_lock:
+            self._leases[row[0]] = lease_token
+        return {'id': row[0], 'kind': row[1], 'payload': json.loads(row[2]), 'attempts': row[3] + 1,
+                'lease_token': lease_token}
+
+    def _renew_leases(self):
+        """Extend the lease of every job this process is running"""
+        self._next_renewal = time.monotonic() + self.lease_seconds / 3
+        with self._leases_lock:
+            leases = list(self._leases.items())
+        if not leases:
+            return
+        conn = self._connect()
+        try:
+            for job_id, lease_token in leases:
+                renewed = conn.execute('''
+                    UPDATE jobs SET lease_expires = ? WHERE id = ? AND lease_token = ? AND status = ?
+                ''', (time.time() + self.lease_seconds, job_id, lease_token, RUNNING)).rowcount
+                if not renewed:
+                    logger.warning("Job %s lost its lease; its outcome will be discarded", job_id)
+                    with self._leases_lock:
+                        self._leases.pop(job_id, None)
+        except sqlite3.Error:
+            logger.exception("Could not renew job leases")
+        finally:
+            conn.close()
+
+    def _run(self, job: Dict):
+        payload = job['payload']
+        # A traceparent in the payload links the job's trace to the request that queued it
+        traceparent = payload.get('traceparent') if isinstance(payload, dict) else None
+        try:
+            with tracing.span(f"job.{job['kind']}", traceparent=traceparent, job_id=job['id']):
+                handler = self._handlers.get(job['kind'])
+                if handler is None:
+                    raise LookupError(f"No handler registered for job kind '{job['kind']}'")
+                result = handler(payload)
+            self._finish(job, SUCCEEDED, result=json.dumps(result, default=str))
+        except ValueError as e:
+            # Invalid input fails the same way on every attempt
+            logger.warning("Job %s (%s) rejected: %s", job['id'], job['kind'], e)
+            self._finish(job, FAILED, error=str(e))
+        except Exception as e:
+            if job['attempts'] >= self.max_attempts:
+                logger.warning("Job %s (%s) failed after %d attempts: %s", job['id'], job['kind'], job['attempts'], e)
+                self._finish(job, FAILED, error=str(e))
+            else:
+                delay = self.retry_backoff_seconds * 2 ** (job['attempts'] - 1)
+                logger.warning("Job %s (%s) failed, retrying in %.0fs: %s", job['id'], job['kind'], delay, e)
+                self._finish(job, QUEUED, error=str(e), run_after=time.time() + delay)
+        finally:
+            with self._leases_lock:
+                if self._leases.get(job['id']) == job['lease_token']:
+                    del self._leases[job['id']]
+            self._slots.release()
+            # A slot is free again, look for more work right away
+            self._wake.set()
+
+    def _finish(self, job: Dict, status: str, result: str = None, error: str = None,
+                run_after: float = None):
+        """Record the outcome, unless the job was claimed again since this run's claim.
+
+        A job requeued with `run_after` is not claimed again before that time.
+        """
+        conn = self._connect()
+        try:
+            updated = conn.execute('''
+                UPDATE jobs SET status = ?, result = ?, error = ?, lease_expires = NULL, lease_token = NULL,
+                                run_after = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND lease_token = ?
+            ''', (status, result, error, run_after, job['id'], job['lease_token'])).rowcount
+        finally:
+            conn.close()
+        if not updated:
+            logger.warning("Job %s finished after losing its lease; outcome (%s) discarded", job['id'], status)
@@ -0,0 +1,222 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Counters and histograms are plain dicts behind a lock, so recording a value costs
+a bisect and two additions and collection can stay on in production. Values are
+per process; with several workers each one reports its own series (scrape them
+individually or aggregate on the Prometheus side).
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Seconds; covers cache hits (sub-millisecond) up to slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with labels"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in values]
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram with labels"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (+Inf last), sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the `with` block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = []
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class CallbackMetric:
+    """Metric read at scrape time from a callback returning {label values: value}"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str],
+                 callback: Callable[[], Dict[Tuple[str, ...], float]], kind: str = "gauge"):
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+
+    def collect(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in sorted(self.callback().items())]
+
+
+_registry: Dict[str, object] = {}
+_registry_lock = threading.Lock()
+
+
+def _register(metric):
+    with _registry_lock:
+        return _registry.setdefault(metric.name, metric)
+
+
+def counter(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+    """Get or create a registered counter"""
+    return _register(Counter(name, documentation, tuple(labelnames)))
+
+
+def histogram(name: str, documentation: str, labelnames: Iterable[str] = (),
+              buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    """Get or create a registered histogram"""
+    return _register(Histogram(name, documentation, tuple(labelnames), buckets))
+
+
+def callback_metric(name: str, documentation: str, labelnames: Iterable[str],
+                    callback: Callable[[], Dict[Tuple[str, ...], float]], kind: str = "gauge") -> CallbackMetric:
+    """Register a metric whose values are computed on every scrape (for counters kept elsewhere)"""
+    return _register(CallbackMetric(name, documentation, tuple(labelnames), callback, kind))
+
+
+def render() -> str:
+    """All registered metrics in the Prometheus text format"""
+    with _registry_lock:
+        metrics = [_registry[name] for name in sorted(_registry)]
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {_escape(metric.documentation)}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
+
+
+# ============ SHARED METRICS ============
+
+HTTP_REQUEST_SECONDS = histogram(
+    "http_request_duration_seconds", "Time to serve an HTTP request, by route template",
+    ("method", "route")
+)
+HTTP_REQUESTS = counter(
+    "http_requests_total", "HTTP requests served, by route template and status code",
+    ("method", "route", "status")
+)
+UPSTREAM_CALL_SECONDS = histogram(
+    "upstream_call_duration_seconds", "Duration of calls to upstream providers",
+    ("provider", "outcome")
+)
+UPSTREAM_ERRORS = counter(
+    "upstream_errors_total", "Failed upstream calls", ("provider",)
+)
+UPSTREAM_SHORT_CIRCUITS = counter(
+    "upstream_short_circuited_total", "Upstream calls skipped by an open circuit breaker", ("provider",)
+)
+DB_METHOD_SECONDS = histogram(
+    "db_method_duration_seconds",
+    "Time spent in WeatherDatabase methods (create/update include geocoding and the forecast fetch)",
+    ("method",)
+)
+EXPORT_RENDER_SECONDS = histogram(
+    "export_render_duration_seconds", "Time to render an export, by format", ("format",)
+)
+WEATHER_CACHE_LOOKUPS = counter(
+    "weather_cache_lookups_total",
+    "Geocode and forecast lookups by outcome: warm_prewarmed (refreshed by the scheduler), warm or cold",
+    ("kind", "result")
+)
+PREWARM_RUNS = counter(
+    "prewarm_runs_total", "Prewarm scheduler runs, by outcome", ("outcome",)
+)
+PREWARM_REFRESHED = counter(
+    "prewarm_refreshed_total", "Entries refreshed by the prewarm scheduler", ("kind",)
+)
+PREWARM_RUN_SECONDS = histogram(
+    "prewarm_run_duration_seconds", "Duration of a prewarm scheduler run"
+)
+ADMISSION_DECISIONS = counter(
+    "admission_decisions_total",
+    "Admission control outcomes per route class: admitted, queued, rejected (queue full) or timed_out",
+    ("route_class", "outcome")
+)
+ADMISSION_WAIT_SECONDS = histogram(
+    "admission_wait_seconds", "Time queued requests waited for a slot", ("route_class",)
+)
+EXPORT_CACHE_LOOKUPS = counter(
+    "export_cache_lookups_total", "Export artifact cache lookups, by result (hit, miss or bypass)", ("result",)
+)
+EXPORT_CACHE_EVICTIONS = counter(
+    "export_cache_evictions_total", "Export artifacts evicted from the disk cache to stay under its size limit"
+)
@@ -0,0 +1,168 @@
+"""
+ASGI middleware for the weather app API.
+"""
+
+import json
+import time
+from typing import Iterable
+
+from starlette.datastructures import MutableHeaders
+from starlette.middleware.gzip import GZipMiddleware
+
+import admission
+import tracing
+from metrics import HTTP_REQUEST_SECONDS, HTTP_REQUESTS
+
+
+class SelectiveGZipMiddleware(GZipMiddleware):
+    """GZip responses except on paths that must not be buffered or re-encoded.
+
+    Server-sent events need every event flushed to the client as it is produced,
+    which a compressing middleware would hold back.
+    """
+
+    def __init__(self, app, exclude_paths: Iterable[str] = (), minimum_size: int = 1000, compresslevel: int = 6):
+        super().__init__(app, minimum_size=minimum_size, compresslevel=compresslevel)
+        self.exclude_paths = tuple(exclude_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith(self.exclude_paths):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+class MetricsMiddleware:
+    """Record latency and status of every HTTP request, labelled by route template.
+
+    Labels use the matched route's path (`/weather-requests/{request_id}`), never the
+    raw URL, so the number of series stays bounded; unmatched paths share one label.
+    Streaming responses are timed until their last chunk is sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method=scope["method"], route=route_path)
+            HTTP_REQUESTS.inc(method=scope["method"], route=route_path, status=status)
+
+
+class TracingMiddleware:
+    """Open the root span of each request's trace.
+
+    An incoming W3C `traceparent` header continues the caller's trace; the trace id
+    is returned in `X-Trace-Id` so a slow response can be looked up on /debug/traces.
+    The span is named after the route template once routing has matched it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not tracing.TRACING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+
+        with tracing.span(f"HTTP {scope['method']}", traceparent=traceparent) as span:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    span.set(**{"http.status_code": message["status"]})
+                    if message["status"] >= 500:
+                        span.status = "error"
+                    MutableHeaders(scope=message).append("X-Trace-Id", span.trace_id)
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route_path = getattr(scope.get("route"), "path", None) or "unmatched"
+                span.name = f"HTTP {scope['method']} {route_path}"
+                span.set(**{"http.method": scope["method"], "http.route": route_path})
+
+
+class AdmissionControlMiddleware:
+    """Gate expensive routes through their admission gates (see admission.py).
+
+    A shed request gets 429 (queue full) or 503 (waited too long) with Retry-After
+    and never reaches the handler. The slot is held until the response's last
+    chunk is sent, so streamed chat answers count for their whole duration.
+    Deferred classes get an AdmissionTicket in the scope instead; their handler
+    takes the slot with admission.admit, and it is freed here all the same.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        route_class = None
+        if scope["type"] == "http" and admission.ADMISSION_ENABLED:
+            route_class = admission.classify(scope["method"], scope["path"], scope.get("query_string", b""))
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        gate = admission.get_gate(route_class)
+        if route_class in admission.DEFERRED_CLASSES:
+            ticket = scope['admission_ticket'] = admission.AdmissionTicket(gate, admission.user_key(scope))
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                ticket.release()
+            return
+
+        try:
+            await gate.acquire(admission.user_key(scope))
+        except admission.AdmissionRejected as e:
+            await _send_rejection(send, e)
+            return
+
+        start = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release(time.monotonic() - start)
+
+
+async def _send_rejection(send, rejection: "admission.AdmissionRejected"):
+    """Write a 429/503 JSON response for a shed request"""
+    body = json.dumps({
+        "status": "error",
+        "message": "The server is busy, please retry shortly.",
+        "route_class": rejection.route_class,
+        "retry_after": rejection.retry_after
+    }).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": rejection.status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(rejection.retry_after).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -1,5 +1,32 @@
+import os
 import requests
 import json
+from typing import Dict, List, Tuple
+from cache import create_cache
+from circuit_breaker import get_breaker
+from metrics import WEATHER_CACHE_LOOKUPS
+import tracing
+from tool_cache import FallbackResult
+
+# Overridable so benchmarks can point the tool at local stub servers
+GEOCODING_URL = os.getenv("OPEN_METEO_GEOCODING_URL", "https://geocoding-api.open-meteo.com/v1/search")
+FORECAST_URL = os.getenv("OPEN_METEO_FORECAST_URL", "https://api.open-meteo.com/v1/forecast")
+
+# Last known good upstream responses, served while a provider's breaker is open
+_geocode_fallback_cache = create_cache('geocode_last_good', maxsize=2048, ttl=7 * 24 * 3600)
+_forecast_fallback_cache = create_cache('forecast_last_good', maxsize=1024, ttl=6 * 3600)
+_MISSING = object()
+
+# Fresh answers, served without an upstream call. Forecast entries live as long as
+# Open-Meteo's update cycle; the prewarm scheduler (prewarm.py) refreshes hot ones early.
+GEOCODE_TTL_SECONDS = float(os.getenv("GEOCODE_TTL_SECONDS", str(24 * 3600)))
+FORECAST_TTL_SECONDS = float(os.getenv("FORECAST_TTL_SECONDS", "900"))
+_geocode_cache = create_cache('geocode', maxsize=4096, ttl=GEOCODE_TTL_SECONDS)
+_forecast_cache = create_cache('forecast', maxsize=2048, ttl=FORECAST_TTL_SECONDS)
+
+# Forecasts are always fetched for the maximum span and sliced per request, so
+# every request for a place and unit system shares one cache entry
+FORECAST_FETCH_DAYS = 7
 
 # WMO Weather interpretation codes (https://open-meteo.com/en/docs)
 WMO_CODES = {
@@ -50,21 +77,148 @@ def _get_coordinates(location: str) -> tuple[float, float] | None:
     
     # If not coordinates, use geocoding API
     try:
+        result = _geocode(location)
+        if result:
+            return result["latitude"], result["longitude"]
+    except requests.exceptions.RequestException as e:
+        print(f"Error geocoding {location}: {e}")
+    return None
+
+@tracing.traced("open_meteo.geocode")
+def _geocode(location: str) -> dict | None:
+    """Look up the best geocoding match for a location name (name, coordinates, country, timezone).
+
+    Returns None when the location is unknown. Raises a RequestException when the geocoder
+    is unreachable (or its breaker is open) and there is no cached answer, so callers can
+    tell "not found" apart from "could not ask".
+    """
+    key = location.strip().lower()
+    cached = _geocode_cache.get(key, _MISSING)
+    if cached is not _MISSING:
+        result = "warm_prewarmed" if cached["prewarmed"] else "warm"
+        WEATHER_CACHE_LOOKUPS.inc(kind="geocode", result=result)
+        tracing.annotate(cache=result)
+        return cached["result"]
+    WEATHER_CACHE_LOOKUPS.inc(kind="geocode", result="cold")
+    tracing.annotate(cache="cold")
+    return refresh_geocode(location)
+
+def refresh_geocode(location: str, prewarmed: bool = False) -> dict | None:
+    """Ask the geocoder (bypassing the fresh cache) and cache the answer"""
+    key = location.strip().lower()
+    breaker = get_breaker("open_meteo_geocoding")
+
+    def fetch():
         response = requests.get(
-            f"https://geocoding-api.open-meteo.com/v1/search?name={location}&count=1&format=json"
+            GEOCODING_URL,
+            params={"name": location, "count": 1, "format": "json"},
+            timeout=breaker.timeout
         )
         response.raise_for_status()
+        results = response.json().get("results")
+        result = results[0] if results else None
+        _geocode_fallback_cache.set(key, result)
+        _geocode_cache.set(key, {"result": result, "prewarmed": prewarmed})
+        return result
+
+    def fallback():
+        cached = _geocode_fallback_cache.get(key, _MISSING)
+        if cached is _MISSING:
+            raise requests.exceptions.ConnectionError("Geocoding service is temporarily unavailable")
+        return cached
+
+    return breaker.call(fetch, fallback=fallback)
+
+def forecast_params(latitude: float, longitude: float, units: str = "metric") -> dict:
+    """Open-Meteo forecast query for one place; also the forecast cache key"""
+    return {
+        "latitude": latitude,
+        "longitude": longitude,
+        "current": ["temperature_2m", "relative_humidity_2m", "apparent_temperature", "is_day", "precipitation", "weather_code", "wind_speed_10m"],
+        "daily": ["weather_code", "temperature_2m_max", "temperature_2m_min", "precipitation_sum", "precipitation_probability_max"],
+        "temperature_unit": "fahrenheit" if units == "imperial" else "celsius",
+        "wind_speed_unit": "mph" if units == "imperial" else "kmh",
+        "precipitation_unit": "inch" if units == "imperial" else "mm",
+        "forecast_days": FORECAST_FETCH_DAYS,
+        "timezone": "auto"
+    }
+
+def prewarm_geocode(location: str) -> Tuple[dict | None, bool]:
+    """Geocode for the prewarm scheduler: (result, whether the geocoder was asked).
+
+    Geocodes barely change, so a fresh entry is kept rather than re-fetched.
+    """
+    cached = _geocode_cache.get(location.strip().lower(), _MISSING)
+    if cached is not _MISSING:
+        return cached["result"], False
+    return refresh_geocode(location, prewarmed=True), True
+
+def _store_forecast(params: dict, data: dict, prewarmed: bool = False):
+    key = json.dumps(params, sort_keys=True)
+    _forecast_fallback_cache.set(key, data)
+    _forecast_cache.set(key, {"data": data, "prewarmed": prewarmed})
+
+@tracing.traced("open_meteo.fetch_forecast")
+def _fetch_forecast(params: dict) -> dict:
+    """Fetch raw forecast JSON from Open-Meteo through the provider's circuit breaker.
+
+    Fresh cached forecasts are returned without an upstream call. While the breaker is
+    open (or the call fails) the last good response for the same parameters is
+    returned with `_stale` set, or `None` if we never had one.
+    """
+    key = json.dumps(params, sort_keys=True)
+    cached = _forecast_cache.get(key, _MISSING)
+    if cached is not _MISSING:
+        result = "warm_prewarmed" if cached["prewarmed"] else "warm"
+        WEATHER_CACHE_LOOKUPS.inc(kind="forecast", result=result)
+        tracing.annotate(cache=result)
+        return cached["data"]
+    WEATHER_CACHE_LOOKUPS.inc(kind="forecast", result="cold")
+    tracing.annotate(cache="cold")
+    breaker = get_breaker("open_meteo_forecast")
+
+    def fetch():
+        response = requests.get(FORECAST_URL, params=params, timeout=breaker.timeout)
+        response.raise_for_status()
         data = response.json()
-        if data.get("results"):
-            return data["results"][0]["latitude"], data["results"][0]["longitude"]
-    except requests.exceptions.RequestException as e:
-        print(f"Error geocoding {location}: {e}")
-    return None
+        _store_forecast(params, data)
+        return data
+
+    def fallback():
+        cached = _forecast_fallback_cache.get(key)
+        return dict(cached, _stale=True) if cached else None
+
+    return breaker.call(fetch, fallback=fallback)
+
+def prewarm_forecasts(coordinates: List[Tuple[float, float]], units: str = "metric") -> int:
+    """Refresh the forecast cache for many places with one batched Open-Meteo call.
+
+    Open-Meteo accepts comma-separated coordinate lists and answers with one result
+    per place, in order. Returns the number of places refreshed; raises on failure.
+    """
+    if not coordinates:
+        return 0
+    batch_params = dict(forecast_params(0.0, 0.0, units),
+                        latitude=",".join(str(lat) for lat, _ in coordinates),
+                        longitude=",".join(str(lon) for _, lon in coordinates))
+    breaker = get_breaker("open_meteo_forecast")
+
+    def fetch():
+        response = requests.get(FORECAST_URL, params=batch_params, timeout=breaker.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    data = breaker.call(fetch)
+    results = data if isinstance(data, list) else [data]
+    for (lat, lon), result in zip(coordinates, results):
+        _store_forecast(forecast_params(lat, lon, units), result, prewarmed=True)
+    return min(len(coordinates), len(results))
 
 def _translate_wmo_code(code: int) -> str:
     """Translates WMO weather code to a human-readable description."""
     return WMO_CODES.get(code, "Unknown weather code")
 
+@tracing.traced("open_meteo.get_weather_forecast")
 def get_weather_forecast(location: str, units: str = "metric", forecast_days: int = 1) -> str:
     """
     Fetches the current weather and a brief forecast for a specified location using the Open-Meteo API.
@@ -95,28 +249,15 @@ def get_weather_forecast(location: str, units: str = "metric", forecast_days: in
     else:
         display_location = location
     
-    temperature_unit = "fahrenheit" if units == "imperial" else "celsius"
-    wind_speed_unit = "mph" if units == "imperial" else "kmh"
-    
     # Clamp forecast_days between 1 and 7 for simplicity with API
-    forecast_days = max(1, min(forecast_days, 7))
+    forecast_days = max(1, min(forecast_days, FORECAST_FETCH_DAYS))
 
-    params = {
-        "latitude": latitude,
-        "longitude": longitude,
-        "current": ["temperature_2m", "relative_humidity_2m", "apparent_temperature", "is_day", "precipitation", "weather_code", "wind_speed_10m"],
-        "daily": ["weather_code", "temperature_2m_max", "temperature_2m_min", "precipitation_sum", "precipitation_probability_max"],
-        "temperature_unit": temperature_unit,
-        "wind_speed_unit": wind_speed_unit,
-        "precipitation_unit": "inch" if units == "imperial" else "mm",
-        "forecast_days": forecast_days,
-        "timezone": "auto" 
-    }
+    params = forecast_params(latitude, longitude, units)
 
     try:
-        response = requests.get("https://api.open-meteo.com/v1/forecast", params=params)
-        response.raise_for_status()
-        data = response.json()
+        data = _fetch_forecast(params)
+        if data is None:
+            return f"Weather service is temporarily unavailable, could not fetch weather data for {display_location}."
 
         current = data.get("current")
         daily = data.get("daily")
@@ -162,6 +303,9 @@ def get_weather_forecast(location: str, units: str = "metric", forecast_days: in
                     f"  {date}: {daily_weather_desc}. High: {max_temp}{temp_symbol}, Low: {min_temp}{temp_symbol}. "
                     f"Precip: {precip_sum}{precip_symbol} (Prob: {precip_prob}%)\n"
                 )
+        if data.get("_stale"):
+            result += "\n(Weather service is temporarily unavailable; showing the most recent cached data.)\n"
+            return FallbackResult(result.strip())
         return result.strip()
 
     except requests.exceptions.RequestException as e:
@@ -0,0 +1,284 @@
+"""
+PDF rendering for the export endpoint, off the event loop.
+
+Records are laid out in reportlab LongTables of PDF_TABLE_RECORDS records each.
+A shaded "Record n" row starts each record, the Field/Value header repeats at
+the top of every page, and all tables share one TableStyle instead of building
+a table and a style per record. Tables are kept short because reportlab measures
+the rest of a table again at every page break. One table for the whole report
+took 13-30 s for 1000 records, against about 2 s this way.
+
+Building a document is pure-Python CPU work. `render_pdf` runs it in a process
+pool of PDF_RENDER_WORKERS processes, which is also the cap on concurrent
+builds; other exports wait in the pool's queue. When pypdf is installed, the
+front matter (title, "Generated on" stamp, totals and data structure) is a
+document of its own, the records are built in chunks of PDF_CHUNK_RECORDS in
+parallel, and the parts are concatenated. Without pypdf the report is built as
+a single document.
+
+Keeping the front matter separate lets the export cache store the records
+(`render_records_pdf`) and stamp a fresh front matter onto them for every
+download (`attach_front_matter`).
+
+`build_pdf` is the synchronous entry point used by DataExporter.export_to_pdf.
+"""
+
+import asyncio
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from importlib.util import find_spec
+from typing import Dict, List, Optional
+
+import tracing
+
+REPORTLAB_AVAILABLE = find_spec('reportlab') is not None
+PYPDF_AVAILABLE = find_spec('pypdf') is not None
+
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_CHUNK_RECORDS = int(os.getenv("PDF_CHUNK_RECORDS", "250"))
+# Records per table. Every page break re-measures the rest of a table, so one
+# table for the whole report would make layout quadratic in its length.
+PDF_TABLE_RECORDS = max(1, int(os.getenv("PDF_TABLE_RECORDS", "10")))
+# Restart workers now and then; reportlab keeps font and image caches per process
+PDF_WORKER_MAX_TASKS = int(os.getenv("PDF_WORKER_MAX_TASKS", "100"))
+
+# Longer string values are cut to this many characters
+MAX_VALUE_CHARS = 100
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+# Per process, built on first use (each pool worker builds its own)
+_styles = None
+_table_style = None
+
+
+def _layout():
+    """Paragraph styles and the shared record table style"""
+    global _styles, _table_style
+    if _styles is None:
+        from reportlab.lib import colors
+        from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+        from reportlab.platypus import TableStyle
+
+        sample = getSampleStyleSheet()
+        _table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP')
+        ])
+        _styles = {
+            'title': ParagraphStyle('CustomTitle', parent=sample['Heading1'], fontSize=24,
+                                    spaceAfter=30, alignment=1),
+            'meta': ParagraphStyle('Meta', parent=sample['Normal'], fontSize=10, spaceAfter=20, alignment=1),
+            'heading': sample['Heading2'],
+            'normal': sample['Normal'],
+        }
+    return _styles, _table_style
+
+
+def _display(value) -> str:
+    if isinstance(value, str) and len(value) > MAX_VALUE_CHARS:
+        return value[:MAX_VALUE_CHARS] + "..."
+    return str(value)
+
+
+def _records_tables(records: List[Dict], first_number: int) -> List:
+    """LongTables of PDF_TABLE_RECORDS records; each record starts with a shaded "Record n" row"""
+    from reportlab.lib import colors
+    from reportlab.lib.units import inch
+    from reportlab.platypus import LongTable, Spacer
+
+    _, table_style = _layout()
+    tables = []
+    for start in range(0, len(records), PDF_TABLE_RECORDS):
+        rows = [['Field', 'Value']]
+        section_commands = []
+        for number, record in enumerate(records[start:start + PDF_TABLE_RECORDS], first_number + start):
+            section_commands += [
+                ('BACKGROUND', (0, len(rows)), (-1, len(rows)), colors.beige),
+                ('FONTNAME', (0, len(rows)), (-1, len(rows)), 'Helvetica-Bold'),
+            ]
+            rows.append([f"Record {number}", ''])
+            for key, value in record.items():
+                if value is not None:
+                    rows.append([key.replace('_', ' ').title(), _display(value)])
+        table = LongTable(rows, colWidths=[2 * inch, 4 * inch], repeatRows=1, style=table_style)
+        table.setStyle(section_commands)
+        tables += [table, Spacer(1, 20)]
+    return tables
+
+
+def _summary_elements(styles) -> List:
+    from reportlab.lib import colors
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Paragraph, Spacer, Table, TableStyle
+
+    summary_table = Table([
+        ['Field', 'Description'],
+        ['ID', 'Unique identifier'],
+        ['Location', 'Requested location'],
+        ['Date Range', 'Start and end dates'],
+        ['Created At', 'Request timestamp'],
+        ['Weather Data', 'Forecast information']
+    ], colWidths=[2 * inch, 4 * inch])
+    summary_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ]))
+    return [Paragraph("Data Structure", styles['heading']), summary_table, Spacer(1, 30)]
+
+
+def _build_part(records: List[Dict], first_number: int, total: int, generated_at: str,
+                front_matter: bool) -> bytes:
+    """One document: the title page content (first part only) and the record tables.
+
+    Runs in a pool worker, so it takes and returns only picklable values.
+    """
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer
+
+    styles, _ = _layout()
+    elements = []
+    if front_matter:
+        elements.append(Paragraph("Weather Data Export Report", styles['title']))
+        elements.append(Paragraph(f"Generated on: {generated_at}<br/>Total Records: {total}", styles['meta']))
+        elements.append(Spacer(1, 20))
+        if not total:
+            elements.append(Paragraph("No data available.", styles['normal']))
+        else:
+            elements += _summary_elements(styles)
+    if records:
+        elements += _records_tables(records, first_number)
+
+    buffer = io.BytesIO()
+    SimpleDocTemplate(buffer, pagesize=letter, topMargin=1 * inch).build(elements)
+    return buffer.getvalue()
+
+
+def _merge(parts: List[bytes]) -> bytes:
+    """Concatenate PDF documents page by page"""
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    for part in parts:
+        writer.append(io.BytesIO(part))
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+def _generated_at() -> str:
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _records_plan(data: List[Dict], generated_at: str) -> List[tuple]:
+    """_build_part arguments for the record chunks, without front matter"""
+    chunk = max(1, PDF_CHUNK_RECORDS)
+    return [(data[start:start + chunk], start + 1, len(data), generated_at, False)
+            for start in range(0, len(data), chunk)]
+
+
+def _plan(data: List[Dict]) -> List[tuple]:
+    """Arguments for each part's _build_part call"""
+    generated_at = _generated_at()
+    if not PYPDF_AVAILABLE:
+        return [(data, 1, len(data), generated_at, True)]
+    return [([], 1, len(data), generated_at, True)] + _records_plan(data, generated_at)
+
+
+def _require_reportlab():
+    if not REPORTLAB_AVAILABLE:
+        raise ValueError("PDF export requires 'reportlab' package. Install with: pip install reportlab")
+
+
+def build_pdf(data: List[Dict]) -> bytes:
+    """Render the report in this process and thread"""
+    _require_reportlab()
+    parts = [_build_part(*args) for args in _plan(data)]
+    return parts[0] if len(parts) == 1 else _merge(parts)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Forking a threaded server process is unsafe, so workers start fresh
+            _pool = ProcessPoolExecutor(
+                max_workers=max(1, PDF_RENDER_WORKERS),
+                mp_context=multiprocessing.get_context("spawn"),
+                max_tasks_per_child=PDF_WORKER_MAX_TASKS or None
+            )
+        return _pool
+
+
+async def _render(plan: List[tuple]) -> bytes:
+    loop = asyncio.get_running_loop()
+    pool = _get_pool()
+    parts = await asyncio.gather(*(loop.run_in_executor(pool, _build_part, *args) for args in plan))
+    if len(parts) == 1:
+        return parts[0]
+    return await loop.run_in_executor(pool, _merge, list(parts))
+
+
+@tracing.traced("export.pdf")
+async def render_pdf(data: List[Dict]) -> bytes:
+    """Render the report in the process pool, building its chunks in parallel"""
+    _require_reportlab()
+    plan = _plan(data)
+    tracing.annotate(records=len(data), parts=len(plan))
+    return await _render(plan)
+
+
+def _require_pypdf():
+    if not PYPDF_AVAILABLE:
+        raise ValueError("Splitting PDF front matter requires 'pypdf' package. Install with: pip install pypdf")
+
+
+@tracing.traced("export.pdf")
+async def render_records_pdf(data: List[Dict]) -> bytes:
+    """The report without its front matter, b'' when there are no records"""
+    _require_reportlab()
+    _require_pypdf()
+    plan = _records_plan(data, _generated_at())
+    tracing.annotate(records=len(data), parts=len(plan))
+    return await _render(plan) if plan else b''
+
+
+@tracing.traced("export.pdf_front_matter")
+async def attach_front_matter(records_pdf: bytes, total: int) -> bytes:
+    """A freshly stamped front matter followed by the pages of `records_pdf`"""
+    _require_reportlab()
+    _require_pypdf()
+    loop = asyncio.get_running_loop()
+    pool = _get_pool()
+    front = await loop.run_in_executor(pool, _build_part, [], 1, total, _generated_at(), True)
+    if not records_pdf:
+        return front
+    return await loop.run_in_executor(pool, _merge, [front, records_pdf])
+
+
+def shutdown():
+    """Drop queued builds and stop the worker processes; a later render starts a new pool"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,184 @@
+"""
+Background pre-warming of forecasts for hot locations.
+
+Every PREWARM_INTERVAL_SECONDS (plus random jitter) the scheduler takes the
+PREWARM_TOP_N most requested locations of the last PREWARM_LOOKBACK_DAYS, or
+the fixed PREWARM_LOCATIONS list when set. It geocodes any that are not cached,
+at most PREWARM_CONCURRENCY at a time (the geocoder has no batch API), then
+refreshes their forecasts in batched Open-Meteo calls. The interval is shorter
+than FORECAST_TTL_SECONDS, so hot entries are replaced before they expire and
+users keep hitting a warm cache.
+
+`weather_cache_lookups_total{result="warm_prewarmed"}` on /metrics counts the
+lookups these refreshes served. With several workers sharing SQLite state, only
+the worker holding the scheduler lease runs the refresh.
+"""
+
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import metrics
+import tracing
+from cache import SHARED_STATE_BACKEND, SHARED_STATE_DB
+from open_meteo_tool import FORECAST_TTL_SECONDS, prewarm_forecasts, prewarm_geocode
+
+logger = logging.getLogger("weather.prewarm")
+
+PREWARM_ENABLED = os.getenv("PREWARM_ENABLED", "true").lower() not in ("0", "false", "no")
+PREWARM_TOP_N = int(os.getenv("PREWARM_TOP_N", "20"))
+PREWARM_LOOKBACK_DAYS = int(os.getenv("PREWARM_LOOKBACK_DAYS", "30"))
+# Comma-separated; replaces the top-N query when set
+PREWARM_LOCATIONS = [name.strip() for name in os.getenv("PREWARM_LOCATIONS", "").split(",") if name.strip()]
+PREWARM_UNITS = [unit.strip() for unit in os.getenv("PREWARM_UNITS", "metric").split(",") if unit.strip()]
+# Refresh well before forecast entries expire
+PREWARM_INTERVAL_SECONDS = float(os.getenv("PREWARM_INTERVAL_SECONDS", str(FORECAST_TTL_SECONDS * 2 / 3)))
+PREWARM_JITTER_SECONDS = float(os.getenv("PREWARM_JITTER_SECONDS", "30"))
+PREWARM_CONCURRENCY = int(os.getenv("PREWARM_CONCURRENCY", "4"))
+PREWARM_BATCH_SIZE = int(os.getenv("PREWARM_BATCH_SIZE", "50"))
+
+
+class _Lease:
+    """Cross-process lease in the shared state database, so one worker runs the scheduler"""
+
+    def __init__(self, name: str, db_path: str = SHARED_STATE_DB):
+        self.name = name
+        self.db_path = db_path
+        self.owner = uuid.uuid4().hex
+        conn = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None)
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS scheduler_leases (
+                    name TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            ''')
+        finally:
+            conn.close()
+
+    def acquire(self, seconds: float) -> bool:
+        """Take or extend the lease for `seconds`; False if another process holds it"""
+        now = time.time()
+        conn = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT owner, expires_at FROM scheduler_leases WHERE name = ?", (self.name,)).fetchone()
+            if row and row[0] != self.owner and row[1] > now:
+                conn.execute("COMMIT")
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO scheduler_leases (name, owner, expires_at) VALUES (?, ?, ?)",
+                (self.name, self.owner, now + seconds)
+            )
+            conn.execute("COMMIT")
+            return True
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            logger.exception("Could not take the %s lease", self.name)
+            return False
+        finally:
+            conn.close()
+
+
+class ForecastPrewarmer:
+    """Periodically refreshes geocodes and forecasts for the hottest locations"""
+
+    def __init__(self, top_locations: Callable[[int, int], List[Dict]],
+                 locations: List[str] = None, top_n: int = PREWARM_TOP_N,
+                 lookback_days: int = PREWARM_LOOKBACK_DAYS, units: List[str] = None,
+                 interval: float = PREWARM_INTERVAL_SECONDS, jitter: float = PREWARM_JITTER_SECONDS,
+                 concurrency: int = PREWARM_CONCURRENCY, batch_size: int = PREWARM_BATCH_SIZE):
+        self.top_locations = top_locations
+        self.locations = locations if locations is not None else PREWARM_LOCATIONS
+        self.top_n = top_n
+        self.lookback_days = lookback_days
+        self.units = units or PREWARM_UNITS
+        self.interval = interval
+        self.jitter = jitter
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size)
+        self.last_run: Dict = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Only needed when several workers share state
+        self._lease = _Lease("forecast_prewarm") if SHARED_STATE_BACKEND == "sqlite" else None
+
+    def _targets(self) -> List[str]:
+        if self.locations:
+            return list(self.locations)
+        return [row['location'] for row in self.top_locations(self.top_n, self.lookback_days)]
+
+    def run_once(self) -> Dict:
+        """One refresh pass; the returned counts are also shown on /health/upstreams"""
+        start = time.monotonic()
+        summary = {'locations': 0, 'geocoded': 0, 'forecasts': 0, 'failed_batches': 0}
+        try:
+            with tracing.span("prewarm.run"):
+                self._refresh(summary)
+            metrics.PREWARM_REFRESHED.inc(summary['geocoded'], kind="geocode")
+            metrics.PREWARM_REFRESHED.inc(summary['forecasts'], kind="forecast")
+            metrics.PREWARM_RUNS.inc(outcome="partial" if summary['failed_batches'] else "ok")
+        except Exception:
+            metrics.PREWARM_RUNS.inc(outcome="error")
+            logger.exception("Forecast prewarm run failed")
+        duration = time.monotonic() - start
+        metrics.PREWARM_RUN_SECONDS.observe(duration)
+        self.last_run = dict(summary, duration_seconds=round(duration, 3), finished_at=time.time())
+        return self.last_run
+
+    def _refresh(self, summary: Dict):
+        targets = self._targets()
+        summary['locations'] = len(targets)
+
+        # Geocoding has no batch API; bound the parallel lookups instead
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="prewarm") as pool:
+            geocoded = list(pool.map(tracing.bind(self._geocode), targets))
+
+        coordinates = list(dict.fromkeys(
+            (result["latitude"], result["longitude"]) for result, _ in geocoded if result
+        ))
+        summary['geocoded'] = sum(1 for _, refreshed in geocoded if refreshed)
+
+        for units in self.units:
+            for i in range(0, len(coordinates), self.batch_size):
+                batch = coordinates[i:i + self.batch_size]
+                try:
+                    summary['forecasts'] += prewarm_forecasts(batch, units)
+                except Exception as e:
+                    summary['failed_batches'] += 1
+                    logger.warning("Forecast prewarm batch of %d failed: %s", len(batch), e)
+
+    def _geocode(self, location: str):
+        try:
+            return prewarm_geocode(location)
+        except Exception as e:
+            logger.info("Prewarm geocode for %r failed: %s", location, e)
+            return None, False
+
+    def _loop(self):
+        # Jittered start and intervals keep workers and restarts from refreshing in lockstep
+        self._stop.wait(random.uniform(0, self.jitter))
+        while not self._stop.is_set():
+            if self._lease is None or self._lease.acquire(self.interval + self.jitter * 2):
+                self.run_once()
+            self._stop.wait(max(1.0, self.interval + random.uniform(-self.jitter, self.jitter)))
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="forecast-prewarm", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
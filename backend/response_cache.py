@@ -0,0 +1,146 @@
+"""
+Response cache for repeated /chat weather questions.
+
+Questions are reduced locally (no model call) to a weather intent - location,
+date span, units and what is asked about - so "weather in London tomorrow" and
+"London weather tomorrow?" share one cached answer, while "will it rain in
+London tomorrow?" and "how windy will it be in London tomorrow?" do not. Anything that does not reduce cleanly to
+an intent (follow-ups, open questions) is not cached. Entries expire at the
+next forecast refresh boundary, when the underlying Open-Meteo data may have
+changed, and the current date is part of the key so "tomorrow" never
+outlives its day. Answers from a turn in which a tool failed or used stale
+fallback data are not stored (the caller checks tool_cache.track_fallbacks).
+"""
+
+import os
+import re
+import threading
+import time
+from datetime import date
+from typing import Dict, Optional
+
+from cache import create_cache
+
+# Open-Meteo refreshes current conditions every 15 minutes
+FORECAST_REFRESH_SECONDS = int(os.getenv("RESPONSE_CACHE_REFRESH_SECONDS", "900"))
+MAX_LOCATION_WORDS = 4
+
+# Words that ask about the weather in general
+_GENERAL_WORDS = {"weather", "forecast", "conditions"}
+# Words that ask about one aspect of it, mapped to that aspect; part of the key
+_ASPECT_WORDS = {
+    "temperature": "temperature", "temp": "temperature", "temps": "temperature",
+    "rain": "rain", "raining": "rain", "rainy": "rain", "precipitation": "rain",
+    "snow": "snow", "snowing": "snow",
+    "sunny": "sun", "sun": "sun", "cloudy": "cloud",
+    "humid": "humidity", "humidity": "humidity",
+    "wind": "wind", "windy": "wind",
+    "hot": "hot", "cold": "cold", "warm": "warm",
+}
+_WEATHER_WORDS = _GENERAL_WORDS | set(_ASPECT_WORDS)
+_FILLER_WORDS = {
+    "what", "whats", "what's", "is", "are", "the", "how", "hows", "how's", "will", "be", "like", "in",
+    "for", "at", "of", "a", "an", "me", "tell", "give", "show", "please", "it", "its", "it's", "going",
+    "to", "there", "current", "currently", "now", "right", "and", "get", "check", "can", "you", "i",
+    "want", "know", "s", "day", "days", "daily", "outlook", "report", "looking",
+}
+_IMPERIAL = re.compile(r"\b(fahrenheit|imperial|°f|deg f|mph)\b")
+_METRIC = re.compile(r"\b(celsius|centigrade|metric|°c|deg c|km/h)\b")
+_N_DAYS = re.compile(r"\b(?:next\s+)?(\d{1,2})[\s-]*days?\b")
+_SPAN_PHRASES = [
+    (re.compile(r"\bthis weekend\b|\bweekend\b"), "weekend"),
+    (re.compile(r"\bday after tomorrow\b"), "day_after_tomorrow"),
+    (re.compile(r"\btomorrow\b|\btmrw\b"), "tomorrow"),
+    (re.compile(r"\btonight\b"), "tonight"),
+    (re.compile(r"\btoday\b"), "today"),
+    (re.compile(r"\b(this|next|coming) week\b|\bweek\b"), "7d"),
+]
+
+_cache = create_cache(
+    'chat_responses', maxsize=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "4096")), ttl=FORECAST_REFRESH_SECONDS
+)
+_stats = {"hits": 0, "misses": 0, "bypassed": 0, "uncacheable": 0}
+_stats_lock = threading.Lock()
+
+
+def extract_intent(message: str) -> Optional[Dict[str, str]]:
+    """Reduce a chat message to {location, span, units, aspect}, or None if it is not a plain weather question"""
+    text = message.lower().strip()
+
+    units = "imperial" if _IMPERIAL.search(text) else "metric"
+    text = _METRIC.sub(" ", _IMPERIAL.sub(" ", text))
+
+    span = "current"
+    n_days = _N_DAYS.search(text)
+    if n_days:
+        span = f"{int(n_days.group(1))}d"
+        text = _N_DAYS.sub(" ", text)
+    for pattern, name in _SPAN_PHRASES:
+        if pattern.search(text):
+            if span == "current":
+                span = name
+            text = pattern.sub(" ", text)
+
+    # Punctuation (including commas in "New York, NY") is dropped from the key
+    words = [w.strip(".'") for w in re.findall(r"[a-z0-9'\-.]+", text)]
+    words = [w for w in words if w]
+    if not any(word in _WEATHER_WORDS for word in words):
+        return None
+
+    location_words = [w for w in words if w not in _WEATHER_WORDS and w not in _FILLER_WORDS]
+    location = " ".join(location_words)
+    if not location or len(location_words) > MAX_LOCATION_WORDS:
+        return None
+
+    aspects = sorted({_ASPECT_WORDS[w] for w in words if w in _ASPECT_WORDS})
+    aspect = "+".join(aspects) if aspects else "general"
+    return {"location": location, "span": span, "units": units, "aspect": aspect}
+
+
+def _key(intent: Dict[str, str]) -> str:
+    return (f"{intent['location']}|{intent['span']}|{intent['units']}|{intent['aspect']}|"
+            f"{date.today().isoformat()}")
+
+
+def _seconds_until_refresh() -> float:
+    """Time until the next forecast refresh boundary"""
+    return FORECAST_REFRESH_SECONDS - (time.time() % FORECAST_REFRESH_SECONDS)
+
+
+def _count(outcome: str):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def get_cached_response(message: str, bypass: bool = False) -> Optional[str]:
+    """Cached answer for an equivalent earlier question, if still fresh"""
+    if bypass:
+        _count("bypassed")
+        return None
+    intent = extract_intent(message)
+    if intent is None:
+        _count("uncacheable")
+        return None
+
+    cached = _cache.get(_key(intent))
+    _count("hits" if cached is not None else "misses")
+    return cached
+
+
+def store_response(message: str, response: str):
+    """Cache an answer until the next forecast refresh"""
+    intent = extract_intent(message)
+    if intent is None or not response:
+        return
+    _cache.set(_key(intent), response, ttl=_seconds_until_refresh())
+
+
+def response_cache_stats() -> Dict:
+    """Hit-rate counters for tuning the cache"""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    stats["entries"] = len(_cache)
+    stats["refresh_seconds"] = FORECAST_REFRESH_SECONDS
+    return stats
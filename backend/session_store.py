@@ -0,0 +1,206 @@
+"""
+Bounded, persistent chat history for the weather assistant.
+
+Each session (one per user id) is a single row holding its recent messages as
+JSON. The store stays bounded on every axis:
+
+- per prompt: `history()` returns only the newest whole turns that fit in
+  SESSION_HISTORY_MAX_TOKENS, so prompt size and model latency stay flat;
+- per session: stored history is compacted to SESSION_STORED_MAX_TOKENS on write;
+- across sessions: sessions idle for SESSION_IDLE_SECONDS are dropped, and past
+  SESSION_MAX_SESSIONS the least recently used ones are evicted.
+
+Sessions live in SQLite (SHARED_STATE_DB) by default, so they survive restarts
+and are shared by all workers. Set SESSION_STORE_URL=postgresql://... to keep
+them in Postgres instead (needs `psycopg`).
+"""
+
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from importlib.util import find_spec
+from typing import Dict, List, Optional
+
+from cache import SHARED_STATE_DB
+
+SESSION_STORE_URL = os.getenv("SESSION_STORE_URL", "")
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+SESSION_IDLE_SECONDS = float(os.getenv("SESSION_IDLE_SECONDS", str(7 * 24 * 3600)))
+SESSION_HISTORY_MAX_TOKENS = int(os.getenv("SESSION_HISTORY_MAX_TOKENS", "1500"))
+SESSION_STORED_MAX_TOKENS = int(os.getenv("SESSION_STORED_MAX_TOKENS", "4000"))
+
+PSYCOPG_AVAILABLE = find_spec("psycopg") is not None
+
+# Prune idle / excess sessions every this many writes
+_PRUNE_EVERY = 64
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token, plus per-message overhead)"""
+    return len(text) // 4 + 4
+
+
+def _trim_to_budget(messages: List[Dict], max_tokens: int) -> List[Dict]:
+    """Newest whole turns (user + assistant pairs) whose estimated size fits in `max_tokens`"""
+    kept: List[Dict] = []
+    used = 0
+    # Walk back over complete turns so a reply is never kept without its question
+    for i in range(len(messages) - 2, -1, -2):
+        turn = messages[i:i + 2]
+        cost = sum(estimate_tokens(m["content"]) for m in turn)
+        if used + cost > max_tokens:
+            break
+        kept[:0] = turn
+        used += cost
+    return kept
+
+
+class SessionStore:
+    """Chat sessions in SQLite, or Postgres when `url` is a postgresql:// DSN"""
+
+    def __init__(self, url: str = None, max_sessions: int = SESSION_MAX_SESSIONS,
+                 idle_seconds: float = SESSION_IDLE_SECONDS,
+                 history_max_tokens: int = SESSION_HISTORY_MAX_TOKENS,
+                 stored_max_tokens: int = SESSION_STORED_MAX_TOKENS):
+        self.url = url or SHARED_STATE_DB
+        self.is_postgres = self.url.startswith(("postgres://", "postgresql://"))
+        if self.is_postgres and not PSYCOPG_AVAILABLE:
+            raise ValueError("Postgres session storage requires 'psycopg'. Install with: pip install 'psycopg[binary]'")
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self.history_max_tokens = history_max_tokens
+        self.stored_max_tokens = stored_max_tokens
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+
+        self._execute('''
+            CREATE TABLE IF NOT EXISTS chat_sessions (
+                session_id TEXT PRIMARY KEY,
+                messages TEXT NOT NULL,
+                token_count INTEGER NOT NULL,
+                updated_at DOUBLE PRECISION NOT NULL
+            )
+        ''')
+        self._execute("CREATE INDEX IF NOT EXISTS idx_chat_sessions_updated ON chat_sessions (updated_at)")
+
+    def _connect(self):
+        # One connection per thread, reused across calls
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self.is_postgres:
+                import psycopg
+                conn = psycopg.connect(self.url, autocommit=True)
+            else:
+                conn = sqlite3.connect(self.url, timeout=5.0, isolation_level=None)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _execute(self, query: str, params: tuple = ()) -> List[tuple]:
+        if self.is_postgres:
+            query = query.replace("?", "%s")
+        cursor = self._connect().cursor()
+        try:
+            cursor.execute(query, params)
+            return cursor.fetchall() if cursor.description else []
+        finally:
+            cursor.close()
+
+    @contextlib.contextmanager
+    def _write_transaction(self):
+        """Run the enclosed read-modify-write as one transaction holding the write lock"""
+        conn = self._connect()
+        if self.is_postgres:
+            with conn.transaction():
+                yield
+            return
+        # IMMEDIATE takes SQLite's write lock before the read, so concurrent appends serialize
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def history(self, session_id: str) -> List[Dict]:
+        """Recent messages for the prompt, trimmed to the per-prompt token budget"""
+        rows = self._execute("SELECT messages FROM chat_sessions WHERE session_id = ?", (session_id,))
+        if not rows:
+            return []
+        return _trim_to_budget(json.loads(rows[0][0]), self.history_max_tokens)
+
+    def append_turn(self, session_id: str, user_message: str, assistant_message: str):
+        """Record one exchange, compacting the stored history to its token budget"""
+        with self._write_transaction():
+            # Make sure the row exists so Postgres has something to lock FOR UPDATE
+            self._execute('''
+                INSERT INTO chat_sessions (session_id, messages, token_count, updated_at)
+                VALUES (?, '[]', 0, ?)
+                ON CONFLICT (session_id) DO NOTHING
+            ''', (session_id, time.time()))
+            lock = " FOR UPDATE" if self.is_postgres else ""
+            rows = self._execute("SELECT messages FROM chat_sessions WHERE session_id = ?" + lock, (session_id,))
+            messages = json.loads(rows[0][0])
+            messages += [{"role": "user", "content": user_message},
+                         {"role": "assistant", "content": assistant_message}]
+            messages = _trim_to_budget(messages, self.stored_max_tokens)
+            token_count = sum(estimate_tokens(m["content"]) for m in messages)
+
+            self._execute('''
+                UPDATE chat_sessions SET messages = ?, token_count = ?, updated_at = ?
+                WHERE session_id = ?
+            ''', (json.dumps(messages), token_count, time.time(), session_id))
+
+        with self._writes_lock:
+            self._writes += 1
+            due = self._writes % _PRUNE_EVERY == 0
+        if due:
+            self.prune()
+
+    def clear(self, session_id: str):
+        self._execute("DELETE FROM chat_sessions WHERE session_id = ?", (session_id,))
+
+    def prune(self) -> int:
+        """Drop idle sessions, then the least recently used ones over the cap"""
+        before = self._count()
+        self._execute("DELETE FROM chat_sessions WHERE updated_at < ?", (time.time() - self.idle_seconds,))
+        excess = self._count() - self.max_sessions
+        if excess > 0:
+            self._execute('''
+                DELETE FROM chat_sessions WHERE session_id IN (
+                    SELECT session_id FROM chat_sessions ORDER BY updated_at LIMIT ?
+                )
+            ''', (excess,))
+        return before - self._count()
+
+    def _count(self) -> int:
+        return self._execute("SELECT COUNT(*) FROM chat_sessions")[0][0]
+
+    def stats(self) -> Dict:
+        count, tokens = self._execute("SELECT COUNT(*), COALESCE(SUM(token_count), 0) FROM chat_sessions")[0]
+        return {
+            'backend': 'postgres' if self.is_postgres else 'sqlite',
+            'sessions': count,
+            'max_sessions': self.max_sessions,
+            'stored_tokens': tokens,
+            'history_max_tokens': self.history_max_tokens
+        }
+
+
+_store: Optional[SessionStore] = None
+_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    """Process-wide session store configured from the environment"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SessionStore(SESSION_STORE_URL or None)
+        return _store
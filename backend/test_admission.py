@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Check that a saturated admission class does not slow down ungated routes.
+
+Enrichment is stubbed with a provider that blocks for a second. While more of
+those requests are in flight than the gate admits, GET /test must still answer
+at once. With every export slot taken, cached exports and delta syncs must
+still be served, while a render waits for a slot.
+
+Run with `python test_admission.py` or `pytest test_admission.py`.
+"""
+
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+
+os.environ.setdefault("ENABLE_AGNO_ROUTER", "false")
+os.environ.setdefault("PREWARM_ENABLED", "false")
+os.environ.setdefault("JOB_QUEUE_ENABLED", "false")
+os.environ.setdefault("WEATHER_DB_PATH", os.path.join(tempfile.mkdtemp(), "weather_data.db"))
+os.environ.setdefault("EXPORT_CACHE_DIR", os.path.join(tempfile.mkdtemp(), "export_cache"))
+
+import httpx
+
+import admission
+import agent
+
+SLOW_SECONDS = 1.0
+
+
+class SlowIntegrations:
+    """Stands in for APIIntegrations with a provider that blocks like a hung upstream"""
+
+    def get_youtube_videos(self, location, max_results=5):
+        time.sleep(SLOW_SECONDS)
+        return {"success": True, "videos": [], "location": location}
+
+
+async def _measure_test_latency() -> list:
+    gate = admission.get_gate('enrichment')
+    slow_requests = gate.concurrency + 4
+    transport = httpx.ASGITransport(app=agent.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30) as client:
+        slow = [
+            asyncio.create_task(client.get(f"/youtube-videos/city{i}", headers={"X-User-Id": f"user{i}"}))
+            for i in range(slow_requests)
+        ]
+        # Let the slow requests take every slot. If they block the event loop they
+        # run one after another and never fill the gate.
+        deadline = time.monotonic() + 5 * SLOW_SECONDS
+        while gate.active < gate.concurrency:
+            assert time.monotonic() < deadline, "slow requests never ran concurrently"
+            await asyncio.sleep(0.01)
+
+        latencies = []
+        for _ in range(10):
+            start = time.perf_counter()
+            response = await client.get("/test")
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 200
+            await asyncio.sleep(0.05)
+
+        assert gate.active == gate.concurrency, "the slow class should still be saturated"
+        statuses = [response.status_code for response in await asyncio.gather(*slow)]
+        assert all(status == 200 for status in statuses), statuses
+    return latencies
+
+
+def test_ungated_route_stays_fast_while_enrichment_is_saturated():
+    original = agent.get_api_integrations
+    agent.get_api_integrations = lambda: SlowIntegrations()
+    try:
+        latencies = asyncio.run(_measure_test_latency())
+    finally:
+        agent.get_api_integrations = original
+    print(f"/test latency while saturated: max {max(latencies) * 1000:.1f} ms")
+    assert max(latencies) < 0.2, latencies
+
+
+async def _export_while_renders_hold_every_slot():
+    gate = admission.get_gate('export')
+    transport = httpx.ASGITransport(app=agent.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30) as client:
+        cached = {"format": "csv", "compression": "none"}
+        assert (await client.get("/export/weather-requests", params=cached)).status_code == 200
+        assert gate.active == 0, "the slot should be freed once the export is sent"
+
+        for _ in range(gate.concurrency):
+            await gate.acquire("slow-renders")
+        try:
+            for params in (cached, None):
+                path = "/export/weather-requests" if params else "/export/weather-requests/changes"
+                response = await asyncio.wait_for(client.get(path, params=params), timeout=2)
+                assert response.status_code == 200, (path, response.text)
+
+            render = asyncio.create_task(client.get("/export/weather-requests", params={"format": "json"}))
+            deadline = time.monotonic() + 2
+            while gate.queued == 0:
+                assert time.monotonic() < deadline, "an uncached export should wait for a slot"
+                await asyncio.sleep(0.01)
+            gate.release()
+            assert (await render).status_code == 200
+        finally:
+            for _ in range(gate.active):
+                gate.release()
+    assert gate.active == 0 and gate.queued == 0
+
+
+def test_cached_exports_are_not_queued_behind_renders():
+    with sqlite3.connect(agent.get_db().db_path) as conn:
+        conn.executemany(
+            "INSERT INTO weather_requests (location, normalized_location, start_date, end_date, weather_data) "
+            "VALUES (?, ?, '2024-01-01', '2024-01-02', 'sunny')",
+            [(f"City {i}", f"City {i}") for i in range(5)]
+        )
+    asyncio.run(_export_while_renders_hold_every_slot())
+
+
+if __name__ == "__main__":
+    test_ungated_route_stays_fast_while_enrichment_is_saturated()
+    test_cached_exports_are_not_queued_behind_renders()
+    print("OK")
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Check that the breaker timeout bounds synchronous calls.
+
+A callable that hangs must fail after `timeout` seconds, count as a failure,
+and trip the breaker once enough of them have timed out.
+
+Run with `python test_circuit_breaker.py` or `pytest test_circuit_breaker.py`.
+"""
+
+import threading
+import time
+
+from circuit_breaker import OPEN, CircuitBreaker, CircuitOpenError
+
+
+def test_hanging_call_times_out_and_trips_the_breaker():
+    release = threading.Event()
+    breaker = CircuitBreaker("hanging", timeout=0.2, minimum_calls=2, window_size=2)
+    try:
+        for _ in range(2):
+            start = time.monotonic()
+            try:
+                breaker.call(release.wait)
+            except TimeoutError:
+                pass
+            else:
+                raise AssertionError("a hanging call should time out")
+            assert time.monotonic() - start < 1.0, "the call was not cut off at the timeout"
+
+        assert breaker.state == OPEN
+        assert breaker.counters['failures'] == 2
+        assert "timed out" in breaker.last_error
+        try:
+            breaker.call(release.wait)
+        except CircuitOpenError:
+            pass
+        else:
+            raise AssertionError("an open breaker should short-circuit")
+        assert breaker.call(release.wait, fallback=lambda: "cached") == "cached"
+    finally:
+        # Let the abandoned workers return
+        release.set()
+
+
+if __name__ == "__main__":
+    test_hanging_call_times_out_and_trips_the_breaker()
+    print("OK")
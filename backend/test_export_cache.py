@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Check the export artifact cache.
+
+- An artifact evicted between lookup() and the response is still sent whole.
+- A hit gets a fresh download filename and a fresh "Generated on" line.
+- Publishing keeps a running size total and only evicts past max_bytes.
+
+Run with `python test_export_cache.py` or `pytest test_export_cache.py`.
+"""
+
+import asyncio
+import os
+import re
+import sqlite3
+import tempfile
+from datetime import datetime
+from unittest import mock
+
+os.environ.setdefault("ENABLE_AGNO_ROUTER", "false")
+os.environ.setdefault("PREWARM_ENABLED", "false")
+os.environ.setdefault("JOB_QUEUE_ENABLED", "false")
+os.environ.setdefault("WEATHER_DB_PATH", os.path.join(tempfile.mkdtemp(), "weather_data.db"))
+os.environ.setdefault("EXPORT_CACHE_DIR", os.path.join(tempfile.mkdtemp(), "export_cache"))
+
+import httpx
+
+import agent
+from export_cache import ExportArtifactCache, read_chunks
+
+
+def test_evicted_artifact_is_still_sent_whole():
+    cache = ExportArtifactCache(tempfile.mkdtemp(), max_bytes=1024 * 1024)
+    key = cache.key(format='csv', data_version=1)
+    cache.store(key, b"x" * 200_000, {'content_type': 'text/csv'})
+
+    artifact = cache.lookup(key)
+    cache.max_bytes = 0
+    cache.evict()
+    assert cache.lookup(key) is None
+    assert b"".join(read_chunks(artifact['file'])) == b"x" * 200_000
+
+
+def test_running_size_total():
+    cache = ExportArtifactCache(tempfile.mkdtemp(), max_bytes=4000)
+    with mock.patch.object(cache, 'evict', wraps=cache.evict) as evict:
+        for i in range(3):
+            cache.store(cache.key(n=i), b"x" * 1000, {})
+        assert evict.call_count == 0, "publishing under the limit should not rescan"
+        assert cache._size == 3000
+        cache.store(cache.key(n=3), b"x" * 1000, {})
+        cache.store(cache.key(n=3), b"x" * 1000, {})
+        assert cache._size == 4000, "republishing an artifact should not count it twice"
+        cache.store(cache.key(n=4), b"x" * 1000, {})
+        assert evict.call_count == 1
+    assert cache._size <= 4000
+    assert len([name for name in os.listdir(cache.directory) if name.endswith('.bin')]) == 4
+
+
+def _seed(count: int):
+    db = agent.get_db()
+    with sqlite3.connect(db.db_path) as conn:
+        conn.executemany(
+            "INSERT INTO weather_requests (location, normalized_location, start_date, end_date, weather_data) "
+            "VALUES (?, ?, '2024-01-01', '2024-01-02', 'sunny')",
+            [(f"City {i}", f"City {i}") for i in range(count)]
+        )
+
+
+async def _export_twice(params: dict) -> list:
+    transport = httpx.ASGITransport(app=agent.app)
+    responses = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        for clock in ("2024-01-15 10:30:00", "2024-01-15 11:45:00"):
+            stamp = datetime.strptime(clock, "%Y-%m-%d %H:%M:%S")
+            with mock.patch("data_export.datetime") as fake:
+                fake.now.return_value = stamp
+                responses.append(await client.get("/export/weather-requests", params=params))
+    return responses
+
+
+def test_hit_is_stamped_for_its_own_request():
+    _seed(3)
+    first, second = asyncio.run(_export_twice({"format": "markdown", "compression": "none"}))
+    assert first.status_code == second.status_code == 200
+    assert "weather_data_20240115_103000.md" in first.headers["content-disposition"]
+    assert "weather_data_20240115_114500.md" in second.headers["content-disposition"]
+    assert "Generated on: 2024-01-15 10:30:00" in first.text
+    assert "Generated on: 2024-01-15 11:45:00" in second.text
+    pattern = re.compile(r"Generated on: [^*]*")
+    assert pattern.sub("", first.text) == pattern.sub("", second.text)
+
+    first, second = asyncio.run(_export_twice({"format": "csv", "compression": "none"}))
+    assert "weather_data_20240115_114500.csv" in second.headers["content-disposition"]
+    assert first.content == second.content
+
+
+if __name__ == "__main__":
+    test_evicted_artifact_is_still_sent_whole()
+    test_running_size_total()
+    test_hit_is_stamped_for_its_own_request()
+    print("OK")
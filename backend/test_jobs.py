@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Check the job queue's leases and the idempotent create job.
+
+- A job that outlives its lease is renewed, not run a second time.
+- A worker that lost its lease cannot overwrite the newer attempt's outcome.
+- A transient failure is retried after a backoff; invalid input fails at once.
+- A retried create finds the row the first attempt stored.
+
+Run with `python test_jobs.py` or `pytest test_jobs.py`.
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from database import WeatherDatabase
+from jobs import FAILED, RUNNING, SUCCEEDED, JobQueue
+
+
+def _db_path() -> str:
+    return os.path.join(tempfile.mkdtemp(), "weather_data.db")
+
+
+def test_long_job_keeps_its_lease():
+    db_path = _db_path()
+    calls = []
+
+    def slow(payload):
+        calls.append(threading.current_thread().name)
+        time.sleep(1.0)
+        return {"ok": True}
+
+    # Two queues on one database stand in for two worker processes
+    queues = [JobQueue(db_path, concurrency=1, lease_seconds=0.3, poll_seconds=0.02) for _ in range(2)]
+    for queue in queues:
+        queue.register("slow", slow)
+    job_id = queues[0].enqueue("slow", {})
+    for queue in queues:
+        queue.start()
+    try:
+        deadline = time.monotonic() + 5
+        while queues[0].get(job_id)['status'] != SUCCEEDED:
+            assert time.monotonic() < deadline, queues[0].get(job_id)
+            time.sleep(0.05)
+    finally:
+        for queue in queues:
+            queue.stop()
+    assert len(calls) == 1, calls
+    assert queues[0].get(job_id)['attempts'] == 1
+
+
+def test_stale_worker_cannot_overwrite_a_newer_attempt():
+    db_path = _db_path()
+    stalled = JobQueue(db_path, lease_seconds=0.1)
+    current = JobQueue(db_path, lease_seconds=60)
+    job_id = stalled.enqueue("work", {})
+
+    stale_job = stalled._claim()
+    time.sleep(0.15)
+    new_job = current._claim()
+    assert new_job['id'] == stale_job['id'] == job_id
+
+    stalled._finish(stale_job, SUCCEEDED, result='"stale"')
+    assert stalled.get(job_id)['status'] == RUNNING
+    stalled._renew_leases()
+    assert job_id not in stalled._leases
+
+    current._finish(new_job, SUCCEEDED, result='"fresh"')
+    job = current.get(job_id)
+    assert (job['status'], job['result'], job['attempts']) == (SUCCEEDED, "fresh", 2)
+
+
+def _wait_until_done(queue: JobQueue, job_id: str) -> dict:
+    deadline = time.monotonic() + 5
+    while queue.get(job_id)['status'] not in (SUCCEEDED, FAILED):
+        assert time.monotonic() < deadline, queue.get(job_id)
+        time.sleep(0.02)
+    return queue.get(job_id)
+
+
+def test_transient_failures_are_retried_with_backoff():
+    runs = {"flaky": [], "broken": [], "invalid": []}
+
+    def flaky(payload):
+        runs["flaky"].append(time.monotonic())
+        if len(runs["flaky"]) < 3:
+            raise ConnectionError("upstream unavailable")
+        return {"ok": True}
+
+    def broken(payload):
+        runs["broken"].append(time.monotonic())
+        raise ConnectionError("upstream unavailable")
+
+    def invalid(payload):
+        runs["invalid"].append(time.monotonic())
+        raise ValueError("Start date cannot be after end date")
+
+    queue = JobQueue(_db_path(), concurrency=3, max_attempts=3, poll_seconds=0.02, retry_backoff_seconds=0.2)
+    for kind, handler in (("flaky", flaky), ("broken", broken), ("invalid", invalid)):
+        queue.register(kind, handler)
+    job_ids = {kind: queue.enqueue(kind, {}) for kind in runs}
+    queue.start()
+    try:
+        jobs = {kind: _wait_until_done(queue, job_id) for kind, job_id in job_ids.items()}
+    finally:
+        queue.stop()
+
+    assert (jobs["flaky"]['status'], jobs["flaky"]['attempts']) == (SUCCEEDED, 3)
+    # The backoff doubles: 0.2s before the second attempt, 0.4s before the third
+    gaps = [later - earlier for earlier, later in zip(runs["flaky"], runs["flaky"][1:])]
+    assert gaps[0] >= 0.2 and gaps[1] >= 0.4, gaps
+    assert (jobs["broken"]['status'], jobs["broken"]['attempts']) == (FAILED, 3)
+    assert (jobs["invalid"]['status'], jobs["invalid"]['attempts']) == (FAILED, 1)
+    assert jobs["invalid"]['error'] == "Start date cannot be after end date"
+
+
+def test_retried_create_does_not_insert_twice():
+    db = WeatherDatabase(_db_path())
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute(
+            "INSERT INTO location_cache (search_term, normalized_name, coordinates, country, is_valid, timezone) "
+            "VALUES ('paris', 'Paris', '48.85,2.35', 'France', 1, 'Europe/Paris')"
+        )
+    with mock.patch("open_meteo_tool.get_weather_forecast", return_value="sunny") as forecast:
+        first = db.create_weather_request("Paris", "2024-01-01", "2024-01-02", request_key="job-1")
+        retry = db.create_weather_request("Paris", "2024-01-01", "2024-01-02", request_key="job-1")
+        other = db.create_weather_request("Paris", "2024-01-01", "2024-01-02", request_key="job-2")
+    assert first[0] and retry[0] and other[0]
+    assert retry[2] == first[2] != other[2]
+    assert forecast.call_count == 2
+    with sqlite3.connect(db.db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM weather_requests").fetchone()[0] == 2
+
+
+if __name__ == "__main__":
+    test_long_job_keeps_its_lease()
+    test_stale_worker_cannot_overwrite_a_newer_attempt()
+    test_transient_failures_are_retried_with_backoff()
+    test_retried_create_does_not_insert_twice()
+    print("OK")
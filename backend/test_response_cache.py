@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Check which /chat questions share a cached answer.
+
+Run with `python test_response_cache.py` or `pytest test_response_cache.py`.
+"""
+
+from response_cache import _key, extract_intent
+
+
+def _keys(*questions):
+    return [_key(extract_intent(question)) for question in questions]
+
+
+def test_same_question_shares_a_key():
+    first, second = _keys("Weather in London tomorrow", "London weather tomorrow?")
+    assert first == second
+
+
+def test_aspects_do_not_share_a_key():
+    keys = _keys(
+        "What's the weather in London tomorrow?",
+        "Will it rain in London tomorrow?",
+        "How windy will it be in London tomorrow?",
+        "Will it snow in London tomorrow?",
+        "Will it be hot in London tomorrow?",
+    )
+    assert len(set(keys)) == len(keys), keys
+
+
+def test_aspect_synonyms_share_a_key():
+    rain, rainy = _keys("Will it rain in Paris today?", "Is it going to be rainy in Paris today?")
+    assert rain == rainy
+
+
+if __name__ == "__main__":
+    test_same_question_shares_a_key()
+    test_aspects_do_not_share_a_key()
+    test_aspect_synonyms_share_a_key()
+    print("OK")
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Check that concurrent messages in one chat session do not lose turns.
+
+Several threads append to the same session at once, each through its own
+connection. Every turn must end up in the stored history.
+
+Run with `python test_session_store.py` or `pytest test_session_store.py`.
+"""
+
+import os
+import tempfile
+import threading
+
+from session_store import SessionStore
+
+
+def test_concurrent_appends_keep_every_turn():
+    store = SessionStore(os.path.join(tempfile.mkdtemp(), "sessions.db"),
+                         history_max_tokens=100_000, stored_max_tokens=100_000)
+    start = threading.Barrier(8)
+
+    def chat(worker: int):
+        start.wait()
+        for turn in range(10):
+            store.append_turn("shared", f"question {worker}.{turn}", "answer")
+
+    threads = [threading.Thread(target=chat, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    questions = {m["content"] for m in store.history("shared") if m["role"] == "user"}
+    assert len(questions) == 80, f"lost {80 - len(questions)} turns"
+
+
+if __name__ == "__main__":
+    test_concurrent_appends_keep_every_turn()
+    print("OK")
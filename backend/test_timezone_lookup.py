@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Check timezone resolution from coordinates next to national and zone borders.
+
+Each point lies close to a city in a different zone, which is where a guess
+from the nearest reference city goes wrong. Without timezonefinder installed
+the lookup must return None rather than a guess.
+
+Run with `python test_timezone_lookup.py` or `pytest test_timezone_lookup.py`.
+"""
+
+from timezone_lookup import TIMEZONEFINDER_AVAILABLE, lookup_timezone
+
+BORDER_POINTS = [
+    ("Badajoz", 38.88, -6.97, {"Europe/Madrid"}),
+    ("Vigo", 42.24, -8.72, {"Europe/Madrid"}),
+    ("Kashgar", 39.47, 75.99, {"Asia/Shanghai", "Asia/Urumqi"}),
+    ("Brest, Belarus", 52.09, 23.73, {"Europe/Minsk"}),
+    ("San Diego", 32.72, -117.16, {"America/Los_Angeles"}),
+    ("Nogales, AZ", 31.34, -110.94, {"America/Phoenix"}),
+    ("Tijuana", 32.51, -117.04, {"America/Tijuana"}),
+    ("Mid-Atlantic", 0.0, -30.0, {"Etc/GMT+2"}),
+]
+
+
+def test_border_points_resolve_to_their_own_zone():
+    for name, lat, lon, expected in BORDER_POINTS:
+        zone = lookup_timezone(lat, lon)
+        if TIMEZONEFINDER_AVAILABLE:
+            assert zone in expected, f"{name}: got {zone}, expected one of {sorted(expected)}"
+        else:
+            assert zone is None, f"{name}: guessed {zone} without boundary data"
+
+
+if __name__ == "__main__":
+    test_border_points_resolve_to_their_own_zone()
+    print("OK" if TIMEZONEFINDER_AVAILABLE else "OK (timezonefinder not installed, lookups return None)")
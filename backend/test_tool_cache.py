@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Check that the tool cache never memoizes answers built from stale data.
+
+A forecast served from the last-good fallback while Open-Meteo is down must
+not be replayed once the service is back, and a turn that used one is flagged
+so its answer is not cached either.
+
+Run with `python test_tool_cache.py` or `pytest test_tool_cache.py`.
+"""
+
+from unittest import mock
+
+import open_meteo_tool
+import tool_cache
+
+FORECAST = {
+    "current": {"temperature_2m": 12.0, "apparent_temperature": 11.0, "relative_humidity_2m": 70,
+                "precipitation": 0.0, "weather_code": 1, "wind_speed_10m": 10.0, "is_day": 1},
+    "daily": {"time": ["2024-01-01"], "temperature_2m_max": [14.0], "temperature_2m_min": [8.0],
+              "weather_code": [1], "precipitation_sum": [0.0], "precipitation_probability_max": [10]},
+}
+
+
+def test_stale_forecast_is_not_memoized():
+    responses = [dict(FORECAST, _stale=True), dict(FORECAST)]
+    with mock.patch.object(open_meteo_tool, "_get_coordinates", return_value=(52.52, 13.41)), \
+            mock.patch.object(open_meteo_tool, "_fetch_forecast", side_effect=responses):
+        arguments = {"location": "Stale Test City"}
+        stale = tool_cache.memoizing_tool_hook("get_weather_forecast", open_meteo_tool.get_weather_forecast,
+                                               arguments)
+        fresh = tool_cache.memoizing_tool_hook("get_weather_forecast", open_meteo_tool.get_weather_forecast,
+                                               arguments)
+        cached = tool_cache.memoizing_tool_hook("get_weather_forecast", open_meteo_tool.get_weather_forecast,
+                                                arguments)
+
+    assert isinstance(stale, tool_cache.FallbackResult)
+    assert "temporarily unavailable" in stale
+    assert "temporarily unavailable" not in fresh
+    assert cached == fresh
+
+
+def test_fallback_results_are_tracked_per_turn():
+    stale = lambda location: tool_cache.FallbackResult(f"Old forecast for {location}")
+    failing = lambda location: f"Error fetching weather data for {location}"
+    fresh = lambda location: f"Forecast for {location}"
+
+    with tool_cache.track_fallbacks() as used:
+        tool_cache.memoizing_tool_hook("fresh_tool", fresh, {"location": "Tracked City"})
+    assert used == []
+    with tool_cache.track_fallbacks() as used:
+        tool_cache.memoizing_tool_hook("stale_tool", stale, {"location": "Tracked City"})
+        tool_cache.memoizing_tool_hook("failing_tool", failing, {"location": "Tracked City"})
+        # Served from the cache, so it is fresh data
+        tool_cache.memoizing_tool_hook("fresh_tool", fresh, {"location": "Tracked City"})
+    assert used == ["stale_tool", "failing_tool"]
+
+
+if __name__ == "__main__":
+    test_stale_forecast_is_not_memoized()
+    test_fallback_results_are_tracked_per_turn()
+    print("OK")
@@ -0,0 +1,76 @@
+"""
+Offline timezone resolution.
+
+Timezones are resolved without any network calls. Callers should prefer the
+IANA name returned by the Open-Meteo geocoder or forecast (`timezone=auto`),
+which the location cache stores for every geocoded location. When only
+coordinates are known, `lookup_timezone` tests them against the
+timezone-boundary-builder polygons shipped with the `timezonefinder` package,
+so points next to a border get the zone they are actually in. Open ocean gets
+the nautical `Etc/GMT±N` zone from the same data.
+
+Without `timezonefinder` installed, `lookup_timezone` returns None instead of
+guessing from the nearest known city, which is wrong near borders.
+"""
+
+import threading
+from datetime import datetime
+from importlib.util import find_spec
+from typing import Dict, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+TIMEZONEFINDER_AVAILABLE = find_spec('timezonefinder') is not None
+
+# Loaded on first use; opening the polygon data takes a moment
+_finder = None
+_finder_lock = threading.Lock()
+
+
+def _get_finder():
+    global _finder
+    if _finder is None:
+        with _finder_lock:
+            if _finder is None:
+                from timezonefinder import TimezoneFinder
+                _finder = TimezoneFinder()
+    return _finder
+
+
+def parse_coordinates(coordinates: str) -> Optional[Tuple[float, float]]:
+    """Parse a "lat,lon" string into floats"""
+    try:
+        lat, lon = (float(part.strip()) for part in coordinates.split(','))
+    except (AttributeError, ValueError):
+        return None
+    if -90 <= lat <= 90 and -180 <= lon <= 180:
+        return lat, lon
+    return None
+
+
+def lookup_timezone(lat: float, lon: float) -> Optional[str]:
+    """IANA timezone whose boundary contains the coordinate, or None when it cannot be resolved"""
+    if not TIMEZONEFINDER_AVAILABLE:
+        return None
+    return _get_finder().timezone_at(lng=lon, lat=lat)
+
+
+def describe_timezone(timezone_name: str, now: Optional[datetime] = None) -> Dict:
+    """Current local time and UTC offset for an IANA timezone, computed with zoneinfo"""
+    try:
+        zone = ZoneInfo(timezone_name)
+    except (ZoneInfoNotFoundError, ValueError) as e:
+        raise ValueError(f"Unknown timezone: {timezone_name}") from e
+
+    local_now = (now or datetime.now(tz=zone)).astimezone(zone)
+    offset = local_now.utcoffset()
+    total_minutes = int(offset.total_seconds() // 60)
+    sign = '+' if total_minutes >= 0 else '-'
+    hours, minutes = divmod(abs(total_minutes), 60)
+
+    return {
+        'timezone': timezone_name,
+        'abbreviation': local_now.tzname(),
+        'current_time': local_now.isoformat(timespec='seconds'),
+        'utc_offset': f"{sign}{hours:02d}:{minutes:02d}",
+        'dst': bool(local_now.dst())
+    }
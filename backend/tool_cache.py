@@ -0,0 +1,148 @@
+"""
+Memoization for agent tool calls.
+
+`memoizing_tool_hook` is registered as an Agno tool hook, so it wraps every tool
+on the agent (plain functions and toolkit functions alike). Results are keyed on
+the tool name plus its normalized arguments and shared across sessions and users
+for a freshness window, so "weather in Berlin" asked twice within a few minutes
+geocodes and fetches the forecast only once.
+
+Failures and answers built from stale or fallback data are passed through but
+never stored. Tools mark the latter by returning a `FallbackResult`, so the
+first call after the upstream recovers fetches fresh data. Callers that cache
+whole answers wrap the run in `track_fallbacks()` to learn whether any tool
+failed or answered from fallback data.
+"""
+
+import contextlib
+import inspect
+import json
+import logging
+import os
+import re
+import threading
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from cache import create_cache
+
+# Child of Agno's logger so cache decisions show up next to its tool-call logs
+logger = logging.getLogger("agno.tool_cache")
+
+DEFAULT_TTL_SECONDS = float(os.getenv("TOOL_CACHE_TTL_SECONDS", "600"))
+
+# Per-tool freshness windows (seconds); tools not listed use the default
+TOOL_TTL_SECONDS = {
+    "get_weather_forecast": 600,
+    "duckduckgo_search": 1800,
+    "duckduckgo_news": 600,
+}
+
+# Tools that must never be memoized, e.g. TOOL_CACHE_EXCLUDE=duckduckgo_news,my_tool
+EXCLUDED_TOOLS = {name.strip() for name in os.getenv("TOOL_CACHE_EXCLUDE", "").split(",") if name.strip()}
+
+# Tools report failures as text; those must not be served to the next caller
+_ERROR_RESULT = re.compile(r"^(error|could not|weather service is temporarily unavailable)", re.IGNORECASE)
+
+
+
+class FallbackResult(str):
+    """A tool result built from stale or fallback data; served, never memoized"""
+
+
+_cache = create_cache(
+    'tool_results', maxsize=int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "2048")), ttl=DEFAULT_TTL_SECONDS
+)
+# Names of the tools whose result could not be cached, per track_fallbacks() block
+_fallbacks: ContextVar[Optional[List[str]]] = ContextVar("tool_fallbacks", default=None)
+_counters: Dict[str, Dict[str, int]] = {}
+_counters_lock = threading.Lock()
+
+
+def _normalize_value(value: Any) -> Any:
+    if isinstance(value, str):
+        # "Berlin ,  Germany" and "berlin, germany" are the same question
+        value = re.sub(r"\s*,\s*", ", ", value.strip().lower())
+        return re.sub(r"\s+", " ", value)
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, dict):
+        return {k: _normalize_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize_value(v) for v in value]
+    return value
+
+
+def _with_defaults(function_call: Optional[Callable], arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """Fill in default parameter values so omitted and explicit defaults share a key"""
+    if function_call is None:
+        return arguments
+    try:
+        bound = inspect.signature(function_call).bind_partial(**arguments)
+    except (TypeError, ValueError):
+        return arguments
+    bound.apply_defaults()
+    return dict(bound.arguments)
+
+
+def cache_key(function_name: str, arguments: Dict[str, Any], function_call: Optional[Callable] = None) -> str:
+    """Stable key for a tool call: tool name plus normalized, sorted arguments"""
+    arguments = _with_defaults(function_call, arguments or {})
+    normalized = {k: _normalize_value(v) for k, v in arguments.items() if v is not None}
+    return f"{function_name}:{json.dumps(normalized, sort_keys=True, default=str)}"
+
+
+def _is_cacheable(result: Any) -> bool:
+    if result is None or isinstance(result, FallbackResult):
+        return False
+    if isinstance(result, str) and _ERROR_RESULT.match(result.strip()):
+        return False
+    return True
+
+
+@contextlib.contextmanager
+def track_fallbacks() -> Iterator[List[str]]:
+    """Collect the names of tools that failed or answered from fallback data inside the block"""
+    used: List[str] = []
+    token = _fallbacks.set(used)
+    try:
+        yield used
+    finally:
+        _fallbacks.reset(token)
+
+
+def _count(function_name: str, outcome: str) -> Dict[str, int]:
+    with _counters_lock:
+        counters = _counters.setdefault(function_name, {"hits": 0, "misses": 0, "bypassed": 0})
+        counters[outcome] += 1
+        return dict(counters)
+
+
+def memoizing_tool_hook(function_name: str, function_call: Callable, arguments: Dict[str, Any]) -> Any:
+    """Agno tool hook serving fresh memoized results instead of re-running the tool"""
+    if function_name in EXCLUDED_TOOLS:
+        _count(function_name, "bypassed")
+        return function_call(**arguments)
+
+    key = cache_key(function_name, arguments, function_call)
+    cached = _cache.get(key)
+    if cached is not None:
+        counters = _count(function_name, "hits")
+        logger.info(f"Tool cache hit: {function_name}({arguments}) "
+                    f"[hits={counters['hits']} misses={counters['misses']}]")
+        return cached
+
+    result = function_call(**arguments)
+    counters = _count(function_name, "misses")
+    if _is_cacheable(result):
+        _cache.set(key, result, ttl=TOOL_TTL_SECONDS.get(function_name, DEFAULT_TTL_SECONDS))
+    elif _fallbacks.get() is not None:
+        _fallbacks.get().append(function_name)
+    logger.info(f"Tool cache miss: {function_name}({arguments}) "
+                f"[hits={counters['hits']} misses={counters['misses']}]")
+    return result
+
+
+def tool_cache_stats() -> Dict:
+    """Overall and per-tool hit counters"""
+    return {"cache": _cache.stats(), "tools": {name: dict(c) for name, c in _counters.items()}}
@@ -0,0 +1,378 @@
+"""
+Span-based request tracing across the HTTP, database, upstream and agent layers.
+
+A trace is a tree of spans recorded in-process: TracingMiddleware opens the root
+span for each HTTP request, and WeatherDatabase methods, circuit-breaker calls,
+open_meteo_tool lookups and APIIntegrations methods add child spans. The current
+span lives in a contextvar, so nesting follows the call stack across `await`s.
+Work handed to other threads is traced via `bind()` or a propagated traceparent.
+
+Trace ids follow W3C Trace Context: an incoming `traceparent` header continues
+the caller's trace and its sampled flag, background jobs carry the traceparent
+of the request that queued them, and responses carry `X-Trace-Id`.
+
+Every trace is recorded; when it finishes it is kept only if it was sampled
+(TRACE_SAMPLE_RATE) or slower than TRACE_SLOW_MS. Kept traces are appended to
+TRACE_EXPORT_PATH as JSON lines (one trace per line) or as OTLP/JSON
+(TRACE_EXPORT_FORMAT=otlp, one ExportTraceServiceRequest per line, readable by
+the OpenTelemetry collector's otlpjsonfile receiver). The slowest recent traces
+are also held in memory for /debug/traces. Like the metrics, that buffer is per
+worker process.
+"""
+
+import contextvars
+import functools
+import inspect
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() not in ("0", "false", "no")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+# Traces at least this slow are always kept, sampled or not
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "1000"))
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "")
+TRACE_EXPORT_FORMAT = os.getenv("TRACE_EXPORT_FORMAT", "jsonl").lower()
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "100"))
+# Spans past this are counted but not recorded, so a runaway loop cannot grow a trace forever
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "500"))
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "weather-app")
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+_current: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+def _new_id(nbytes: int) -> str:
+    return f"{random.getrandbits(nbytes * 8) or 1:0{nbytes * 2}x}"
+
+
+def parse_traceparent(header: Optional[str]):
+    """(trace_id, parent_span_id, sampled) from a W3C traceparent header, or None"""
+    match = _TRACEPARENT.match((header or "").strip().lower())
+    if not match or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+        return None
+    return match.group(1), match.group(2), bool(int(match.group(3), 16) & 1)
+
+
+class _Trace:
+    """Spans of one trace recorded in this process"""
+
+    __slots__ = ("trace_id", "sampled", "spans", "dropped_spans", "root")
+
+    def __init__(self, trace_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.spans: List["Span"] = []
+        self.dropped_spans = 0
+        self.root: Optional["Span"] = None
+
+
+class Span:
+    """One timed operation; use as a context manager"""
+
+    __slots__ = ("trace", "span_id", "parent_id", "name", "attributes", "status",
+                 "start_ns", "duration_ns", "_perf_start", "_token")
+
+    def __init__(self, trace: _Trace, name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.status = "ok"
+        self.start_ns = 0
+        self.duration_ns = 0
+        self._perf_start = 0
+        self._token = None
+        if trace.root is None:
+            trace.root = self
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    def set(self, **attributes) -> "Span":
+        self.attributes.update(attributes)
+        return self
+
+    def record_error(self, error: BaseException):
+        self.status = "error"
+        self.attributes["error"] = str(error) or type(error).__name__
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace.trace_id}-{self.span_id}-{'01' if self.trace.sampled else '00'}"
+
+    def __enter__(self) -> "Span":
+        self.start_ns = time.time_ns()
+        self._perf_start = time.perf_counter_ns()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration_ns = time.perf_counter_ns() - self._perf_start
+        if exc is not None:
+            self.record_error(exc)
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            # Exited from another context (e.g. a generator closed by a different task)
+            pass
+
+        trace = self.trace
+        if len(trace.spans) < TRACE_MAX_SPANS:
+            trace.spans.append(self)
+        else:
+            trace.dropped_spans += 1
+        if trace.root is self:
+            _finish(trace)
+        return False
+
+    def to_dict(self) -> Dict:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_unix_nano": self.start_ns,
+            "duration_ms": round(self.duration_ns / 1e6, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Stand-in returned while tracing is disabled"""
+
+    trace_id = None
+
+    def set(self, **attributes):
+        return self
+
+    def record_error(self, error: BaseException):
+        pass
+
+    def traceparent(self):
+        return None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str, traceparent: Optional[str] = None, **attributes):
+    """Child of the current span, or the root of a new trace.
+
+    A `traceparent` (header value) starts a new local trace that continues a remote
+    or earlier one, e.g. a background job continuing the request that queued it.
+    """
+    if not TRACING_ENABLED:
+        return _NOOP
+    parent = _current.get()
+    if parent is not None and traceparent is None:
+        return Span(parent.trace, name, parent.span_id, attributes)
+
+    remote = parse_traceparent(traceparent)
+    if remote:
+        trace_id, parent_id, sampled = remote
+    else:
+        trace_id, parent_id, sampled = _new_id(16), None, random.random() < TRACE_SAMPLE_RATE
+    return Span(_Trace(trace_id, sampled), name, parent_id, attributes)
+
+
+def current_span():
+    return _current.get()
+
+
+def current_traceparent() -> Optional[str]:
+    """traceparent header value for the current span, to hand work to another thread or process"""
+    current = _current.get()
+    return current.traceparent() if current else None
+
+
+def annotate(**attributes):
+    """Add attributes to the current span, if any"""
+    current = _current.get()
+    if current is not None:
+        current.attributes.update(attributes)
+
+
+def traced(name: Optional[str] = None):
+    """Decorator that runs a sync or async function inside a span"""
+    def decorator(fn: Callable):
+        span_name = name or fn.__qualname__
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def bind(fn: Callable) -> Callable:
+    """Wrap `fn` so calls on other threads (e.g. a thread pool) join the current trace"""
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        # Each call gets its own copy, so concurrent calls never share a Context
+        return context.copy().run(fn, *args, **kwargs)
+    return wrapper
+
+
+# ============ FINISHED TRACES ============
+
+_recent: deque = deque(maxlen=TRACE_BUFFER_SIZE)
+_recent_lock = threading.Lock()
+_export_lock = threading.Lock()
+_export_fd: Optional[int] = None
+
+
+def _finish(trace: _Trace):
+    root = trace.root
+    slow = root.duration_ns / 1e6 >= TRACE_SLOW_MS
+    if not (trace.sampled or slow):
+        return
+    record = {
+        "trace_id": trace.trace_id,
+        "name": root.name,
+        "start_unix_nano": root.start_ns,
+        "duration_ms": round(root.duration_ns / 1e6, 3),
+        "sampled": trace.sampled,
+        "dropped_spans": trace.dropped_spans,
+        "spans": [s.to_dict() for s in trace.spans],
+    }
+    if slow:
+        with _recent_lock:
+            _recent.append(record)
+    if TRACE_EXPORT_PATH:
+        try:
+            _export(record)
+        except OSError:
+            # Tracing must never fail the request it describes
+            pass
+
+
+def _otlp_value(value: Any) -> Dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(record: Dict) -> Dict:
+    """A finished trace as an OTLP/JSON ExportTraceServiceRequest"""
+    spans = []
+    for s in record["spans"]:
+        otlp_span = {
+            "traceId": record["trace_id"],
+            "spanId": s["span_id"],
+            "name": s["name"],
+            # SERVER for request roots, CLIENT for upstream calls, INTERNAL otherwise
+            "kind": 2 if s["name"].startswith("HTTP ") else 3 if s["name"].startswith("upstream.") else 1,
+            "startTimeUnixNano": str(s["start_unix_nano"]),
+            "endTimeUnixNano": str(s["start_unix_nano"] + int(s["duration_ms"] * 1e6)),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s["attributes"].items()],
+            "status": {"code": 2, "message": s["attributes"].get("error", "")} if s["status"] == "error"
+                      else {"code": 1},
+        }
+        if s["parent_id"]:
+            otlp_span["parentSpanId"] = s["parent_id"]
+        spans.append(otlp_span)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [
+                {"key": "service.name", "value": {"stringValue": TRACE_SERVICE_NAME}},
+                {"key": "process.pid", "value": {"intValue": str(os.getpid())}},
+            ]},
+            "scopeSpans": [{"scope": {"name": "weather.tracing"}, "spans": spans}],
+        }]
+    }
+
+
+def _export(record: Dict):
+    global _export_fd
+    payload = to_otlp(record) if TRACE_EXPORT_FORMAT == "otlp" else record
+    line = (json.dumps(payload, default=str, separators=(",", ":")) + "\n").encode("utf-8")
+    with _export_lock:
+        if _export_fd is None:
+            _export_fd = os.open(TRACE_EXPORT_PATH, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        # One write per line on an O_APPEND descriptor, so worker processes can share the file
+        os.write(_export_fd, line)
+
+
+# ============ DEBUG VIEW ============
+
+def recent_traces(min_duration_ms: float = 0.0, limit: int = 20) -> List[Dict]:
+    """Recent slow traces, newest first"""
+    with _recent_lock:
+        records = list(_recent)
+    matching = [r for r in reversed(records) if r["duration_ms"] >= min_duration_ms]
+    return matching[:limit]
+
+
+def get_trace(trace_id: str) -> Optional[Dict]:
+    """A buffered trace by id; fragments recorded separately (e.g. a job and its request) are merged"""
+    with _recent_lock:
+        fragments = [r for r in _recent if r["trace_id"] == trace_id]
+    if not fragments:
+        return None
+    spans = [s for fragment in fragments for s in fragment["spans"]]
+    start = min(s["start_unix_nano"] for s in spans)
+    end = max(s["start_unix_nano"] + s["duration_ms"] * 1e6 for s in spans)
+    return dict(fragments[0], spans=spans, start_unix_nano=start, duration_ms=round((end - start) / 1e6, 3))
+
+
+def waterfall(record: Dict) -> List[Dict]:
+    """Spans in start order with their depth and offset from the start of the trace"""
+    spans = sorted(record["spans"], key=lambda s: s["start_unix_nano"])
+    by_id = {s["span_id"]: s for s in spans}
+    start = record["start_unix_nano"]
+    rows = []
+    for s in spans:
+        depth, parent = 0, by_id.get(s["parent_id"])
+        while parent is not None and depth < 50:
+            depth, parent = depth + 1, by_id.get(parent["parent_id"])
+        rows.append({
+            "name": s["name"],
+            "depth": depth,
+            "offset_ms": round((s["start_unix_nano"] - start) / 1e6, 3),
+            "duration_ms": s["duration_ms"],
+            "status": s["status"],
+            "attributes": s["attributes"],
+        })
+    return rows
+
+
+def render_waterfall(record: Dict, width: int = 50) -> str:
+    """Plain-text waterfall with one bar per span"""
+    total = record["duration_ms"] or 1.0
+    lines = [f"trace {record['trace_id']}  {record['name']}  {record['duration_ms']:.1f} ms"]
+    for row in waterfall(record):
+        begin = int(row["offset_ms"] / total * width)
+        length = max(1, int(round(row["duration_ms"] / total * width)))
+        bar = (" " * begin + "#" * length)[:width].ljust(width)
+        marker = " !" if row["status"] == "error" else ""
+        lines.append(f"{row['offset_ms']:>9.1f} {row['duration_ms']:>9.1f} ms |{bar}| "
+                     f"{'  ' * row['depth']}{row['name']}{marker}")
+    return "\n".join(lines)
@@ -48,6 +48,8 @@ const WeatherManager = () => {
       if (filters.location_filter) params.append('location_filter', filters.location_filter);
       params.append('limit', filters.limit);
       params.append('offset', filters.offset);
+      // The list never shows weather_data, so skip it; details fetch the full row
+      params.append('fields', 'id,location,normalized_location,start_date,end_date,created_at,user_id,coordinates');
 
       const response = await axios.get(`http://localhost:8001/weather-requests?${params}`);
       setWeatherRequests(response.data.requests);
@@ -129,7 +131,7 @@ const WeatherManager = () => {
   const handleViewDetails = async (request) => {
     setLoading(true);
     try {
-      const response = await axios.get(`http://localhost:8001/weather-requests/${request.id}`);
+      const response = await axios.get(`http://localhost:8001/weather-requests/${request.id}?include=enrichment`);
       setSelectedRequest(response.data.request);
       setEnrichmentData(response.data.enrichment);
       setError('');